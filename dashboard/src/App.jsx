@@ -1,4 +1,4 @@
-import { useState, useEffect, useMemo } from 'react'
+import { useState, useEffect, useMemo, useCallback } from 'react'
 import {
   LineChart, Line, BarChart, Bar, AreaChart, Area, ComposedChart,
   XAxis, YAxis, CartesianGrid, Tooltip, Legend, ResponsiveContainer,
@@ -13,9 +13,13 @@ import {
 import BumpChart from './components/BumpChart'
 import LollipopChart from './components/LollipopChart'
 import CircularBarChart from './components/CircularBarChart'
+import { expandirColunar, expandirDimensoes, expandirEsparso, indexarRegioes } from './utils/colunar'
+import { salarioSoma, salarioN, quantilSketch, faixasHistograma, quantilHistograma } from './utils/salario'
+import { chaveShard, carregarGranular } from './utils/shards'
 import './index.css'
 
-const GEO_URL = './assets/mun_PR.json'
+// GeoJSON dos municípios da UF dos dados carregados (metadata.geo; PR se ausente)
+const geoUrl = (metadata) => `./assets/${metadata?.geo || 'mun_PR.json'}`
 
 // Formatadores
 const formatNumber = (n) => n?.toLocaleString('pt-BR') || '0'
@@ -25,8 +29,10 @@ const formatPercent = (n) => `${n?.toFixed(1)}%` || '0%'
 function App() {
   const [data, setData] = useState(null)
   const [geoData, setGeoData] = useState(null)
-  const [granularData, setGranularData] = useState(null)
-  const [granularDimensions, setGranularDimensions] = useState(null)
+  // Dados granulares e a chave do shard de onde vieram ('' = arquivos completos)
+  const [granular, setGranular] = useState(null)
+  const [granularRegions, setGranularRegions] = useState(null)
+  const [manifest, setManifest] = useState(null)
   const [loading, setLoading] = useState(true)
   const [error, setError] = useState(null)
   const [activeTab, setActiveTab] = useState('overview')
@@ -45,34 +51,74 @@ function App() {
   const [periodoFilter, setPeriodoFilter] = useState('')
 
   useEffect(() => {
-    // Carregar dados agregados e GeoJSON primeiro (essenciais)
-    Promise.all([
-      fetch('./data/aggregated_full.json').then(res => {
+    // Carregar dados agregados e GeoJSON da UF primeiro (essenciais)
+    fetch('./data/aggregated_full.json')
+      .then(res => {
         if (!res.ok) throw new Error('Dados não encontrados')
         return res.json()
-      }),
-      fetch(GEO_URL).then(res => res.json()).catch(() => null),
-    ])
+      })
+      .then(aggData => Promise.all([
+        aggData,
+        fetch(geoUrl(aggData.metadata)).then(res => res.json()).catch(() => null),
+      ]))
       .then(([aggData, geo]) => {
         setData(aggData)
         setGeoData(geo)
         setLoading(false)
 
-        // Carregar dados granulares em background (opcionais, para filtros avançados)
-        fetch('./data/granular_cube.json')
+        // Com manifest.json os dados granulares são buscados por shard, sob demanda
+        fetch('./data/manifest.json')
           .then(res => res.ok ? res.json() : null)
-          .then(cube => {
-            if (cube) {
-              setGranularData(cube)
+          .catch(() => null)
+          .then(m => {
+            if (m?.shards) {
+              setManifest(m)
+              return
             }
+
+            // Sem manifest: carregar tudo em background (opcionais, para filtros avançados)
+            fetch('./data/granular_cube.json')
+              .then(res => res.ok ? res.json() : null)
+              .then(cube => {
+                if (cube) {
+                  setGranular(g => ({ ...g, chave: '', cubo: expandirColunar(cube) }))
+                }
+              })
+              .catch(() => {})
+
+            fetch('./data/granular_dimensions.json')
+              .then(res => res.ok ? res.json() : null)
+              .then(dims => {
+                if (dims) {
+                  setGranular(g => ({ ...g, chave: '', dimensoes: expandirDimensoes(dims) }))
+                }
+              })
+              .catch(() => {})
+
+            fetch('./data/granular_salario_sketch.json')
+              .then(res => res.ok ? res.json() : null)
+              .then(sketch => {
+                if (sketch) {
+                  setGranular(g => ({ ...g, chave: '', sketch: { gamma: sketch.gamma, registros: expandirColunar(sketch.registros) } }))
+                }
+              })
+              .catch(() => {})
+
+            fetch('./data/granular_salario_histograma.json')
+              .then(res => res.ok ? res.json() : null)
+              .then(hist => {
+                if (hist) {
+                  setGranular(g => ({ ...g, chave: '', histograma: { gamma: hist.gamma, registros: expandirEsparso(hist.registros) } }))
+                }
+              })
+              .catch(() => {})
           })
-          .catch(() => {})
 
-        fetch('./data/granular_dimensions.json')
+        fetch('./data/granular_regioes.json')
           .then(res => res.ok ? res.json() : null)
-          .then(dims => {
-            if (dims) {
-              setGranularDimensions(dims)
+          .then(regions => {
+            if (regions) {
+              setGranularRegions(indexarRegioes(expandirDimensoes(regions)))
             }
           })
           .catch(() => {})
@@ -130,6 +176,28 @@ function App() {
     return map
   }, [geoData])
 
+  // Verificar se há filtros ativos
+  const hasRegionalFilter = mesoFilter || regIdrFilter || munFilter
+  const hasInteractiveFilter = cadeiaFilter || sexoFilter || faixaFilter || escolaridadeFilter || periodoFilter
+  const hasFilter = hasRegionalFilter || hasInteractiveFilter
+
+  // Shard que cobre os filtros ativos (com manifest.json)
+  const shardKey = useMemo(() => chaveShard(manifest, {
+    munRegion: munFilter ? munRegionMap[munFilter] : null,
+    regIdrFilter,
+    mesoFilter,
+    cadeiaFilter,
+  }), [manifest, munFilter, munRegionMap, regIdrFilter, mesoFilter, cadeiaFilter])
+
+  // Os filtros só se aplicam ao shard da chave atual: enquanto ele não chega,
+  // o conteúdo fica em carregamento em vez de filtrar o shard anterior
+  const granularAtual = granular && (!manifest || granular.chave === shardKey) ? granular : null
+  const granularData = granularAtual?.cubo ?? null
+  const granularDimensions = granularAtual?.dimensoes ?? null
+  const salarySketch = granularAtual?.sketch ?? null
+  const salaryHistogram = granularAtual?.histograma ?? null
+  const carregandoShard = Boolean(manifest && hasFilter && !granularAtual)
+
   // Dados filtrados por município - agora também considera cadeiaFilter
   const filteredByMunicipio = useMemo(() => {
     if (!data) return []
@@ -160,8 +228,8 @@ function App() {
         }
         munMap[r.mun].admissoes += r.admissoes
         munMap[r.mun].demissoes += r.demissoes
-        munMap[r.mun].salario_total += r.salario_medio * (r.admissoes + r.demissoes)
-        munMap[r.mun].count += r.admissoes + r.demissoes
+        munMap[r.mun].salario_total += salarioSoma(r)
+        munMap[r.mun].count += salarioN(r)
       })
 
       // Buscar nomes dos municípios do data original
@@ -252,10 +320,6 @@ function App() {
     }
   }, [data, granularData, filteredByMunicipio, mesoFilter, regIdrFilter, munFilter, cadeiaFilter])
 
-  // Verificar se há filtros ativos
-  const hasRegionalFilter = mesoFilter || regIdrFilter || munFilter
-  const hasInteractiveFilter = cadeiaFilter || sexoFilter || faixaFilter || escolaridadeFilter || periodoFilter
-  const hasFilter = hasRegionalFilter || hasInteractiveFilter
   const selectedMunName = munFilter ? municipiosList.find(m => m.codigo === munFilter)?.nome : null
 
   // Limpar filtros interativos
@@ -267,10 +331,25 @@ function App() {
     setPeriodoFilter('')
   }
 
-  // Dados filtrados do cubo granular
-  const filteredCube = useMemo(() => {
-    if (!granularData) return []
-    let filtered = granularData
+  useEffect(() => {
+    if (!manifest || !hasFilter) return
+    let ativo = true
+    carregarGranular(manifest, shardKey).then(dados => {
+      if (!ativo) return
+      setGranular({
+        chave: shardKey,
+        cubo: dados?.cubo ?? null,
+        dimensoes: dados?.dimensoes ?? null,
+        sketch: dados?.sketch ?? null,
+        histograma: dados?.histograma ?? null,
+      })
+    })
+    return () => { ativo = false }
+  }, [manifest, shardKey, hasFilter])
+
+  // Filtros regionais e interativos aplicados a registros do cubo granular
+  const filtrarCubo = useCallback((records) => {
+    let filtered = records
 
     // Aplicar filtros regionais
     if (hasRegionalFilter) {
@@ -289,7 +368,43 @@ function App() {
     if (periodoFilter) filtered = filtered.filter(r => r.periodo === periodoFilter)
 
     return filtered
-  }, [granularData, mesoFilter, regIdrFilter, munFilter, cadeiaFilter, periodoFilter, munRegionMap, hasRegionalFilter])
+  }, [mesoFilter, regIdrFilter, munFilter, cadeiaFilter, periodoFilter, munRegionMap, hasRegionalFilter])
+
+  // Dados filtrados do cubo granular
+  const filteredCube = useMemo(() => {
+    if (!granularData) return []
+
+    // Uma única mesorregião ou regional IDR: usar o cubo pré-agregado da região
+    const nivel = munFilter || (mesoFilter && regIdrFilter) ? null : (mesoFilter ? 'meso' : regIdrFilter ? 'regIdr' : null)
+    const regiao = nivel && granularRegions?.[nivel]?.[nivel === 'meso' ? mesoFilter : regIdrFilter]
+    if (regiao) {
+      let filtered = regiao
+      if (cadeiaFilter) filtered = filtered.filter(r => r.cadeia === cadeiaFilter)
+      if (periodoFilter) filtered = filtered.filter(r => r.periodo === periodoFilter)
+      return filtered
+    }
+
+    return filtrarCubo(granularData)
+  }, [granularData, granularRegions, filtrarCubo, mesoFilter, regIdrFilter, munFilter, cadeiaFilter, periodoFilter])
+
+  // Esboço salarial com os mesmos filtros (medianas por recorte)
+  const filteredSketch = useMemo(() => {
+    if (!salarySketch) return []
+    return filtrarCubo(salarySketch.registros)
+  }, [salarySketch, filtrarCubo])
+
+  // Histograma salarial do recorte: células filtradas do histograma granular
+  // ou, sem filtro regional/período, o histograma por cadeia pré-agregado
+  const salaryFaixas = useMemo(() => {
+    if (salaryHistogram && (hasRegionalFilter || periodoFilter)) {
+      return faixasHistograma(filtrarCubo(salaryHistogram.registros), salaryHistogram.gamma)
+    }
+    if (!data?.salaryHistogram) return []
+    const registros = cadeiaFilter
+      ? data.salaryHistogram.registros.filter(r => r.cadeia === cadeiaFilter)
+      : data.salaryHistogram.registros
+    return faixasHistograma(registros, data.salaryHistogram.gamma)
+  }, [data, salaryHistogram, filtrarCubo, hasRegionalFilter, periodoFilter, cadeiaFilter])
 
   // Agregações calculadas a partir do cubo filtrado
   const filteredAggregations = useMemo(() => {
@@ -380,8 +495,8 @@ function App() {
       }
       timeseriesMap[r.periodo].admissoes += r.admissoes
       timeseriesMap[r.periodo].demissoes += r.demissoes
-      timeseriesMap[r.periodo].salario_total += r.salario_medio * (r.admissoes + r.demissoes)
-      timeseriesMap[r.periodo].count += r.admissoes + r.demissoes
+      timeseriesMap[r.periodo].salario_total += salarioSoma(r)
+      timeseriesMap[r.periodo].count += salarioN(r)
     })
     const timeseries = Object.values(timeseriesMap)
       .sort((a, b) => a.periodo.localeCompare(b.periodo))
@@ -405,8 +520,8 @@ function App() {
       }
       cadeiaMap[r.cadeia].admissoes += r.admissoes
       cadeiaMap[r.cadeia].demissoes += r.demissoes
-      cadeiaMap[r.cadeia].salario_total += r.salario_medio * (r.admissoes + r.demissoes)
-      cadeiaMap[r.cadeia].count += r.admissoes + r.demissoes
+      cadeiaMap[r.cadeia].salario_total += salarioSoma(r)
+      cadeiaMap[r.cadeia].count += salarioN(r)
     })
     const totalAdmissoes = Object.values(cadeiaMap).reduce((a, c) => a + c.admissoes, 0)
     const byCadeia = Object.values(cadeiaMap)
@@ -414,7 +529,9 @@ function App() {
         ...c,
         saldo: c.admissoes - c.demissoes,
         salario_medio: c.count > 0 ? c.salario_total / c.count : 0,
-        salario_mediana: c.count > 0 ? c.salario_total / c.count : 0, // aproximação
+        salario_mediana: salarySketch
+          ? quantilSketch(filteredSketch.filter(r => r.cadeia === c.cadeia), salarySketch.gamma, 0.5)
+          : (c.count > 0 ? c.salario_total / c.count : 0), // aproximação sem esboço
         pct_admissoes: totalAdmissoes > 0 ? (c.admissoes / totalAdmissoes * 100).toFixed(1) : 0,
         cor: data.byCadeia.find(x => x.cadeia === c.cadeia)?.cor || '#808080',
       }))
@@ -429,8 +546,8 @@ function App() {
       }
       yearlyMap[ano].admissoes += r.admissoes
       yearlyMap[ano].demissoes += r.demissoes
-      yearlyMap[ano].salario_total += r.salario_medio * (r.admissoes + r.demissoes)
-      yearlyMap[ano].count += r.admissoes + r.demissoes
+      yearlyMap[ano].salario_total += salarioSoma(r)
+      yearlyMap[ano].count += salarioN(r)
     })
     const yearly = Object.values(yearlyMap)
       .map(y => ({
@@ -530,8 +647,8 @@ function App() {
           if (!escMap[r.escolaridade]) escMap[r.escolaridade] = { escolaridade: r.escolaridade, admissoes: 0, demissoes: 0, salario_total: 0, count: 0 }
           escMap[r.escolaridade].admissoes += r.admissoes
           escMap[r.escolaridade].demissoes += r.demissoes
-          escMap[r.escolaridade].salario_total += r.salario_medio * (r.admissoes + r.demissoes)
-          escMap[r.escolaridade].count += r.admissoes + r.demissoes
+          escMap[r.escolaridade].salario_total += salarioSoma(r)
+          escMap[r.escolaridade].count += salarioN(r)
         })
         const totalAdm = Object.values(escMap).reduce((a, e) => a + e.admissoes, 0)
         byEscolaridade = Object.values(escMap)
@@ -629,7 +746,7 @@ function App() {
       salaryDistribution,
       byCnae,
     }
-  }, [data, granularData, granularDimensions, hasFilter, hasRegionalFilter, filteredCube, mesoFilter, regIdrFilter, munFilter, munRegionMap, cadeiaFilter])
+  }, [data, granularData, granularDimensions, hasFilter, hasRegionalFilter, filteredCube, filteredSketch, salarySketch, mesoFilter, regIdrFilter, munFilter, munRegionMap, cadeiaFilter])
 
   if (loading) {
     return (
@@ -822,100 +939,110 @@ function App() {
           onClearAll={clearInteractiveFilters}
         />
 
-        {activeTab === 'overview' && (
-          <OverviewTab
-            timeseries={filteredAggregations?.timeseries || []}
-            byCadeia={filteredAggregations?.byCadeia || []}
-            bySexo={filteredAggregations?.bySexo || []}
-            byFaixaEtaria={filteredAggregations?.byFaixaEtaria || []}
-            seasonality={filteredAggregations?.seasonality || []}
-            hasFilter={hasRegionalFilter}
-            filterLabel={selectedMunName || mesoFilter || regIdrFilter}
-            onCadeiaClick={(cadeia) => setCadeiaFilter(prev => prev === cadeia ? '' : cadeia)}
-            onSexoClick={(sexo) => setSexoFilter(prev => prev === sexo ? '' : sexo)}
-            onFaixaClick={(faixa) => setFaixaFilter(prev => prev === faixa ? '' : faixa)}
-            cadeiaFilter={cadeiaFilter}
-            sexoFilter={sexoFilter}
-            faixaFilter={faixaFilter}
-          />
-        )}
-        {activeTab === 'cadeia' && (
-          <CadeiaTab
-            byCadeia={filteredAggregations?.byCadeia || []}
-            timeseriesCadeia={filteredAggregations?.timeseriesCadeia || []}
-            crossCadeiaSexo={filteredAggregations?.crossCadeiaSexo || []}
-            selectedCadeia={selectedCadeia}
-            setSelectedCadeia={setSelectedCadeia}
-            hasFilter={hasRegionalFilter}
-            filterLabel={selectedMunName || mesoFilter || regIdrFilter}
-            onCadeiaClick={(cadeia) => setCadeiaFilter(prev => prev === cadeia ? '' : cadeia)}
-            cadeiaFilter={cadeiaFilter}
-          />
-        )}
-        {activeTab === 'cnae' && (
-          <CnaeTab
-            byCnae={filteredAggregations?.byCnae || []}
-            byCadeia={filteredAggregations?.byCadeia || []}
-            hasFilter={hasRegionalFilter}
-            filterLabel={selectedMunName || mesoFilter || regIdrFilter}
-            onCadeiaClick={(cadeia) => setCadeiaFilter(prev => prev === cadeia ? '' : cadeia)}
-            cadeiaFilter={cadeiaFilter}
-          />
-        )}
-        {activeTab === 'perfil' && (
-          <PerfilTab
-            bySexo={filteredAggregations?.bySexo || []}
-            byFaixaEtaria={filteredAggregations?.byFaixaEtaria || []}
-            byEscolaridade={filteredAggregations?.byEscolaridade || []}
-            byPorte={filteredAggregations?.byPorte || []}
-            kpis={filteredKpis}
-            hasFilter={hasRegionalFilter}
-            filterLabel={selectedMunName || mesoFilter || regIdrFilter}
-            onSexoClick={(sexo) => setSexoFilter(prev => prev === sexo ? '' : sexo)}
-            onFaixaClick={(faixa) => setFaixaFilter(prev => prev === faixa ? '' : faixa)}
-            onEscolaridadeClick={(esc) => setEscolaridadeFilter(prev => prev === esc ? '' : esc)}
-            sexoFilter={sexoFilter}
-            faixaFilter={faixaFilter}
-            escolaridadeFilter={escolaridadeFilter}
-          />
-        )}
-        {activeTab === 'salario' && (
-          <SalarioTab
-            salaryDistribution={filteredAggregations?.salaryDistribution || []}
-            byCadeia={filteredAggregations?.byCadeia || []}
-            byEscolaridade={filteredAggregations?.byEscolaridade || []}
-            hasFilter={hasRegionalFilter}
-            filterLabel={selectedMunName || mesoFilter || regIdrFilter}
-            onCadeiaClick={(cadeia) => setCadeiaFilter(prev => prev === cadeia ? '' : cadeia)}
-            cadeiaFilter={cadeiaFilter}
-            onEscolaridadeClick={(esc) => setEscolaridadeFilter(prev => prev === esc ? '' : esc)}
-            escolaridadeFilter={escolaridadeFilter}
-          />
-        )}
-        {activeTab === 'geo' && (
-          <GeoTab
-            topMunicipios={filteredTopMunicipios}
-            byMunicipio={filteredByMunicipio}
-            metadata={metadata}
-            geoData={geoData}
-            mesoFilter={mesoFilter}
-            regIdrFilter={regIdrFilter}
-            munFilter={munFilter}
-            cadeiaFilter={cadeiaFilter}
-            hasFilter={hasFilter}
-            filterLabel={cadeiaFilter || selectedMunName || mesoFilter || regIdrFilter}
-          />
-        )}
-        {activeTab === 'tempo' && (
-          <TempoTab
-            timeseries={filteredAggregations?.timeseries || []}
-            yearly={filteredAggregations?.yearly || []}
-            seasonality={filteredAggregations?.seasonality || []}
-            hasFilter={hasRegionalFilter}
-            filterLabel={selectedMunName || mesoFilter || regIdrFilter}
-            onPeriodoClick={(periodo) => setPeriodoFilter(prev => prev === periodo ? '' : periodo)}
-            periodoFilter={periodoFilter}
-          />
+        {carregandoShard ? (
+          <div className="py-24 text-center">
+            <div className="animate-spin w-10 h-10 border-4 border-green-600 border-t-transparent rounded-full mx-auto mb-4" />
+            <p className="text-neutral-600">Carregando dados do recorte...</p>
+          </div>
+        ) : (
+          <>
+            {activeTab === 'overview' && (
+              <OverviewTab
+                timeseries={filteredAggregations?.timeseries || []}
+                byCadeia={filteredAggregations?.byCadeia || []}
+                bySexo={filteredAggregations?.bySexo || []}
+                byFaixaEtaria={filteredAggregations?.byFaixaEtaria || []}
+                seasonality={filteredAggregations?.seasonality || []}
+                hasFilter={hasRegionalFilter}
+                filterLabel={selectedMunName || mesoFilter || regIdrFilter}
+                onCadeiaClick={(cadeia) => setCadeiaFilter(prev => prev === cadeia ? '' : cadeia)}
+                onSexoClick={(sexo) => setSexoFilter(prev => prev === sexo ? '' : sexo)}
+                onFaixaClick={(faixa) => setFaixaFilter(prev => prev === faixa ? '' : faixa)}
+                cadeiaFilter={cadeiaFilter}
+                sexoFilter={sexoFilter}
+                faixaFilter={faixaFilter}
+              />
+            )}
+            {activeTab === 'cadeia' && (
+              <CadeiaTab
+                byCadeia={filteredAggregations?.byCadeia || []}
+                timeseriesCadeia={filteredAggregations?.timeseriesCadeia || []}
+                crossCadeiaSexo={filteredAggregations?.crossCadeiaSexo || []}
+                selectedCadeia={selectedCadeia}
+                setSelectedCadeia={setSelectedCadeia}
+                hasFilter={hasRegionalFilter}
+                filterLabel={selectedMunName || mesoFilter || regIdrFilter}
+                onCadeiaClick={(cadeia) => setCadeiaFilter(prev => prev === cadeia ? '' : cadeia)}
+                cadeiaFilter={cadeiaFilter}
+              />
+            )}
+            {activeTab === 'cnae' && (
+              <CnaeTab
+                byCnae={filteredAggregations?.byCnae || []}
+                byCadeia={filteredAggregations?.byCadeia || []}
+                hasFilter={hasRegionalFilter}
+                filterLabel={selectedMunName || mesoFilter || regIdrFilter}
+                onCadeiaClick={(cadeia) => setCadeiaFilter(prev => prev === cadeia ? '' : cadeia)}
+                cadeiaFilter={cadeiaFilter}
+              />
+            )}
+            {activeTab === 'perfil' && (
+              <PerfilTab
+                bySexo={filteredAggregations?.bySexo || []}
+                byFaixaEtaria={filteredAggregations?.byFaixaEtaria || []}
+                byEscolaridade={filteredAggregations?.byEscolaridade || []}
+                byPorte={filteredAggregations?.byPorte || []}
+                kpis={filteredKpis}
+                hasFilter={hasRegionalFilter}
+                filterLabel={selectedMunName || mesoFilter || regIdrFilter}
+                onSexoClick={(sexo) => setSexoFilter(prev => prev === sexo ? '' : sexo)}
+                onFaixaClick={(faixa) => setFaixaFilter(prev => prev === faixa ? '' : faixa)}
+                onEscolaridadeClick={(esc) => setEscolaridadeFilter(prev => prev === esc ? '' : esc)}
+                sexoFilter={sexoFilter}
+                faixaFilter={faixaFilter}
+                escolaridadeFilter={escolaridadeFilter}
+              />
+            )}
+            {activeTab === 'salario' && (
+              <SalarioTab
+                salaryDistribution={filteredAggregations?.salaryDistribution || []}
+                salaryFaixas={salaryFaixas}
+                byCadeia={filteredAggregations?.byCadeia || []}
+                byEscolaridade={filteredAggregations?.byEscolaridade || []}
+                hasFilter={hasRegionalFilter}
+                filterLabel={selectedMunName || mesoFilter || regIdrFilter}
+                onCadeiaClick={(cadeia) => setCadeiaFilter(prev => prev === cadeia ? '' : cadeia)}
+                cadeiaFilter={cadeiaFilter}
+                onEscolaridadeClick={(esc) => setEscolaridadeFilter(prev => prev === esc ? '' : esc)}
+                escolaridadeFilter={escolaridadeFilter}
+              />
+            )}
+            {activeTab === 'geo' && (
+              <GeoTab
+                topMunicipios={filteredTopMunicipios}
+                byMunicipio={filteredByMunicipio}
+                metadata={metadata}
+                geoData={geoData}
+                mesoFilter={mesoFilter}
+                regIdrFilter={regIdrFilter}
+                munFilter={munFilter}
+                cadeiaFilter={cadeiaFilter}
+                hasFilter={hasFilter}
+                filterLabel={cadeiaFilter || selectedMunName || mesoFilter || regIdrFilter}
+              />
+            )}
+            {activeTab === 'tempo' && (
+              <TempoTab
+                timeseries={filteredAggregations?.timeseries || []}
+                yearly={filteredAggregations?.yearly || []}
+                seasonality={filteredAggregations?.seasonality || []}
+                hasFilter={hasRegionalFilter}
+                filterLabel={selectedMunName || mesoFilter || regIdrFilter}
+                onPeriodoClick={(periodo) => setPeriodoFilter(prev => prev === periodo ? '' : periodo)}
+                periodoFilter={periodoFilter}
+              />
+            )}
+          </>
         )}
       </main>
 
@@ -1621,7 +1748,7 @@ function PerfilTab({ bySexo, byFaixaEtaria, byEscolaridade, byPorte, kpis, hasFi
   )
 }
 
-function SalarioTab({ salaryDistribution, byCadeia, byEscolaridade, hasFilter, filterLabel, onCadeiaClick, cadeiaFilter, onEscolaridadeClick, escolaridadeFilter }) {
+function SalarioTab({ salaryDistribution, salaryFaixas = [], byCadeia, byEscolaridade, hasFilter, filterLabel, onCadeiaClick, cadeiaFilter, onEscolaridadeClick, escolaridadeFilter }) {
   const [sortCol, setSortCol] = useState('p50')
   const [sortDir, setSortDir] = useState('desc')
 
@@ -1683,6 +1810,29 @@ function SalarioTab({ salaryDistribution, byCadeia, byEscolaridade, hasFilter, f
         </div>
       </Card>
 
+      {/* Histograma do recorte (soma dos histogramas das células filtradas) */}
+      {salaryFaixas.length > 0 && (
+        <Card title={`Distribuição Salarial do Recorte (mediana estimada: ${formatCurrency(Math.round(quantilHistograma(salaryFaixas, 0.5)))})`}>
+          <div className="h-64">
+            <ResponsiveContainer width="100%" height="100%">
+              <BarChart data={salaryFaixas.map(f => ({
+                ...f,
+                faixa: `${Math.round(f.de).toLocaleString('pt-BR')}–${Math.round(f.ate).toLocaleString('pt-BR')}`,
+              }))}>
+                <CartesianGrid strokeDasharray="3 3" stroke="#e5e7eb" />
+                <XAxis dataKey="faixa" tick={{ fontSize: 10 }} interval={0} angle={-35} textAnchor="end" height={60} />
+                <YAxis tick={{ fontSize: 11 }} tickFormatter={(v) => `${v.toFixed(0)}%`} />
+                <Tooltip
+                  formatter={(v, name, item) => [`${v.toFixed(1)}% (${item.payload.n.toLocaleString('pt-BR')})`, 'Movimentações']}
+                  labelFormatter={(l) => `R$ ${l}`}
+                />
+                <Bar dataKey="pct" name="Movimentações" fill="#22c55e" />
+              </BarChart>
+            </ResponsiveContainer>
+          </div>
+        </Card>
+      )}
+
       {/* Tabela de percentis */}
       <Card title="Percentis Salariais por Cadeia (clique para ordenar)">
         <div className="overflow-x-auto">
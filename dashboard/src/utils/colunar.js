@@ -0,0 +1,67 @@
+// Decodificação do layout colunar dos cubos granulares
+// { formato: 'colunar', linhas, dicionarios: { col: [...] }, colunas: { col: [...] } }
+// Colunas em `dicionarios` trazem índices; as demais, valores numéricos.
+
+export const isColunar = (obj) => obj?.formato === 'colunar'
+
+// Converte o layout colunar em lista de registros (formato antigo aceito sem alteração)
+export function expandirColunar(obj) {
+  if (!isColunar(obj)) return obj
+
+  const { linhas, dicionarios, colunas } = obj
+  const nomes = Object.keys(colunas)
+  const registros = new Array(linhas)
+
+  for (let i = 0; i < linhas; i++) {
+    const r = {}
+    for (const nome of nomes) {
+      const v = colunas[nome][i]
+      const dic = dicionarios[nome]
+      r[nome] = dic && v !== null ? dic[v] : v
+    }
+    registros[i] = r
+  }
+  return registros
+}
+
+// Aplica expandirColunar a cada dimensão de granular_dimensions
+export function expandirDimensoes(dims) {
+  if (!dims) return dims
+  return Object.fromEntries(
+    Object.entries(dims).map(([nome, cube]) => [nome, expandirColunar(cube)])
+  )
+}
+
+// Indexa os cubos regionais por nível e região: { meso: { Norte: [...] }, ... }
+export function indexarRegioes(regions) {
+  const indice = {}
+  Object.entries(regions).forEach(([nivel, registros]) => {
+    indice[nivel] = {}
+    registros.forEach(r => {
+      if (!indice[nivel][r.regiao]) indice[nivel][r.regiao] = []
+      indice[nivel][r.regiao].push(r)
+    })
+  })
+  return indice
+}
+
+// Layout esparso (CSR) dos histogramas por célula:
+// { formato: 'esparso', celulas: <colunar>, inicio: [...], bins: [...], n: [...] }
+// Os bins da célula i ficam em bins[inicio[i]:inicio[i + 1]].
+export const isEsparso = (obj) => obj?.formato === 'esparso'
+
+// Converte o layout esparso em registros { ...célula, bin, n } (listas aceitas sem alteração)
+export function expandirEsparso(obj) {
+  if (!isEsparso(obj)) return expandirColunar(obj)
+
+  const celulas = expandirColunar(obj.celulas)
+  const { inicio, bins, n } = obj
+  const registros = new Array(bins.length)
+
+  celulas.forEach((celula, i) => {
+    for (let j = inicio[i]; j < inicio[i + 1]; j++) {
+      registros[j] = { ...celula, bin: bins[j], n: n[j] }
+    }
+  })
+  return registros
+}
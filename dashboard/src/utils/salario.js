@@ -0,0 +1,67 @@
+// Estatísticas salariais a partir das medidas somáveis dos cubos granulares
+// (salario_soma, salario_n e esboço de quantis por bin logarítmico).
+// Arquivos antigos trazem só salario_medio: ponderar pelas movimentações.
+
+export const salarioSoma = (r) =>
+  r.salario_soma ?? (r.salario_medio || 0) * (r.admissoes + r.demissoes)
+
+export const salarioN = (r) =>
+  r.salario_n ?? r.admissoes + r.demissoes
+
+// Quantil aproximado a partir de registros { bin, n } do esboço
+export function quantilSketch(registros, gamma, q) {
+  const contagem = {}
+  let total = 0
+  registros.forEach(r => {
+    contagem[r.bin] = (contagem[r.bin] || 0) + r.n
+    total += r.n
+  })
+  if (total === 0) return 0
+
+  const posicao = q * (total - 1)
+  let acumulado = 0
+  const bins = Object.keys(contagem).map(Number).sort((a, b) => a - b)
+  for (const bin of bins) {
+    acumulado += contagem[bin]
+    if (acumulado > posicao) return 2 * Math.pow(gamma, bin) / (gamma + 1)
+  }
+  return 0
+}
+
+// Histograma salarial (bins logarítmicos fixos de razão gamma: o bin k cobre
+// salários em (gamma^(k-1), gamma^k]). Soma os registros { bin, n } de qualquer
+// recorte e devolve as faixas em ordem: { bin, de, ate, n, pct }
+export function faixasHistograma(registros, gamma) {
+  const contagem = {}
+  let total = 0
+  registros.forEach(r => {
+    contagem[r.bin] = (contagem[r.bin] || 0) + r.n
+    total += r.n
+  })
+
+  return Object.keys(contagem).map(Number).sort((a, b) => a - b).map(bin => ({
+    bin,
+    de: Math.pow(gamma, bin - 1),
+    ate: Math.pow(gamma, bin),
+    n: contagem[bin],
+    pct: total ? contagem[bin] / total * 100 : 0,
+  }))
+}
+
+// Quantil aproximado a partir das faixas do histograma
+// (interpolação geométrica dentro da faixa)
+export function quantilHistograma(faixas, q) {
+  const total = faixas.reduce((s, f) => s + f.n, 0)
+  if (total === 0) return 0
+
+  const posicao = q * total
+  let acumulado = 0
+  for (const f of faixas) {
+    if (acumulado + f.n >= posicao) {
+      const t = f.n ? (posicao - acumulado) / f.n : 0
+      return f.de * Math.pow(f.ate / f.de, t)
+    }
+    acumulado += f.n
+  }
+  return faixas[faixas.length - 1].ate
+}
@@ -0,0 +1,76 @@
+// Carregamento sob demanda dos dados granulares a partir do manifest.json:
+// cada filtro busca só o shard da cadeia/região que usa; sem shard
+// aplicável, os arquivos completos. Respostas ficam em cache por arquivo.
+import { expandirColunar, expandirDimensoes, expandirEsparso } from './colunar'
+
+const cache = new Map()
+
+// O hash do conteúdo na URL permite cache longo no CDN/navegador
+const urlVersionada = (arquivo, info) =>
+  `./data/${arquivo}` + (info?.sha256 ? `?v=${info.sha256.slice(0, 12)}` : '')
+
+const buscarJson = (arquivo, info) =>
+  fetch(urlVersionada(arquivo, info)).then(res => res.ok ? res.json() : null)
+
+async function buscarShard(manifest, entrada) {
+  const shard = await buscarJson(entrada.arquivo, entrada)
+  if (!shard) return null
+
+  const { cubo, sketch, histograma, ...dimensoes } = shard
+  return {
+    cubo: expandirColunar(cubo),
+    dimensoes: expandirDimensoes(dimensoes),
+    sketch: sketch ? { gamma: manifest.gamma, registros: expandirColunar(sketch) } : null,
+    histograma: histograma
+      ? { gamma: manifest.gamma_histograma, registros: expandirEsparso(histograma) }
+      : null,
+  }
+}
+
+async function buscarCompleto(manifest) {
+  const arquivos = manifest.arquivos || {}
+  const [cubo, dimensoes, sketch, histograma] = await Promise.all(
+    ['granular_cube.json', 'granular_dimensions.json', 'granular_salario_sketch.json',
+      'granular_salario_histograma.json']
+      .map(arquivo => buscarJson(arquivo, arquivos[arquivo]).catch(() => null))
+  )
+  if (!cubo) return null
+
+  return {
+    cubo: expandirColunar(cubo),
+    dimensoes: expandirDimensoes(dimensoes),
+    sketch: sketch ? { gamma: sketch.gamma, registros: expandirColunar(sketch.registros) } : null,
+    histograma: histograma
+      ? { gamma: histograma.gamma, registros: expandirEsparso(histograma.registros) }
+      : null,
+  }
+}
+
+// Chave do shard que cobre os filtros ativos ('' = arquivos completos)
+export function chaveShard(manifest, { munRegion, regIdrFilter, mesoFilter, cadeiaFilter }) {
+  const shards = manifest?.shards || {}
+  const candidatos = [
+    ['regIdr', munRegion?.regIdr],
+    ['regIdr', regIdrFilter],
+    ['meso', mesoFilter],
+    ['cadeia', cadeiaFilter],
+  ]
+  for (const [nivel, chave] of candidatos) {
+    if (chave && shards[nivel]?.[chave]) return `${nivel}:${chave}`
+  }
+  return ''
+}
+
+// Promise com { cubo, dimensoes, sketch, histograma } do shard (ou dos arquivos completos)
+export function carregarGranular(manifest, chave) {
+  const [nivel, ...resto] = chave ? chave.split(':') : []
+  const entrada = nivel ? manifest.shards?.[nivel]?.[resto.join(':')] : null
+  const id = entrada ? entrada.arquivo : 'completo'
+
+  if (!cache.has(id)) {
+    const promessa = (entrada ? buscarShard(manifest, entrada) : buscarCompleto(manifest))
+      .catch(() => null)
+    cache.set(id, promessa)
+  }
+  return cache.get(id)
+}
@@ -0,0 +1,568 @@
+"""
+Planejador de agregações do dashboard
+Os microdados são resumidos uma única vez num estado agregado por período
+(medidas aditivas, esboços e contagens de salários); todas as saídas são
+derivadas desse estado, sem voltar aos microdados
+"""
+
+import numpy as np
+import pandas as pd
+
+# Medidas aditivas: podem ser somadas entre células sem voltar aos microdados
+MEDIDAS = [
+    'registros', 'admissoes', 'demissoes',
+    'salario_soma', 'salario_n', 'salario_somaq',
+    'idade_soma', 'idade_n',
+]
+
+# Esboço de quantis do salário (DDSketch): bins logarítmicos com erro
+# relativo máximo SKETCH_ALFA; contagens por bin se somam entre células
+SKETCH_ALFA = 0.02
+SKETCH_GAMMA = (1 + SKETCH_ALFA) / (1 - SKETCH_ALFA)
+
+# Histograma salarial para gráficos: bins logarítmicos fixos de razão
+# SKETCH_GAMMA ** HISTOGRAMA_FATOR (~38%), cada um a união de bins do esboço
+HISTOGRAMA_FATOR = 8
+HISTOGRAMA_GAMMA = SKETCH_GAMMA ** HISTOGRAMA_FATOR
+
+# Município × período × cadeia: prefixo comum a todos os cubos
+CUBO = ['municipio_codigo', 'periodo', 'cadeia_produtiva']
+
+# Agrupamento mais fino necessário para cada família de saídas
+PLANO = {
+    'cubo': CUBO,
+    'sexo': CUBO + ['sexo_nome'],
+    'faixa': CUBO + ['faixa_etaria'],
+    'escolaridade': CUBO + ['escolaridade_nome'],
+    'porte': CUBO + ['porte_empresa_nome'],
+    'cnae': CUBO + ['cnae_subclasse'],
+}
+
+# Contagens exatas de cada valor de salário (medianas, quantis e desvio exatos)
+# nos recortes publicados pelo dashboard
+SALARIOS = {
+    'periodo': ['periodo'],
+    'cadeia': ['periodo', 'cadeia_produtiva'],
+    'cnae': ['periodo', 'cnae_subclasse', 'cadeia_produtiva'],
+    'sexo': ['periodo', 'sexo_nome'],
+    'faixa': ['periodo', 'faixa_etaria'],
+    'escolaridade': ['periodo', 'escolaridade_nome'],
+    'porte': ['periodo', 'porte_empresa_nome'],
+}
+
+# Esboços do salário (contagem por bin do DDSketch, tamanho limitado pelos
+# bins): estatísticas aproximadas dos recortes sem contagens exatas
+ESBOCOS = {
+    'sketch': CUBO,
+    'sketch_cbo': ['periodo', 'cbo_codigo'],
+}
+
+# Estatísticas de uma distribuição salarial ({coluna: estatística})
+DISTRIBUICAO = {
+    'min': 'min', 'p10': 0.10, 'p25': 0.25, 'p50': 'median', 'p75': 0.75,
+    'p90': 0.90, 'max': 'max', 'mean': 'mean', 'std': 'std',
+}
+
+# Colunas numéricas das tabelas do estado (não categóricas)
+NUMERICAS_ESTADO = ('bin', 'salario')
+
+
+def tabelas_estado(plano=PLANO):
+    """Tabelas do estado agregado e suas dimensões ({nome: dims})."""
+    tabelas = dict(plano)
+    tabelas.update({nome: dims + ['bin'] for nome, dims in ESBOCOS.items()})
+    tabelas.update({f'salarios_{nome}': dims + ['salario'] for nome, dims in SALARIOS.items()})
+    return tabelas
+
+
+def canonizar(tabela, dims):
+    """
+    Forma canônica de uma tabela do estado: dimensões categóricas com
+    categorias em ordem alfabética e linhas ordenadas pelas dimensões.
+    Estados montados de uma vez ou mês a mês ficam idênticos.
+    """
+    tabela = tabela.copy()
+    for col in dims:
+        if col in NUMERICAS_ESTADO:
+            continue
+        if isinstance(tabela[col].dtype, pd.CategoricalDtype):
+            # Já categórica: só recodifica (categorias usadas, em ordem alfabética)
+            usadas = tabela[col].cat.remove_unused_categories()
+            tabela[col] = usadas.cat.set_categories(sorted(usadas.cat.categories), ordered=(col == 'periodo'))
+            continue
+        valores = tabela[col].astype(object)
+        categorias = sorted(valores.dropna().unique())
+        tabela[col] = pd.Categorical(valores, categories=categorias, ordered=(col == 'periodo'))
+
+    return tabela.sort_values(dims, kind='stable').reset_index(drop=True)
+
+
+def _preparar(df, plano=PLANO, deslocamento=None):
+    """
+    Colunas usadas pelo estado, com a posição de cada linha no seu mês.
+    deslocamento: linhas de cada mês já vistas em lotes anteriores ({periodo: n}).
+    """
+    recortes = list(plano.values()) + list(ESBOCOS.values()) + list(SALARIOS.values())
+    dims = sorted({d for cols in recortes for d in cols})
+    preparado = df[dims + ['is_admissao', 'is_demissao', 'salario']].copy()
+    preparado['salario_q'] = preparado['salario'] ** 2
+    preparado['idade'] = df['idade_anos'].astype('float64')
+    # Posição no arquivo do mês: desempate por "primeira ocorrência"
+    posicao = df.groupby('periodo', observed=True).cumcount().to_numpy()
+    if deslocamento:
+        posicao = posicao + df['periodo'].astype(object).map(deslocamento).fillna(0).to_numpy(dtype=np.int64)
+    preparado['posicao'] = posicao
+    return preparado
+
+
+def agregar(df, dims):
+    """Agrupa os microdados (preparados) por `dims` calculando as medidas aditivas."""
+    return df.groupby(dims, observed=True).agg(
+        registros=('is_admissao', 'size'),
+        admissoes=('is_admissao', 'sum'),
+        demissoes=('is_demissao', 'sum'),
+        salario_soma=('salario', 'sum'),
+        salario_n=('salario', 'count'),
+        salario_somaq=('salario_q', 'sum'),
+        idade_soma=('idade', 'sum'),
+        idade_n=('idade', 'count'),
+        primeira=('posicao', 'min'),
+    ).reset_index()
+
+
+def contar_salarios(df, dims):
+    """Contagem de cada valor de salário por `dims`."""
+    validos = df.loc[df['salario'].notna(), list(dims) + ['salario']]
+    return validos.groupby(list(dims) + ['salario'], observed=True).size().rename('n').reset_index()
+
+
+def bin_sketch(salarios):
+    """Índice do bin logarítmico de cada salário (valores abaixo de 1 vão ao bin 0)."""
+    valores = np.maximum(np.asarray(salarios, dtype=np.float64), 1.0)
+    return np.ceil(np.log(valores) / np.log(SKETCH_GAMMA)).astype(np.int16)
+
+
+def valor_bin(bins):
+    """Valor representativo de cada bin (erro relativo <= SKETCH_ALFA)."""
+    return 2 * SKETCH_GAMMA ** np.asarray(bins, dtype=np.float64) / (SKETCH_GAMMA + 1)
+
+
+def sketch(df, dims):
+    """Esboço de quantis do salário por `dims`: contagem `n` por (dims, bin)."""
+    validos = df.loc[df['salario'].notna(), list(dims)]
+    return validos.assign(bin=bin_sketch(df.loc[validos.index, 'salario'])).groupby(
+        list(dims) + ['bin'], observed=True
+    ).size().rename('n').reset_index()
+
+
+def contagens_esboco(sk):
+    """
+    Esboço como contagens de salário (dims + 'salario' + 'n'): cada bin vale
+    seu representativo, com erro relativo <= SKETCH_ALFA.
+    """
+    return sk.assign(salario=valor_bin(sk['bin']))
+
+
+def histograma(sk, dims, fator=HISTOGRAMA_FATOR):
+    """
+    Histograma do salário por `dims` a partir de um esboço: o bin k cobre
+    (HISTOGRAMA_GAMMA^(k-1), HISTOGRAMA_GAMMA^k], exatamente os bins do
+    esboço b com fator*(k-1) < b <= fator*k.
+    """
+    bins = np.ceil(sk['bin'].to_numpy(dtype=np.float64) / fator).astype(np.int16)
+    return sk.assign(bin=bins).groupby(list(dims) + ['bin'], observed=True)['n'].sum().reset_index()
+
+
+def calcular_estado(df, plano=PLANO, deslocamento=None):
+    """
+    Estado agregado dos microdados ({tabela: DataFrame}), em forma canônica.
+    Para um lote de um arquivo maior, `deslocamento` dá as linhas de cada mês
+    já vistas nos lotes anteriores (ver fundir_estados).
+    """
+    return _tabelas(_preparar(df, plano, deslocamento), plano)
+
+
+def _tabela(preparado, nome, dims):
+    """Uma tabela do estado (não canônica) a partir dos microdados preparados."""
+    if nome in ESBOCOS:
+        return sketch(preparado, ESBOCOS[nome])
+    if nome.startswith('salarios_'):
+        return contar_salarios(preparado, dims[:-1])
+    return agregar(preparado, dims)
+
+
+def _tabelas(preparado, plano=PLANO):
+    """Estado canônico a partir dos microdados preparados."""
+    return {
+        nome: canonizar(_tabela(preparado, nome, dims), dims)
+        for nome, dims in tabelas_estado(plano).items()
+    }
+
+
+def estado_vazio(plano=PLANO):
+    """Estado sem registros (store sem meses), com as colunas de cada tabela."""
+    recortes = list(plano.values()) + list(ESBOCOS.values()) + list(SALARIOS.values())
+    preparado = pd.DataFrame({d: pd.Series(dtype=object) for d in sorted({d for cols in recortes for d in cols})})
+    preparado = preparado.assign(
+        is_admissao=pd.Series(dtype=bool), is_demissao=pd.Series(dtype=bool),
+        salario=pd.Series(dtype='float64'), salario_q=pd.Series(dtype='float64'),
+        idade=pd.Series(dtype='float64'), posicao=pd.Series(dtype='int64'),
+    )
+    return _tabelas(preparado, plano)
+
+
+def reclassificar_estado(estado, df, cadeia_anterior, plano=PLANO):
+    """
+    Estado de um mês com a cadeia_produtiva nova (já aplicada em `df`), a
+    partir do estado calculado quando cada linha tinha `cadeia_anterior`.
+    Só as células das cadeias que ganharam ou perderam linhas são
+    recalculadas (as demais têm exatamente as mesmas linhas); tabelas sem
+    cadeia_produtiva são mantidas.
+    """
+    anterior = pd.Series(cadeia_anterior).astype(object).fillna('').to_numpy()
+    nova = df['cadeia_produtiva'].astype(object).fillna('').to_numpy()
+    mudou = anterior != nova
+    if not mudou.any():
+        return estado
+    afetadas = (set(anterior[mudou]) | set(nova[mudou])) - {''}
+
+    # Posições calculadas sobre o mês inteiro (primeira ocorrência)
+    preparado = _preparar(df, plano)
+    preparado = preparado.loc[preparado['cadeia_produtiva'].isin(afetadas)]
+
+    novo = dict(estado)
+    for nome, dims in tabelas_estado(plano).items():
+        if 'cadeia_produtiva' not in dims:
+            continue
+        tabela = estado[nome]
+        mantidas = tabela.loc[~tabela['cadeia_produtiva'].isin(afetadas)]
+        partes = _alinhar_categorias([mantidas, _tabela(preparado, nome, dims)], dims)
+        novo[nome] = canonizar(pd.concat(partes, ignore_index=True), dims)
+    return novo
+
+
+def _alinhar_categorias(tabelas, dims):
+    """Mesmas categorias nas dimensões categóricas (o concat as mantém categóricas)."""
+    tabelas = [t.copy() for t in tabelas]
+    for col in dims:
+        if not all(isinstance(t[col].dtype, pd.CategoricalDtype) for t in tabelas):
+            continue
+        categorias = sorted(set().union(*(t[col].cat.categories for t in tabelas)))
+        for t in tabelas:
+            t[col] = t[col].cat.set_categories(categorias, ordered=False)
+    return tabelas
+
+
+def combinar_tabelas(tabelas, dims):
+    """
+    Junta tabelas de períodos distintos em forma canônica. As categorias são
+    alinhadas antes do concat, que fica categórico (sem passar por object).
+    """
+    return canonizar(pd.concat(_alinhar_categorias(tabelas, dims), ignore_index=True), dims)
+
+
+def combinar_estados(estados, plano=PLANO):
+    """Junta estados de períodos distintos num único estado canônico."""
+    return {
+        nome: combinar_tabelas([e[nome] for e in estados], dims)
+        for nome, dims in tabelas_estado(plano).items()
+    }
+
+
+def substituir_tabela(tabela, novas, remover, dims):
+    """
+    Tabela combinada sem os períodos `remover` e com as `novas` (de outros
+    períodos) acrescentadas, em forma canônica. As linhas mantidas não são
+    recalculadas: só recodificadas nas categorias alinhadas e reordenadas.
+    """
+    mantidas = tabela.loc[~tabela['periodo'].isin(remover)]
+    return combinar_tabelas([mantidas] + list(novas), dims)
+
+
+def fundir_tabelas(tabelas, dims):
+    """
+    Funde tabelas que podem ter células em comum (lotes do mesmo mês):
+    medidas e contagens somadas, primeira ocorrência pelo mínimo.
+    """
+    tabela = pd.concat(_alinhar_categorias(tabelas, dims), ignore_index=True)
+    medidas = [c for c in tabela.columns if c not in dims]
+    regras = {c: ('min' if c == 'primeira' else 'sum') for c in medidas}
+    tabela = tabela.groupby(dims, observed=True, sort=False).agg(regras).reset_index()
+    return canonizar(tabela, dims)
+
+
+def fundir_estados(estados, plano=PLANO):
+    """Funde estados que podem ter células em comum (ver fundir_tabelas)."""
+    return {
+        nome: fundir_tabelas([e[nome] for e in estados], dims)
+        for nome, dims in tabelas_estado(plano).items()
+    }
+
+
+def bytes_estado(estado):
+    """Memória ocupada pelas tabelas de um estado, em bytes."""
+    return int(sum(tabela.memory_usage(deep=True).sum() for tabela in estado.values()))
+
+
+def consolidar(agg, dims):
+    """Reagrupa um agregado em dimensões mais grossas somando as medidas."""
+    return agg.groupby(dims, observed=True)[MEDIDAS].sum().reset_index()
+
+
+def consolidar_por_mapa(agg, coluna, mapa, nome, dims, padrao='Não informado'):
+    """
+    Reagrupa um agregado trocando `coluna` por `mapa[coluna]` (ex.: município
+    -> região) e somando as medidas; códigos sem mapeamento vão para `padrao`.
+    """
+    chave = agg[coluna].astype(str).map(mapa).fillna(padrao).rename(nome)
+    grupos = [chave] + [agg[d] for d in dims]
+    return agg.groupby(grupos, observed=True)[MEDIDAS].sum().reset_index()
+
+
+def ordem_aparicao(agg):
+    """
+    Rank de primeira ocorrência de cada célula de um agregado base na ordem
+    dos microdados (mês a mês e, dentro do mês, pela posição no arquivo).
+    """
+    ordem = agg.sort_values(['periodo', 'primeira'], kind='stable').index
+    return pd.Series(np.arange(len(ordem)), index=ordem).reindex(agg.index)
+
+
+def dominante(agg, grupo, coluna):
+    """
+    Categoria mais frequente de `coluna` em cada grupo (moda por grupo) a
+    partir de um agregado base. Empates ficam com o valor que aparece
+    primeiro no grupo, como em value_counts sobre os microdados.
+    """
+    contagem = agg[[grupo, coluna, 'registros']].assign(_ordem=ordem_aparicao(agg)).groupby(
+        [grupo, coluna], observed=True
+    ).agg(size=('registros', 'sum'), min=('_ordem', 'min')).reset_index()
+
+    contagem = contagem.sort_values(
+        [grupo, 'size', 'min'], ascending=[True, False, True], kind='stable'
+    )
+    moda = contagem.drop_duplicates(grupo).set_index(grupo)[coluna]
+    return moda.astype(object).rename(f'{coluna}_dominante')
+
+
+def salario_medio(agg):
+    """Média salarial a partir das medidas aditivas (NaN sem salários)."""
+    return agg['salario_soma'] / agg['salario_n'].where(agg['salario_n'] > 0)
+
+
+def salario_desvio(agg):
+    """Desvio padrão amostral do salário a partir das medidas aditivas."""
+    n = agg['salario_n'].where(agg['salario_n'] > 1)
+    variancia = (agg['salario_somaq'] - agg['salario_soma'] ** 2 / n) / (n - 1)
+    return np.sqrt(variancia.clip(lower=0))
+
+
+def ordenar_salarios(contagens, dims):
+    """
+    Valores distintos do salário em ordem crescente dentro de cada grupo de
+    `dims`, com as posições acumuladas (ordenação única, reusada por todas as
+    estatísticas). `contagens`: colunas dims + 'salario' + 'n' (tabelas
+    salarios_* do estado, ou contar_salarios sobre microdados).
+    """
+    dims = list(dims)
+    chaves = dims or ['_todos']
+    if not dims:
+        contagens = contagens.assign(_todos=0)
+
+    t = contagens.groupby(chaves + ['salario'], observed=True)['n'].sum().reset_index()
+    t = t.loc[t['n'] > 0].reset_index(drop=True)
+    grupo = t.groupby(chaves, observed=True, sort=False).ngroup().to_numpy()
+    n = t['n'].to_numpy(dtype=np.int64)
+
+    total = np.bincount(grupo, weights=n)
+    fim = np.cumsum(n) - np.repeat(np.cumsum(total) - total, np.bincount(grupo))
+    mudou = grupo[1:] != grupo[:-1]
+    primeiro = np.r_[True, mudou] if len(t) else mudou
+    ultimo = np.r_[mudou, True] if len(t) else mudou
+    return {
+        'dims': dims,
+        'chaves': t.loc[primeiro, dims].reset_index(drop=True),
+        'grupo': grupo,
+        'n': n,
+        'valores': t['salario'].to_numpy(dtype=np.float64),
+        'total': total,
+        'inicio': fim - n,
+        'fim': fim,
+        'primeiro': primeiro,
+        'ultimo': ultimo,
+    }
+
+
+def _valor_no_rank(ordenado, rank):
+    """Valor de cada grupo na posição `rank` (0 = menor) da amostra ordenada."""
+    r = rank[ordenado['grupo']]
+    return ordenado['valores'][(ordenado['inicio'] <= r) & (r < ordenado['fim'])]
+
+
+def _estatistica(ordenado, estatistica):
+    """Estatística de cada grupo de uma amostra ordenada (ver estatistica_salarios)."""
+    grupo, n, valores, total = ordenado['grupo'], ordenado['n'], ordenado['valores'], ordenado['total']
+
+    if estatistica in ('mean', 'std'):
+        media = np.bincount(grupo, weights=valores * n) / total
+        if estatistica == 'mean':
+            return media
+        quadrados = np.bincount(grupo, weights=n * (valores - media[grupo]) ** 2)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(total > 1, np.sqrt(quadrados / (total - 1)), np.nan)
+    if estatistica == 'min':
+        return valores[ordenado['primeiro']]
+    if estatistica == 'max':
+        return valores[ordenado['ultimo']]
+
+    q = 0.5 if estatistica == 'median' else float(estatistica)
+    posicao = (total - 1) * q
+    baixo = _valor_no_rank(ordenado, np.floor(posicao))
+    alto = _valor_no_rank(ordenado, np.ceil(posicao))
+    if estatistica == 'median':
+        return (baixo + alto) / 2
+
+    # Mesma interpolação de numpy.quantile (method='linear')
+    fracao = posicao - np.floor(posicao)
+    diferenca = alto - baixo
+    return np.where(fracao >= 0.5, alto - diferenca * (1 - fracao), baixo + diferenca * fracao)
+
+
+def distribuicao_salarios(contagens, dims, estatisticas=DISTRIBUICAO, ordenado=None):
+    """
+    Várias estatísticas exatas do salário por `dims` numa única ordenação:
+    DataFrame com as dims e uma coluna por estatística ({coluna: estatística}).
+    Serve a qualquer recorte (cadeia, município, escolaridade, CBO, porte...).
+    """
+    if ordenado is None:
+        ordenado = ordenar_salarios(contagens, dims)
+    resultado = ordenado['chaves'].copy()
+    for coluna, estatistica in estatisticas.items():
+        resultado[coluna] = _estatistica(ordenado, estatistica)
+    return resultado
+
+
+def estatistica_salarios(contagens, dims, estatistica, ordenado=None):
+    """
+    Estatística exata do salário por `dims` a partir das contagens de valores:
+    'median', 'mean', 'std', 'min', 'max' ou um quantil (float entre 0 e 1,
+    interpolação linear como em Series.quantile). Sem dims, retorna escalar.
+    """
+    if ordenado is None:
+        ordenado = ordenar_salarios(contagens, dims)
+    resultado = _estatistica(ordenado, estatistica)
+
+    dims = list(dims)
+    if not dims:
+        return float(resultado[0]) if len(resultado) else np.nan
+
+    chaves = ordenado['chaves']
+    indice = (pd.MultiIndex.from_frame(chaves) if len(dims) > 1
+              else pd.Index(chaves[dims[0]], name=dims[0]))
+    nome = f'salario_q{round(estatistica * 100)}' if isinstance(estatistica, float) else f'salario_{estatistica}'
+    return pd.Series(resultado, index=indice, name=nome)
+
+
+class PlanoAgregacao:
+    """
+    Saídas derivadas de um estado agregado (ver calcular_estado):
+    reagrupamentos das tabelas base e estatísticas salariais, memorizados.
+    """
+
+    def __init__(self, estado, plano=PLANO):
+        self.estado = estado
+        self.plano = plano
+        self._cache = {}
+
+    def base(self, nome):
+        """Agregado base (agrupamento mais fino) da família `nome`."""
+        return self.estado[nome]
+
+    def rollup(self, nome, dims):
+        """Agregado da família `nome` reagrupado em `dims`."""
+        dims = list(dims)
+        if dims == self.plano[nome]:
+            return self.base(nome)
+
+        chave = ('rollup', nome, tuple(dims))
+        if chave not in self._cache:
+            self._cache[chave] = consolidar(self.base(nome), dims)
+        return self._cache[chave]
+
+    def _contagens(self, dims):
+        """
+        Menor tabela de contagens de salário que cobre as dimensões pedidas:
+        contagens exatas (recortes publicados) ou, para os demais recortes
+        (município, CBO...), o menor esboço que os cobre (erro relativo <=
+        SKETCH_ALFA).
+        """
+        exatas = [
+            self.estado[f'salarios_{nome}'] for nome, cols in SALARIOS.items()
+            if set(dims) <= set(cols)
+        ]
+        if exatas:
+            return min(exatas, key=len)
+
+        esbocos = [self.estado[nome] for nome, cols in ESBOCOS.items() if set(dims) <= set(cols)]
+        if not esbocos:
+            raise ValueError(f"dimensões fora do estado agregado: {list(dims)}")
+        return contagens_esboco(min(esbocos, key=len))
+
+    def _ordenado(self, dims):
+        """Salários ordenados por grupo de `dims` (uma ordenação por recorte)."""
+        chave = ('ordenado', tuple(dims))
+        if chave not in self._cache:
+            self._cache[chave] = ordenar_salarios(self._contagens(dims), dims)
+        return self._cache[chave]
+
+    def salario(self, dims, estatistica):
+        """Estatística não aditiva do salário por `dims` (ex.: 'median', 'std', 0.9)."""
+        chave = ('salario', tuple(dims), estatistica)
+        if chave not in self._cache:
+            self._cache[chave] = estatistica_salarios(None, dims, estatistica, self._ordenado(dims))
+        return self._cache[chave]
+
+    def distribuicao(self, dims, estatisticas=DISTRIBUICAO):
+        """Distribuição salarial por `dims` (DataFrame, ver distribuicao_salarios)."""
+        return distribuicao_salarios(None, dims, estatisticas, self._ordenado(dims))
+
+    def sketch(self):
+        """Esboço de quantis do salário por município × período × cadeia."""
+        return self.estado['sketch']
+
+    def histograma(self, dims=CUBO):
+        """Histograma do salário por `dims` (bins de razão HISTOGRAMA_GAMMA)."""
+        chave = ('histograma', tuple(dims))
+        if chave not in self._cache:
+            self._cache[chave] = histograma(self.sketch(), dims)
+        return self._cache[chave]
+
+    def dominante(self, familia, grupo, coluna):
+        """Categoria mais frequente de `coluna` por `grupo` (memorizada)."""
+        chave = ('dominante', familia, grupo, coluna)
+        if chave not in self._cache:
+            self._cache[chave] = dominante(self.base(familia), grupo, coluna)
+        return self._cache[chave]
+
+    def memorizar(self, chave, funcao, *args):
+        """
+        Resultado de funcao(*args) memorizado sob `chave` (tupla que identifica
+        o resultado pelo conteúdo das entradas, não pela identidade dos objetos).
+        """
+        chave = ('memorizado', *chave)
+        if chave not in self._cache:
+            self._cache[chave] = funcao(*args)
+        return self._cache[chave]
+
+    def ordem(self, familia, coluna):
+        """Valores de `coluna` na ordem em que aparecem nos microdados."""
+        agg = self.base(familia)
+        primeiros = agg.assign(_ordem=ordem_aparicao(agg)).groupby(coluna, observed=True)['_ordem'].min()
+        return list(primeiros.sort_values(kind='stable').index.astype(object))
+
+    def com_salario(self, agg, dims, *estatisticas):
+        """Anexa estatísticas não aditivas do salário a um agregado por `dims`."""
+        for estatistica in estatisticas:
+            serie = self.salario(dims, estatistica)
+            agg = agg.merge(serie.reset_index(), on=list(dims), how='left')
+        return agg
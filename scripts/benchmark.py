@@ -0,0 +1,173 @@
+"""
+Benchmark do pipeline de dados com microdados sintéticos
+Gera CAGEDMOV sintéticos (dados_sinteticos) em várias escalas de volume e mede
+cada etapa: leitura do CSV, process_microdata, gravação das partições,
+load_microdata, estado agregado, cada generate_* e cada gravação de JSON.
+Os resultados são acrescentados a um arquivo JSON Lines (uma linha por execução)
+para acompanhar regressões ao longo do tempo
+"""
+
+import os
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+import pandas as pd
+from datetime import datetime
+from functools import partial
+
+import dados_sinteticos
+import prepare_dashboard_granular as prepare
+from download_caged_granular import ler_csv_filtrado, process_microdata
+from particoes import gravar_particao, preparar_store
+from recortes import RECORTE_PADRAO, store_path
+from agregacao import PlanoAgregacao, calcular_estado
+from saida_json import EscritorSaidas, serializar_saida
+
+SCRIPT_DIR = os.path.dirname(__file__)
+RESULTADOS_PATH = os.path.join(SCRIPT_DIR, '..', 'data', 'processed', 'benchmark.jsonl')
+
+# Volume atual de referência (escala 1x): movimentações PR/agro por mês
+LINHAS_MES = 12_000
+MESES = 12
+ESCALAS = (1, 10, 100)
+SEMENTE = 42
+
+
+class Cronometro:
+    """Acumula o tempo de cada etapa ({etapa: {'segundos', 'linhas'}})."""
+
+    def __init__(self):
+        self.etapas = {}
+
+    def medir(self, etapa, funcao, *args, linhas=None, **kwargs):
+        """Executa funcao(*args, **kwargs) somando o tempo à etapa."""
+        inicio = time.perf_counter()
+        resultado = funcao(*args, **kwargs)
+        decorrido = time.perf_counter() - inicio
+
+        registro = self.etapas.setdefault(etapa, {'segundos': 0.0, 'linhas': 0})
+        registro['segundos'] += decorrido
+        if linhas is None and isinstance(resultado, (pd.DataFrame, list)):
+            linhas = len(resultado)
+        registro['linhas'] += linhas or 0
+        return resultado
+
+
+def medir_escala(escala, meses=MESES, linhas_mes=LINHAS_MES, semente=SEMENTE):
+    """Executa o pipeline completo sobre dados sintéticos de uma escala."""
+    cronometro = Cronometro()
+    linhas = linhas_mes * escala
+    periodos = [(2024 + (m // 12), m % 12 + 1) for m in range(meses)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        raw_dir = os.path.join(tmp, 'raw')
+        store = store_path(RECORTE_PADRAO, raw_dir)
+        preparar_store(store)
+        manifesto = {}
+
+        # Download simulado: arquivo nacional com metade dos registros fora do PR/agro
+        for ano, mes in periodos:
+            bruto = dados_sinteticos.gerar_cagedmov(linhas * 2, ano, mes, semente=semente)
+            csv_path = dados_sinteticos.gravar_cagedmov(bruto, os.path.join(tmp, f'CAGEDMOV{ano}{mes:02d}.txt'))
+            del bruto
+
+            df = cronometro.medir('ler_csv_filtrado', ler_csv_filtrado, csv_path)
+            df = cronometro.medir('process_microdata', process_microdata, df, ano, mes)
+            cronometro.medir('gravar_particao', gravar_particao, df, ano, mes, manifesto,
+                             base=store, linhas=len(df))
+            os.remove(csv_path)
+
+        prepare.RAW_DIR = raw_dir
+        df = cronometro.medir('load_microdata', prepare.load_microdata)
+        estado = cronometro.medir('calcular_estado', calcular_estado, df, linhas=len(df))
+        total = len(df)
+        del df
+
+        # Entradas dos generate_* além do plano (mesma tabela de gerar_saidas)
+        municipios = prepare.load_municipios_geo()
+        plano = PlanoAgregacao(estado)
+        entradas = {
+            'mun_names': prepare.load_municipio_names(municipios),
+            'regioes': prepare.load_municipio_regioes(municipios),
+            'cnae_desc': prepare.load_cnae_descricoes(),
+        }
+
+        escritor = EscritorSaidas(os.path.join(tmp, 'saida'))
+        os.makedirs(escritor.base_dir)
+        saidas = [(arquivo, funcao, serializar_saida, nomes)
+                  for arquivo, (funcao, *nomes) in prepare.SAIDAS.items()]
+        saidas += [(arquivo, funcao, partial(serializar, formato_cubo='colunar'), nomes)
+                   for arquivo, (funcao, serializar, *nomes) in prepare.SAIDAS_GRANULARES.items()]
+        for arquivo, funcao, serializar, nomes in saidas:
+            resultado = cronometro.medir(funcao.__name__, funcao, plano, *(entradas[nome] for nome in nomes))
+
+            info = cronometro.medir(f'json:{arquivo}', lambda: escritor.escrever(arquivo, *serializar(resultado)))
+            cronometro.etapas[f'json:{arquivo}']['bytes'] = info['bytes']
+
+    return {
+        'escala': escala,
+        'meses': meses,
+        'linhas': total,
+        'etapas': {
+            etapa: {**valores, 'segundos': round(valores['segundos'], 4)}
+            for etapa, valores in cronometro.etapas.items()
+        },
+    }
+
+
+def _commit():
+    """Commit atual do repositório (None fora de um checkout git)."""
+    try:
+        saida = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=SCRIPT_DIR,
+                               capture_output=True, text=True, check=True)
+        return saida.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def executar(escalas=ESCALAS, meses=MESES, linhas_mes=LINHAS_MES, semente=SEMENTE,
+             resultados_path=RESULTADOS_PATH):
+    """Mede todas as escalas e acrescenta o resultado ao arquivo JSON Lines."""
+    execucao = {
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'commit': _commit(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'maquina': platform.machine(),
+        'cpus': os.cpu_count(),
+        'semente': semente,
+        'linhas_mes': linhas_mes,
+        'escalas': [],
+    }
+
+    for escala in escalas:
+        print(f"\nEscala {escala}x ({linhas_mes * escala:,} registros/mês, {meses} meses)...")
+        resultado = medir_escala(escala, meses, linhas_mes, semente)
+        execucao['escalas'].append(resultado)
+
+        for etapa, valores in sorted(resultado['etapas'].items(), key=lambda item: -item[1]['segundos']):
+            print(f"  {etapa:45} {valores['segundos']:9.3f} s  {valores['linhas']:>12,} linhas")
+        print(f"  {'TOTAL':45} {sum(v['segundos'] for v in resultado['etapas'].values()):9.3f} s")
+
+    os.makedirs(os.path.dirname(resultados_path), exist_ok=True)
+    with open(resultados_path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(execucao, ensure_ascii=False) + '\n')
+    print(f"\nResultados: {resultados_path}")
+    return execucao
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark do pipeline com CAGEDMOV sintéticos')
+    parser.add_argument('--escalas', type=int, nargs='+', default=list(ESCALAS),
+                        help='múltiplos do volume atual (1x = --linhas-mes registros/mês)')
+    parser.add_argument('--meses', type=int, default=MESES, help='meses gerados por escala')
+    parser.add_argument('--linhas-mes', type=int, default=LINHAS_MES,
+                        help='registros PR/agro por mês na escala 1x')
+    parser.add_argument('--semente', type=int, default=SEMENTE)
+    parser.add_argument('--saida', default=RESULTADOS_PATH, help='arquivo JSON Lines de resultados')
+    args = parser.parse_args()
+
+    executar(args.escalas, args.meses, args.linhas_mes, args.semente, args.saida)
@@ -0,0 +1,142 @@
+"""
+Cache em disco dos arquivos .7z do CAGEDMOV
+Cada mês baixado fica em arquivos_7z/CAGEDMOVAAAAMM.7z, com um .json ao lado
+registrando tamanho e data (SIZE/MDTM) no FTP e o sha256 do arquivo. Downloads
+interrompidos ficam em .parcial e são retomados (FTP REST) na próxima
+tentativa, desde que o arquivo remoto não tenha mudado.
+"""
+
+import os
+import json
+import hashlib
+
+from particoes import RAW_DIR
+
+ARQUIVOS_DIR = os.path.join(RAW_DIR, 'arquivos_7z')
+
+SUFIXO_PARCIAL = '.parcial'
+SUFIXO_INFO = '.json'
+
+# Bloco de leitura no cálculo do sha256
+BLOCO_HASH = 8 * 1024 * 1024
+
+
+def caminho_arquivo(ano, mes, base=ARQUIVOS_DIR):
+    """Caminho do .7z de um mês no cache."""
+    return os.path.join(base, f'CAGEDMOV{ano}{str(mes).zfill(2)}.7z')
+
+
+def caminho_parcial(arquivo):
+    """Download em andamento (ou interrompido) de um arquivo."""
+    return arquivo + SUFIXO_PARCIAL
+
+
+def _ler_json(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _gravar_json(path, obj):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(obj, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _remover(*paths):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def sha256_arquivo(path):
+    """Hash hexadecimal de um arquivo, lido em blocos."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for bloco in iter(lambda: f.read(BLOCO_HASH), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def carregar_info(arquivo):
+    """Origem de um arquivo em cache ({'tamanho', 'mdtm', 'sha256'}); None se ausente."""
+    return _ler_json(arquivo + SUFIXO_INFO)
+
+
+def arquivo_valido(arquivo, remoto=None):
+    """
+    Verifica se o arquivo está completo no cache e, com `remoto` (SIZE/MDTM
+    atuais do FTP), se ainda corresponde à versão publicada.
+    """
+    info = carregar_info(arquivo)
+    if info is None or not os.path.exists(arquivo):
+        return False
+    if os.path.getsize(arquivo) != info['tamanho']:
+        return False
+    if remoto is not None:
+        return info['tamanho'] == remoto['tamanho'] and info.get('mdtm') == remoto.get('mdtm')
+    return True
+
+
+def preparar_parcial(arquivo, remoto):
+    """
+    Posição de retomada do download: bytes já gravados no .parcial, se ele
+    for da mesma versão remota (tamanho/MDTM); senão começa do zero.
+    """
+    os.makedirs(os.path.dirname(arquivo), exist_ok=True)
+    parcial = caminho_parcial(arquivo)
+    info_parcial = parcial + SUFIXO_INFO
+
+    origem = _ler_json(info_parcial)
+    inicio = os.path.getsize(parcial) if os.path.exists(parcial) else 0
+    mesma_versao = origem is not None and (origem.get('tamanho'), origem.get('mdtm')) == (
+        remoto['tamanho'], remoto.get('mdtm'))
+
+    if not mesma_versao or inicio > remoto['tamanho']:
+        _remover(parcial)
+        inicio = 0
+    _gravar_json(info_parcial, {'tamanho': remoto['tamanho'], 'mdtm': remoto.get('mdtm')})
+    return inicio
+
+
+def concluir(arquivo, remoto):
+    """
+    Valida o .parcial contra o tamanho remoto e o promove a arquivo do cache.
+    Retorna a origem gravada ({'tamanho', 'mdtm', 'sha256'}).
+    """
+    parcial = caminho_parcial(arquivo)
+    tamanho = os.path.getsize(parcial)
+    if tamanho != remoto['tamanho']:
+        if tamanho > remoto['tamanho']:
+            # Não há como aproveitar: recomeçar na próxima tentativa
+            _remover(parcial, parcial + SUFIXO_INFO)
+        raise IOError(f"{os.path.basename(arquivo)}: {tamanho:,} bytes, esperado {remoto['tamanho']:,}")
+
+    info = {'tamanho': tamanho, 'mdtm': remoto.get('mdtm'), 'sha256': sha256_arquivo(parcial)}
+    os.replace(parcial, arquivo)
+    _gravar_json(arquivo + SUFIXO_INFO, info)
+    _remover(parcial + SUFIXO_INFO)
+    return info
+
+
+def descartar(arquivo):
+    """Remove um arquivo do cache (ex.: .7z corrompido), forçando novo download."""
+    _remover(arquivo, arquivo + SUFIXO_INFO)
+
+
+def arquivos_em_cache(base=ARQUIVOS_DIR):
+    """Meses completos no cache: {(ano, mes): {'tamanho', 'mdtm', 'sha256'}}."""
+    if not os.path.isdir(base):
+        return {}
+
+    meses = {}
+    for nome in sorted(os.listdir(base)):
+        if not (nome.startswith('CAGEDMOV') and nome.endswith('.7z')):
+            continue
+        arquivo = os.path.join(base, nome)
+        if arquivo_valido(arquivo):
+            competencia = nome[len('CAGEDMOV'):-len('.7z')]
+            meses[(int(competencia[:4]), int(competencia[4:]))] = carregar_info(arquivo)
+    return meses
@@ -0,0 +1,90 @@
+"""
+Layout dos arquivos CAGEDMOV (Novo CAGED - movimentações)
+Lê apenas as colunas usadas no processamento, com tipos compactos
+"""
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+SEPARADOR = ';'
+ENCODING = 'UTF-8'
+
+# Colunas do CAGEDMOV usadas por process_microdata: (tipo pandas, tipo Arrow)
+# Códigos que podem vir vazios usam inteiros anuláveis (Int8/Int16/Int32)
+COLUNAS = {
+    'uf': ('int8', pa.int8()),
+    'município': ('int32', pa.int32()),
+    'subclasse': ('int32', pa.int32()),
+    'saldomovimentação': ('int8', pa.int8()),
+    'cbo2002ocupação': ('Int32', pa.int32()),
+    'graudeinstrução': ('Int8', pa.int8()),
+    'idade': ('Int16', pa.int16()),
+    'horascontratuais': ('float32', pa.float32()),
+    'raçacor': ('Int8', pa.int8()),
+    'sexo': ('Int8', pa.int8()),
+    'tipomovimentação': ('Int8', pa.int8()),
+    'indtrabintermitente': ('Int8', pa.int8()),
+    'indtrabparcial': ('Int8', pa.int8()),
+    'salário': ('float64', pa.float64()),
+    'tamestabjan': ('Int8', pa.int8()),
+    'indicadoraprendiz': ('Int8', pa.int8()),
+}
+
+TIPOS_PANDAS = {col: tipos[0] for col, tipos in COLUNAS.items()}
+TIPOS_ARROW = {col: tipos[1] for col, tipos in COLUNAS.items()}
+
+# O parser C é lento com inteiros anuláveis: ler como float32 e converter depois
+TIPOS_LEITURA_C = {
+    col: 'float32' if tipo[0].isupper() else tipo
+    for col, tipo in TIPOS_PANDAS.items()
+}
+
+# Tamanho do bloco lido pelo motor pyarrow (bytes)
+BLOCO_ARROW = 64 << 20
+
+ENGINES = ('c', 'pyarrow')
+
+
+def _blocos_c(fonte, chunksize):
+    """Leitura em blocos com o parser C do pandas."""
+    leitor = pd.read_csv(
+        fonte,
+        sep=SEPARADOR,
+        encoding=ENCODING,
+        usecols=list(COLUNAS),
+        dtype=TIPOS_LEITURA_C,
+        decimal=',',
+        chunksize=chunksize,
+    )
+    for bloco in leitor:
+        yield bloco.astype(TIPOS_PANDAS)
+
+
+def _blocos_pyarrow(fonte):
+    """Leitura em blocos com o leitor CSV multithread do pyarrow."""
+    leitor = pa_csv.open_csv(
+        fonte,
+        read_options=pa_csv.ReadOptions(block_size=BLOCO_ARROW, encoding='utf8'),
+        parse_options=pa_csv.ParseOptions(delimiter=SEPARADOR),
+        convert_options=pa_csv.ConvertOptions(
+            column_types=TIPOS_ARROW,
+            include_columns=list(COLUNAS),
+            decimal_point=',',
+        ),
+    )
+    for lote in leitor:
+        # Mesmos dtypes do parser C (anuláveis onde o schema pede)
+        yield lote.to_pandas().astype(TIPOS_PANDAS)
+
+
+def ler_cagedmov(fonte, engine='c', chunksize=500_000):
+    """
+    Itera sobre blocos de um arquivo CAGEDMOV (caminho ou arquivo binário).
+    Salário e horas já chegam como float (vírgula decimal convertida na leitura).
+    """
+    if engine == 'pyarrow':
+        return _blocos_pyarrow(fonte)
+    if engine == 'c':
+        return _blocos_c(fonte, chunksize)
+    raise ValueError(f"engine inválido: {engine} (opções: {', '.join(ENGINES)})")
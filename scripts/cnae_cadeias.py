@@ -3,6 +3,9 @@ Mapeamento de CNAE Subclasse para Cadeias Produtivas
 Permite agregação por cadeia mantendo granularidade máxima
 """
 
+import numpy as np
+import pandas as pd
+
 # Mapeamento CNAE Subclasse (7 dígitos) -> Cadeia Produtiva
 CNAE_CADEIA = {
     # ========================================
@@ -183,6 +186,13 @@ CNAE_CADEIA = {
     '0163600': 'Serviços Agrícolas',  # Atividades de pós-colheita
 }
 
+# Divisões CNAE da Seção A (agropecuária)
+DIVISAO_CNAE = {
+    '01': 'Agricultura e Pecuária',
+    '02': 'Silvicultura',
+    '03': 'Pesca e Aquicultura'
+}
+
 # Descrições das cadeias produtivas
 CADEIAS_DESCRICAO = {
     'Bovinocultura de Corte': 'Criação de bovinos para abate',
@@ -335,4 +345,98 @@ def get_faixa_etaria(idade):
             return faixa
     return 'Não informado'
 
-import pandas as pd
+
+# ========================================
+# DERIVAÇÕES VETORIZADAS (colunas inteiras)
+# ========================================
+
+def mapear_categorico(serie, mapeamento, padrao):
+    """
+    Aplica `mapeamento` (dict ou função) apenas aos valores distintos da série
+    e propaga o resultado pelos códigos categóricos.
+    Valores ausentes ou sem mapeamento recebem `padrao` (None = ausente).
+    Retorna uma Series categórica com rótulos em ordem alfabética.
+    """
+    cat = pd.Categorical(serie)
+    busca = mapeamento if callable(mapeamento) else mapeamento.get
+
+    rotulos = [busca(v) for v in cat.categories]
+    rotulos = [padrao if r is None else r for r in rotulos]
+
+    # Última posição da tabela atende códigos -1 (valores ausentes)
+    usados = set(rotulos)
+    if (cat.codes == -1).any():
+        usados.add(padrao)
+    categorias = sorted(r for r in usados if r is not None)
+    posicao = {r: i for i, r in enumerate(categorias)}
+    tabela = np.array([posicao.get(r, -1) for r in rotulos + [padrao]], dtype=np.int32)
+
+    codigos = tabela[cat.codes]
+    return pd.Series(pd.Categorical.from_codes(codigos, categorias), index=serie.index)
+
+
+def mapear_codigos(codigos, mapa, padrao='Não informado'):
+    """Converte códigos (SEXO, GRAU_INSTRUCAO, ...) em nomes, de forma vetorizada."""
+    return mapear_categorico(codigos, mapa, padrao)
+
+
+def derivar_cadeia(subclasses, fallback=None, mapeamento=None):
+    """
+    Cadeia produtiva de cada subclasse CNAE (aceita códigos int ou str).
+    Sem `fallback`, subclasses sem mapeamento ficam como 'Outros'; com ele,
+    mantêm o valor correspondente de `fallback` (ex.: cadeia já gravada).
+    mapeamento: CNAE -> cadeia a aplicar (None = CNAE_CADEIA atual).
+    Só as subclasses distintas são consultadas; o resultado é propagado
+    pelos códigos categóricos, sem operações por linha em strings.
+    """
+    mapeamento = CNAE_CADEIA if mapeamento is None else mapeamento
+
+    def busca(cnae):
+        return mapeamento.get(str(cnae).zfill(7))
+
+    if fallback is None:
+        return mapear_categorico(subclasses, busca, 'Outros')
+
+    remapeada = mapear_categorico(subclasses, busca, None).array
+    anterior = pd.Categorical(fallback)
+
+    # Categorias do resultado: cadeias mapeadas + valores de fallback usados
+    sem_mapa = remapeada.codes == -1
+    usadas = np.unique(anterior.codes[sem_mapa])
+    categorias = sorted(set(remapeada.categories) | {anterior.categories[c] for c in usadas if c >= 0})
+    posicao = {c: i for i, c in enumerate(categorias)}
+
+    # Última posição das tabelas atende códigos -1 (ausentes)
+    de_remapeada = np.array([posicao[c] for c in remapeada.categories] + [-1], dtype=np.int32)
+    de_anterior = np.array([posicao.get(c, -1) for c in anterior.categories] + [-1], dtype=np.int32)
+    codigos = np.where(sem_mapa, de_anterior[anterior.codes], de_remapeada[remapeada.codes])
+    return pd.Series(pd.Categorical.from_codes(codigos, categorias), index=subclasses.index)
+
+
+# Limites das faixas etárias (inclusivos), na ordem de FAIXA_ETARIA
+_FAIXA_MIN = np.array([faixa[0] for faixa in FAIXA_ETARIA])
+_FAIXA_MAX = np.array([faixa[1] for faixa in FAIXA_ETARIA])
+_FAIXA_NOME = list(FAIXA_ETARIA.values()) + ['Não informado']
+
+
+def derivar_faixa_etaria(idades):
+    """Faixa etária de cada idade (mesmas regras de get_faixa_etaria)."""
+    valores = pd.to_numeric(idades, errors='coerce').astype('float64').to_numpy()
+    valores = np.trunc(valores)
+
+    indice = np.searchsorted(_FAIXA_MIN, valores, side='right') - 1
+    indice_valido = np.clip(indice, 0, len(_FAIXA_MIN) - 1)
+    valido = (indice >= 0) & (valores <= _FAIXA_MAX[indice_valido])
+
+    # NaN falha nas comparações e cai em 'Não informado'
+    codigos = np.where(valido, indice_valido, len(_FAIXA_MIN))
+
+    usados = np.unique(codigos)
+    categorias = sorted(_FAIXA_NOME[i] for i in usados)
+    posicao = {nome: i for i, nome in enumerate(categorias)}
+    tabela = np.array([posicao.get(nome, -1) for nome in _FAIXA_NOME], dtype=np.int32)
+
+    return pd.Series(
+        pd.Categorical.from_codes(tabela[codigos], categorias),
+        index=getattr(idades, 'index', None),
+    )
@@ -0,0 +1,139 @@
+"""
+Gerador sintético de arquivos CAGEDMOV (Novo CAGED - movimentações)
+Registros com o layout e as cardinalidades do arquivo nacional (municípios,
+subclasses CNAE, CBOs, salários), reprodutíveis pela semente, para medir o
+pipeline sem acessar o FTP do MTE
+"""
+
+import os
+import json
+import numpy as np
+import pandas as pd
+
+from cnae_cadeias import CNAE_CADEIA, GRAU_INSTRUCAO, RACA_COR, PORTE_EMPRESA
+from caged_schema import SEPARADOR, ENCODING
+
+SCRIPT_DIR = os.path.dirname(__file__)
+ASSETS_DIR = os.path.join(SCRIPT_DIR, '..', 'dashboard', 'public', 'assets')
+
+# Paraná (código IBGE da UF) e fração de registros PR/agro no arquivo gerado
+UF_PR = 41
+FRACAO_ALVO = 0.5
+
+# Outras UFs e seções CNAE presentes no arquivo nacional (filtradas na leitura)
+OUTRAS_UFS = [11, 21, 23, 26, 29, 31, 33, 35, 42, 43, 50, 51, 52, 53]
+SUBCLASSES_OUTRAS = [1011201, 1012101, 4711302, 4930202, 8411600, 5611201, 4120400]
+
+# Quantidade de CBOs distintos (o arquivo real tem ~2.500; no agro, poucas centenas)
+CBOS = 400
+
+# Salário mínimo de referência: parte das admissões é paga exatamente o piso
+SALARIO_MINIMO = 1412.00
+FRACAO_PISO = 0.08
+
+# Salário mediano por cadeia (relativo à mediana geral, ~R$ 2.000)
+SALARIO_MEDIANO = 2000.0
+FATOR_CADEIA = {
+    'Silvicultura': 1.15,
+    'Sojicultura': 1.20,
+    'Grãos': 1.10,
+    'Avicultura': 0.95,
+    'Suinocultura': 1.00,
+    'Cana-de-açúcar': 1.05,
+    'Fruticultura': 0.85,
+    'Horticultura': 0.85,
+    'Aquicultura': 0.90,
+}
+
+TIPOS_ADMISSAO = [10, 20, 25, 35, 97]
+TIPOS_DESLIGAMENTO = [31, 32, 40, 43, 45, 50, 60, 80, 90, 98]
+
+
+def _zipf(rng, k, expoente=1.1):
+    """Pesos de uma lei de Zipf para `k` categorias (poucas concentram o volume)."""
+    pesos = 1.0 / np.arange(1, k + 1) ** expoente
+    rng.shuffle(pesos)
+    return pesos / pesos.sum()
+
+
+def municipios_pr():
+    """Códigos (6 dígitos) dos municípios do PR a partir do mun_PR.json."""
+    geo_path = os.path.join(ASSETS_DIR, 'mun_PR.json')
+    if not os.path.exists(geo_path):
+        # Sem o GeoJSON: 399 códigos no formato 41XXXX
+        return np.arange(410010, 410010 + 399 * 10, 10)
+
+    with open(geo_path, 'r', encoding='utf-8') as f:
+        geo = json.load(f)
+    return np.array(sorted({int(str(feat['properties']['CodIbge'])[:6]) for feat in geo['features']}))
+
+
+def gerar_cagedmov(linhas, ano, mes, semente=42, fracao_alvo=FRACAO_ALVO):
+    """
+    Microdados sintéticos de um mês no layout lido por caged_schema.ler_cagedmov.
+    Uma fração `fracao_alvo` é do PR em subclasses agro (CNAE_CADEIA); o restante
+    são outras UFs/seções, descartadas por separar_recortes como no arquivo real.
+    """
+    # Semente por mês: meses independentes e reprodutíveis
+    rng = np.random.default_rng([semente, ano, mes])
+
+    alvo = rng.random(linhas) < fracao_alvo
+    municipios = municipios_pr()
+    subclasses = np.array([int(c) for c in CNAE_CADEIA])
+
+    mun_pr = rng.choice(municipios, linhas, p=_zipf(rng, len(municipios), 0.9))
+    mun_outro = rng.choice(np.arange(110001, 530010), linhas)
+    uf = np.where(alvo, UF_PR, rng.choice(OUTRAS_UFS, linhas))
+    municipio = np.where(alvo, mun_pr, mun_outro)
+    subclasse = np.where(
+        alvo,
+        rng.choice(subclasses, linhas, p=_zipf(rng, len(subclasses))),
+        rng.choice(SUBCLASSES_OUTRAS, linhas),
+    )
+
+    # Salário log-normal em torno da mediana da cadeia, com massa no piso
+    cadeia = pd.Series(subclasse).astype(str).str.zfill(7).map(CNAE_CADEIA)
+    fator = cadeia.map(FATOR_CADEIA).fillna(1.0).to_numpy()
+    salario = np.round(SALARIO_MEDIANO * fator * rng.lognormal(0.0, 0.45, linhas), 2)
+    salario = np.where(rng.random(linhas) < FRACAO_PISO, SALARIO_MINIMO, np.maximum(salario, 300.0))
+    salario[rng.random(linhas) < 0.01] = np.nan
+
+    saldo = np.where(rng.random(linhas) < 0.5, 1, -1)
+    tipo = np.where(
+        saldo == 1,
+        rng.choice(TIPOS_ADMISSAO, linhas),
+        rng.choice(TIPOS_DESLIGAMENTO, linhas),
+    )
+
+    idade = np.clip(np.round(rng.normal(34, 12, linhas)), 14, 80)
+    idade[rng.random(linhas) < 0.003] = np.nan
+
+    cbos = 600000 + rng.choice(np.arange(10000, 99999), CBOS, replace=False)
+    escolaridade = [c for c in GRAU_INSTRUCAO] + [99]
+
+    return pd.DataFrame({
+        'competênciamov': ano * 100 + mes,
+        'uf': uf,
+        'município': municipio,
+        'seção': np.where(alvo, 'A', 'C'),
+        'subclasse': subclasse,
+        'saldomovimentação': saldo,
+        'cbo2002ocupação': rng.choice(cbos, linhas, p=_zipf(rng, CBOS)),
+        'graudeinstrução': rng.choice(escolaridade, linhas, p=_zipf(rng, len(escolaridade), 0.6)),
+        'idade': pd.array(idade, dtype='Int16'),
+        'horascontratuais': rng.choice([44.0, 40.0, 36.0, 30.0, 22.5], linhas, p=[.80, .10, .04, .03, .03]),
+        'raçacor': rng.choice(list(RACA_COR), linhas),
+        'sexo': rng.choice([1, 3, 9], linhas, p=[.72, .275, .005]),
+        'tipomovimentação': tipo,
+        'indtrabintermitente': rng.choice([0, 1, 9], linhas, p=[.93, .02, .05]),
+        'indtrabparcial': rng.choice([0, 1, 9], linhas, p=[.90, .05, .05]),
+        'salário': salario,
+        'tamestabjan': rng.choice(list(PORTE_EMPRESA) + [99], linhas),
+        'indicadoraprendiz': rng.choice([0, 1], linhas, p=[.98, .02]),
+    })
+
+
+def gravar_cagedmov(df, path):
+    """Grava no formato do arquivo do FTP (';' e vírgula decimal)."""
+    df.to_csv(path, sep=SEPARADOR, encoding=ENCODING, index=False, decimal=',')
+    return path
@@ -5,87 +5,419 @@ Preserva todas as dimensões para análise detalhada
 
 import os
 import sys
-from io import BytesIO
+import contextlib
+import argparse
+import ftplib
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from ftplib import FTP
 import tempfile
 import py7zr
+from py7zr.io import Py7zIO, WriterFactory
 import pandas as pd
 import numpy as np
 from datetime import datetime
 
 # Importar mapeamentos
 from cnae_cadeias import (
-    get_cadeia, get_faixa_etaria,
-    GRAU_INSTRUCAO, RACA_COR, SEXO, TIPO_MOVIMENTACAO, PORTE_EMPRESA
+    derivar_cadeia, derivar_faixa_etaria, mapear_codigos, mapear_categorico,
+    DIVISAO_CNAE, GRAU_INSTRUCAO, RACA_COR, SEXO, TIPO_MOVIMENTACAO, PORTE_EMPRESA
 )
+from caged_schema import ler_cagedmov, ENGINES
+from particoes import (
+    preparar_store, carregar_manifesto, mes_atualizado,
+    gravar_particao, ler_microdados, adicionar_nomes
+)
+from recortes import UFS, SECAO_DIVISAO, RECORTE_PADRAO, validar_recorte, store_path
+import cache_arquivos
+from cache_arquivos import ARQUIVOS_DIR
+import instrumentacao
+from instrumentacao import etapa, PERFILADORES
 
 # Configurações
 SCRIPT_DIR = os.path.dirname(__file__)
 RAW_DIR = os.path.join(SCRIPT_DIR, '..', 'data', 'raw')
 os.makedirs(RAW_DIR, exist_ok=True)
 
-# CNAE Seção A - Agropecuária (divisões 01, 02, 03)
-CNAE_AGRO = ['01', '02', '03']
-
-DIVISAO_CNAE = {
-    '01': 'Agricultura e Pecuária',
-    '02': 'Silvicultura',
-    '03': 'Pesca e Aquicultura'
-}
-
+# FTP do MTE
+FTP_HOST = 'ftp.mtps.gov.br'
+FTP_TIMEOUT = 120
 
-def download_mes(ano, mes):
-    """Baixa microdados de um mês específico."""
-    ano_str = str(ano)
-    mes_str = str(mes).zfill(2)
+# Downloads simultâneos no modo paralelo
+MAX_WORKERS = 4
 
-    ftp_path = f'/pdet/microdados/NOVO CAGED/{ano_str}/{ano_str}{mes_str}/CAGEDMOV{ano_str}{mes_str}.7z'
+# Tentativas por arquivo (cada uma retoma de onde a anterior parou) e bloco do RETR
+TENTATIVAS_FTP = 3
+BLOCO_FTP = 1024 * 1024
 
-    print(f"  {mes_str}/{ano_str}...", end=" ", flush=True)
+# Linhas por bloco na leitura do CAGEDMOV (filtro aplicado bloco a bloco)
+CHUNK_LINHAS = 500_000
 
-    try:
-        # Conectar ao FTP
-        ftp = FTP('ftp.mtps.gov.br', timeout=120)
-        ftp.login()
+def conectar_ftp():
+    """Abre uma sessão anônima no FTP do MTE."""
+    ftp = FTP(FTP_HOST, timeout=FTP_TIMEOUT)
+    ftp.login()
+    return ftp
 
-        # Download
-        archive_bytes = BytesIO()
-        ftp.retrbinary(f'RETR {ftp_path}', archive_bytes.write)
-        archive_bytes.seek(0)
-        ftp.quit()
 
-        # Extrair
-        with tempfile.TemporaryDirectory() as tmpdir:
-            with py7zr.SevenZipFile(archive_bytes, mode='r') as archive:
-                filenames = archive.getnames()
-                txt_file = [f for f in filenames if f.endswith('.txt')][0]
-                archive.extractall(path=tmpdir)
-
-            txt_path = os.path.join(tmpdir, txt_file)
-            df = pd.read_csv(txt_path, sep=';', encoding='UTF-8')
-
-        # Filtrar Paraná
-        df = df[df['uf'] == 41].copy()
-
-        if df.empty:
-            print("sem dados PR")
-            return None
+def caminho_ftp(ano, mes):
+    """Caminho do arquivo CAGEDMOV de um mês no FTP."""
+    ano_str = str(ano)
+    mes_str = str(mes).zfill(2)
+    return f'/pdet/microdados/NOVO CAGED/{ano_str}/{ano_str}{mes_str}/CAGEDMOV{ano_str}{mes_str}.7z'
 
-        # Filtrar agropecuária
-        df['subclasse'] = df['subclasse'].astype(str).str.zfill(7)
-        df['divisao'] = df['subclasse'].str[:2]
-        df = df[df['divisao'].isin(CNAE_AGRO)].copy()
 
-        if df.empty:
-            print("sem dados agro")
-            return None
+def info_remota(ftp, ano, mes):
+    """
+    Tamanho e data de modificação (SIZE/MDTM) do arquivo de um mês no FTP.
+    Retorna None se o arquivo ainda não foi publicado.
+    """
+    ftp_path = caminho_ftp(ano, mes)
+    try:
+        ftp.voidcmd('TYPE I')
+        tamanho = ftp.size(ftp_path)
+        mdtm = ftp.voidcmd(f'MDTM {ftp_path}').split()[-1]
+    except Exception:
+        return None
+    return {'tamanho': tamanho, 'mdtm': mdtm}
+
+
+def separar_recortes(df, recortes=(RECORTE_PADRAO,)):
+    """
+    Separa um bloco do CAGEDMOV nos recortes (UF, seção CNAE) pedidos.
+    A seção vem da divisão da subclasse. Retorna {recorte: df}; recortes
+    sem registros no bloco ficam de fora.
+    """
+    codigos = {UFS[uf] for uf, _ in recortes}
+    df = df[df['uf'].isin(codigos)].copy()
+
+    df['subclasse'] = df['subclasse'].astype(str).str.zfill(7)
+    df['divisao'] = df['subclasse'].str[:2]
+    secao = df['divisao'].map(SECAO_DIVISAO)
+
+    # Uma passada: cada grupo (UF, seção) vai para o seu recorte
+    alvos = {(UFS[uf], s): (uf, s) for uf, s in recortes}
+    partes = {}
+    for chave, grupo in df.groupby([df['uf'], secao], sort=False):
+        if chave in alvos:
+            partes[alvos[chave]] = grupo
+    return partes
+
+
+def ler_csv_recortes(fonte, recortes=(RECORTE_PADRAO,), engine='c', chunksize=CHUNK_LINHAS):
+    """
+    Lê um CAGEDMOV em blocos, separando cada bloco nos recortes (UF, seção).
+    Só o bloco corrente e os registros sobreviventes ficam em memória; o
+    arquivo é lido uma vez para todos os recortes.
+    Retorna {recorte: df} com todos os recortes (vazios se sem registros).
+    """
+    with etapa('ler_csv', engine=engine, recortes=len(recortes)) as medida:
+        partes = {recorte: [] for recorte in recortes}
+        medida.linhas_entrada = 0
+        for chunk in ler_cagedmov(fonte, engine=engine, chunksize=chunksize):
+            medida.linhas_entrada += len(chunk)
+            for recorte, parte in separar_recortes(chunk, recortes).items():
+                partes[recorte].append(parte)
+
+        dfs = {
+            recorte: pd.concat(lista, ignore_index=True) if lista else pd.DataFrame()
+            for recorte, lista in partes.items()
+        }
+        medida.linhas_saida = sum(len(df) for df in dfs.values())
+    return dfs
+
+
+def ler_csv_filtrado(fonte, engine='c', chunksize=CHUNK_LINHAS):
+    """Registros do recorte padrão (PR/agro) de um CAGEDMOV, lido em blocos."""
+    return ler_csv_recortes(fonte, (RECORTE_PADRAO,), engine, chunksize)[RECORTE_PADRAO]
+
+
+class _PipeIO(Py7zIO):
+    """Destino de extração do py7zr que repassa os bytes para um pipe."""
+
+    def __init__(self, arquivo):
+        self._arquivo = arquivo
+        self._tamanho = 0
+
+    def write(self, s):
+        self._arquivo.write(s)
+        self._tamanho += len(s)
+        return len(s)
+
+    def read(self, size=None):
+        return b''
+
+    def seek(self, offset, whence=0):
+        return self._tamanho
+
+    def flush(self):
+        self._arquivo.flush()
+
+    def size(self):
+        return self._tamanho
+
+
+class _PipeFactory(WriterFactory):
+    """Cria o destino em pipe para o arquivo extraído."""
+
+    def __init__(self, arquivo):
+        self._arquivo = arquivo
+
+    def create(self, filename):
+        return _PipeIO(self._arquivo)
+
+
+def extrair_streaming(arquivo, txt_file):
+    """
+    Descompacta o .txt em uma thread, entregando o conteúdo por um pipe.
+    Retorna (leitor, thread, erros); o leitor deve ser fechado pelo chamador.
+    """
+    fd_leitura, fd_escrita = os.pipe()
+    leitor = os.fdopen(fd_leitura, 'rb')
+    escritor = os.fdopen(fd_escrita, 'wb')
+    erros = []
+
+    def extrair():
+        try:
+            with py7zr.SevenZipFile(arquivo, mode='r') as archive:
+                archive.extract(targets=[txt_file], factory=_PipeFactory(escritor))
+        except BrokenPipeError:
+            # Leitor encerrado antes do fim (erro na leitura do CSV)
+            pass
+        except Exception as e:
+            erros.append(e)
+        finally:
+            try:
+                escritor.close()
+            except BrokenPipeError:
+                pass
+
+    thread = threading.Thread(target=extrair, daemon=True)
+    thread.start()
+    return leitor, thread, erros
+
+
+def ler_arquivo(arquivo, streaming=True, engine='c', recortes=(RECORTE_PADRAO,)):
+    """
+    Extrai o CAGEDMOV de um .7z (caminho ou arquivo aberto) e retorna os
+    registros de cada recorte (UF, seção): {recorte: df}.
+    Em modo streaming o texto nunca é gravado em disco nem mantido inteiro
+    em memória; caso contrário é extraído para um diretório temporário.
+    """
+    with py7zr.SevenZipFile(arquivo, mode='r') as archive:
+        filenames = archive.getnames()
+    txt_file = [f for f in filenames if f.endswith('.txt')][0]
+    if hasattr(arquivo, 'seek'):
+        arquivo.seek(0)
+
+    if streaming:
+        # Extração e leitura simultâneas: ler_csv inclui a espera pelo 7z
+        leitor, thread, erros = extrair_streaming(arquivo, txt_file)
+        try:
+            dfs = ler_csv_recortes(leitor, recortes, engine=engine)
+        finally:
+            leitor.close()
+            thread.join()
+        if erros:
+            raise erros[0]
+        return dfs
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with etapa('extrair_7z'), py7zr.SevenZipFile(arquivo, mode='r') as archive:
+            archive.extractall(path=tmpdir)
+
+        txt_path = os.path.join(tmpdir, txt_file)
+        return ler_csv_recortes(txt_path, recortes, engine=engine)
+
+
+def baixar_arquivo(ano, mes, arquivo, ftp=None, remoto=None):
+    """
+    Baixa o .7z de um mês para `arquivo` (cache em disco), retomando com REST
+    a partir do .parcial de uma tentativa anterior. Em caso de falha a conexão
+    é refeita até TENTATIVAS_FTP vezes, sempre continuando de onde parou.
+    remoto: SIZE/MDTM do arquivo no FTP (consultado se None).
+    Retorna (origem, bytes transferidos).
+    """
+    ftp_path = caminho_ftp(ano, mes)
+    propria = None
+    transferidos = 0
 
-        print(f"OK ({len(df):,} reg)", flush=True)
-        return df
+    try:
+        for tentativa in range(1, TENTATIVAS_FTP + 1):
+            try:
+                if ftp is None:
+                    ftp = propria = conectar_ftp()
+                if remoto is None:
+                    remoto = info_remota(ftp, ano, mes)
+                    if remoto is None:
+                        raise ValueError(f"{ftp_path} não publicado")
+
+                inicio = cache_arquivos.preparar_parcial(arquivo, remoto)
+                if inicio < remoto['tamanho']:
+                    with open(cache_arquivos.caminho_parcial(arquivo), 'ab') as f:
+                        try:
+                            ftp.retrbinary(f'RETR {ftp_path}', f.write, blocksize=BLOCO_FTP, rest=inicio or None)
+                        finally:
+                            transferidos += f.tell() - inicio
+                return cache_arquivos.concluir(arquivo, remoto), transferidos
+
+            except ftplib.all_errors as e:
+                if tentativa == TENTATIVAS_FTP:
+                    raise
+                print(f"  {str(mes).zfill(2)}/{ano}... falha na transferência ({e}); "
+                      f"retomando ({tentativa}/{TENTATIVAS_FTP - 1})", flush=True)
+                # A sessão pode ter caído ou ficado com respostas pendentes (um
+                # NOOP ainda passaria): fechada, mesmo a do chamador; próxima
+                # tentativa em uma conexão nova
+                if ftp is not None:
+                    ftp.close()
+                ftp = propria = None
+    finally:
+        if propria is not None:
+            try:
+                propria.quit()
+            except Exception:
+                propria.close()
+
+
+def download_mes(ano, mes, ftp=None, remoto=None, cache_dir=ARQUIVOS_DIR, **leitura):
+    """
+    Obtém os microdados de um mês específico.
+    O .7z vem do cache em disco quando corresponde a `remoto` (SIZE/MDTM no FTP;
+    None aceita qualquer versão em cache); senão é baixado para o cache.
+    Se `ftp` for informado, reutiliza a sessão em vez de abrir uma nova.
+    `leitura` são as opções de ler_arquivo (streaming, engine, recortes).
+    Retorna (dfs, fonte): dfs = {recorte: df}, com None nos recortes sem
+    registros no mês, e fonte identifica o arquivo baixado.
+    """
+    ano_str = str(ano)
+    mes_str = str(mes).zfill(2)
 
-    except Exception as e:
-        print(f"ERRO: {e}")
-        return None
+    prefixo = f"  {mes_str}/{ano_str}..."
+    arquivo = cache_arquivos.caminho_arquivo(ano, mes, cache_dir)
+
+    with etapa('download_mes', periodo=f'{ano_str}-{mes_str}'):
+        try:
+            if cache_arquivos.arquivo_valido(arquivo, remoto):
+                fonte = cache_arquivos.carregar_info(arquivo)
+                origem = 'cache'
+            else:
+                with etapa('ftp') as medida:
+                    fonte, transferidos = baixar_arquivo(ano, mes, arquivo, ftp=ftp, remoto=remoto)
+                    medida.registrar(bytes=transferidos)
+                origem = f"{transferidos / (1024 * 1024):,.1f} MB"
+
+            # Extrair, ler e separar nos recortes (uma leitura para todos)
+            with etapa('ler_arquivo') as medida:
+                try:
+                    dfs = ler_arquivo(arquivo, **leitura)
+                except (py7zr.exceptions.Bad7zFile, py7zr.exceptions.CrcError):
+                    # Arquivo corrompido: baixar de novo na próxima execução
+                    cache_arquivos.descartar(arquivo)
+                    raise
+                registros = sum(len(df) for df in dfs.values())
+                medida.linhas_saida = registros
+
+            if registros == 0:
+                rotulo = ', '.join(f'{uf}/{secao}' for uf, secao in dfs)
+                print(f"{prefixo} sem dados {rotulo} ({origem})", flush=True)
+            elif len(dfs) > 1:
+                print(f"{prefixo} OK ({registros:,} reg em {len(dfs)} recortes, {origem})", flush=True)
+            else:
+                print(f"{prefixo} OK ({registros:,} reg, {origem})", flush=True)
+            return {recorte: None if df.empty else df for recorte, df in dfs.items()}, fonte
+
+        except Exception as e:
+            # O .parcial fica no cache: a próxima execução retoma o download
+            print(f"{prefixo} ERRO: {e}", flush=True)
+            return None, None
+
+
+def download_meses_paralelo(meses, workers=MAX_WORKERS, remotos=None, cache_dir=ARQUIVOS_DIR, **leitura):
+    """
+    Baixa vários meses em paralelo com um pool limitado de workers.
+    Cada worker mantém uma única sessão FTP e a reutiliza entre os meses;
+    meses já no cache não abrem conexão.
+    remotos: {(ano, mes): SIZE/MDTM no FTP}, como em download_mes.
+    Gera ((ano, mes), dfs, fonte) à medida que cada mês termina (fonte None
+    em caso de falha): quem consome grava o mês enquanto os demais baixam.
+    No máximo `workers` meses ficam em memória ao mesmo tempo.
+    """
+    remotos = remotos or {}
+    local = threading.local()
+    sessoes = []
+    lock = threading.Lock()
+
+    def sessao_do_worker():
+        ftp = getattr(local, 'ftp', None)
+        if ftp is None:
+            ftp = conectar_ftp()
+            local.ftp = ftp
+            with lock:
+                sessoes.append(ftp)
+        return ftp
+
+    def descartar_sessao():
+        ftp = getattr(local, 'ftp', None)
+        local.ftp = None
+        if ftp is not None:
+            with lock:
+                sessoes.remove(ftp)
+            try:
+                ftp.close()
+            except Exception:
+                pass
+
+    def tarefa(ano, mes):
+        remoto = remotos.get((ano, mes))
+        ftp = None
+        if not cache_arquivos.arquivo_valido(cache_arquivos.caminho_arquivo(ano, mes, cache_dir), remoto):
+            try:
+                ftp = sessao_do_worker()
+            except Exception as e:
+                print(f"  {str(mes).zfill(2)}/{ano}... ERRO: {e}", flush=True)
+                return None, None
+
+        dfs, fonte = download_mes(ano, mes, ftp=ftp, remoto=remoto, cache_dir=cache_dir, **leitura)
+
+        # Após uma falha (mesmo retomada em outra conexão), a sessão foi
+        # fechada ou não responde mais: descartá-la
+        if ftp is not None:
+            try:
+                ftp.voidcmd('NOOP')
+            except Exception:
+                descartar_sessao()
+        return dfs, fonte
+
+    a_submeter = list(meses)
+    em_execucao = {}
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while a_submeter or em_execucao:
+                # Um mês novo só começa quando um anterior foi entregue
+                while a_submeter and len(em_execucao) < workers:
+                    ano, mes = a_submeter.pop(0)
+                    em_execucao[executor.submit(tarefa, ano, mes)] = (ano, mes)
+
+                concluidos, _ = wait(em_execucao, return_when=FIRST_COMPLETED)
+                for futuro in concluidos:
+                    yield (em_execucao.pop(futuro), *futuro.result())
+    finally:
+        for ftp in sessoes:
+            try:
+                ftp.quit()
+            except Exception:
+                ftp.close()
+
+
+def download_meses_serial(meses, remotos, cache_dir=ARQUIVOS_DIR, **leitura):
+    """Baixa os meses um a um, como download_meses_paralelo gera ((ano, mes), dfs, fonte)."""
+    ano_atual = None
+    for ano, mes in meses:
+        if ano != ano_atual:
+            print(f"\n[{ano}]")
+            ano_atual = ano
+        yield ((ano, mes), *download_mes(ano, mes, remoto=remotos[(ano, mes)], cache_dir=cache_dir, **leitura))
 
 
 def process_microdata(df, ano, mes):
@@ -105,46 +437,45 @@ def process_microdata(df, ano, mes):
     df['cnae_subclasse'] = df['subclasse']
     df['cnae_grupo'] = df['subclasse'].str[:4]
     df['cnae_divisao'] = df['divisao']
-    df['cnae_divisao_nome'] = df['divisao'].map(DIVISAO_CNAE)
+    df['cnae_divisao_nome'] = mapear_categorico(df['divisao'], DIVISAO_CNAE, None)
 
+    # Derivações vetorizadas (tabelas de lookup sobre os valores distintos)
     # Cadeia produtiva
-    df['cadeia_produtiva'] = df['subclasse'].apply(get_cadeia)
+    df['cadeia_produtiva'] = derivar_cadeia(df['subclasse'])
 
     # Dimensões do trabalhador
     df['sexo_codigo'] = df['sexo']
-    df['sexo_nome'] = df['sexo'].map(SEXO).fillna('Não informado')
+    df['sexo_nome'] = mapear_codigos(df['sexo'], SEXO)
 
     df['idade_anos'] = df['idade']
-    df['faixa_etaria'] = df['idade'].apply(get_faixa_etaria)
+    df['faixa_etaria'] = derivar_faixa_etaria(df['idade'])
 
     df['escolaridade_codigo'] = df['graudeinstrução']
-    df['escolaridade_nome'] = df['graudeinstrução'].map(GRAU_INSTRUCAO).fillna('Não informado')
+    df['escolaridade_nome'] = mapear_codigos(df['graudeinstrução'], GRAU_INSTRUCAO)
 
     df['raca_cor_codigo'] = df['raçacor']
-    df['raca_cor_nome'] = df['raçacor'].map(RACA_COR).fillna('Não informado')
+    df['raca_cor_nome'] = mapear_codigos(df['raçacor'], RACA_COR)
 
     # Tipo de movimentação
     df['tipo_mov_codigo'] = df['tipomovimentação']
-    df['tipo_mov_nome'] = df['tipomovimentação'].map(TIPO_MOVIMENTACAO).fillna('Não identificado')
+    df['tipo_mov_nome'] = mapear_codigos(
+        df['tipomovimentação'], TIPO_MOVIMENTACAO, 'Não identificado'
+    )
     df['is_admissao'] = (df['saldomovimentação'] == 1).astype(int)
     df['is_demissao'] = (df['saldomovimentação'] == -1).astype(int)
 
     # Empresa
     df['porte_empresa_codigo'] = df['tamestabjan']
-    df['porte_empresa_nome'] = df['tamestabjan'].map(PORTE_EMPRESA).fillna('Não informado')
+    df['porte_empresa_nome'] = mapear_codigos(df['tamestabjan'], PORTE_EMPRESA)
 
-    # Salário
-    df['salario'] = df['salário'].astype(str).str.replace(',', '.', regex=False)
-    df['salario'] = pd.to_numeric(df['salario'], errors='coerce')
-
-    # Horas
-    df['horas_contratuais'] = df['horascontratuais'].astype(str).str.replace(',', '.', regex=False)
-    df['horas_contratuais'] = pd.to_numeric(df['horas_contratuais'], errors='coerce')
+    # Salário e horas (vírgula decimal já convertida na leitura, ver caged_schema)
+    df['salario'] = df['salário']
+    df['horas_contratuais'] = df['horascontratuais']
 
     # Indicadores
     df['is_aprendiz'] = df['indicadoraprendiz']
-    df['is_intermitente'] = (df['indtrabintermitente'] == 1).astype(int)
-    df['is_parcial'] = (df['indtrabparcial'] == 1).astype(int)
+    df['is_intermitente'] = df['indtrabintermitente'].eq(1).fillna(False).astype(int)
+    df['is_parcial'] = df['indtrabparcial'].eq(1).fillna(False).astype(int)
 
     # Ocupação CBO
     df['cbo_codigo'] = df['cbo2002ocupação'].astype(str).str.zfill(6)
@@ -178,47 +509,178 @@ def process_microdata(df, ano, mes):
     return df[colunas]
 
 
-def download_all():
-    """Baixa todos os microdados de 2020-2025."""
+def recortes_pendentes(stores, ano, mes, fonte):
+    """
+    Recortes cujo store não tem o mês com a origem `fonte` (ausente ou
+    republicado). stores: {recorte: (base do store, manifesto)}.
+    """
+    return [
+        recorte for recorte, (base, manifesto) in stores.items()
+        if not mes_atualizado(manifesto, ano, mes, fonte, base=base)
+    ]
+
+
+def listar_pendentes(meses, stores):
+    """
+    Consulta SIZE/MDTM de cada mês no FTP e retorna os meses que precisam
+    ser baixados (ausentes ou republicados em algum dos stores), com a
+    origem remota. stores: {recorte: (base do store, manifesto)}.
+    """
+    pendentes = {}
+    try:
+        ftp = conectar_ftp()
+    except Exception as e:
+        print(f"ERRO ao conectar no FTP: {e}")
+        return pendentes
+
+    try:
+        for ano, mes in meses:
+            fonte = info_remota(ftp, ano, mes)
+            if fonte is None:
+                continue
+            if recortes_pendentes(stores, ano, mes, fonte):
+                pendentes[(ano, mes)] = fonte
+    finally:
+        try:
+            ftp.quit()
+        except Exception:
+            ftp.close()
+
+    return pendentes
+
+
+def download_all(workers=1, forcar=False, offline=False, cache_dir=ARQUIVOS_DIR,
+                 recortes=(RECORTE_PADRAO,), raw_dir=RAW_DIR, **leitura):
+    """
+    Baixa os microdados de 2020-2025 de forma incremental.
+    Só são processados os meses ausentes no store particionado ou republicados
+    no FTP (tamanho/data diferentes); forcar=True reprocessa todos.
+    Os .7z ficam em cache_dir: só vão à rede os meses sem arquivo em cache
+    ou cuja versão no FTP mudou.
+    offline=True não acessa o FTP: usa apenas os meses em cache (com forcar,
+    reprocessa o store inteiro a partir deles, ex.: após mudar o CNAE_CADEIA).
+    Com workers > 1, os meses são baixados em paralelo (ver download_meses_paralelo).
+    recortes: lista de (UF, seção CNAE); cada arquivo nacional é baixado e lido
+    uma única vez e as linhas vão para o store de cada recorte em raw_dir.
+    `leitura` são as opções de ler_arquivo (streaming, engine).
+    Retorna {recorte: microdados consolidados} (recortes sem dados ficam de fora).
+    """
+    recortes = [validar_recorte(uf, secao) for uf, secao in recortes]
 
     print("=" * 70)
-    print("DOWNLOAD CAGED GRANULAR - AGROPECUÁRIA PARANÁ")
+    if recortes == [RECORTE_PADRAO]:
+        print("DOWNLOAD CAGED GRANULAR - AGROPECUÁRIA PARANÁ")
+    else:
+        print(f"DOWNLOAD CAGED GRANULAR - {', '.join(f'{uf}/{secao}' for uf, secao in recortes)}")
     print("=" * 70)
     print(f"Início: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print()
 
-    all_data = []
-    total_registros = 0
-
-    for ano in range(2020, 2026):
-        print(f"\n[{ano}]")
-
-        for mes in range(1, 13):
-            df = download_mes(ano, mes)
-
-            if df is not None:
-                df_processed = process_microdata(df, ano, mes)
-                all_data.append(df_processed)
-                total_registros += len(df_processed)
+    stores = {}
+    for recorte in recortes:
+        base = store_path(recorte, raw_dir)
+        preparar_store(base)
+        stores[recorte] = (base, carregar_manifesto(base))
+
+    meses = [(ano, mes) for ano in range(2020, 2026) for mes in range(1, 13)]
+    # Com forcar, todos os meses contam como ausentes em todos os stores
+    consulta = {recorte: (base, {}) for recorte, (base, _) in stores.items()} if forcar else stores
+
+    if offline:
+        # Origem de cada mês = arquivo em cache (sem consultar o FTP)
+        print(f"Modo offline: arquivos em {cache_dir}")
+        em_cache = cache_arquivos.arquivos_em_cache(cache_dir)
+        remotos = {
+            m: fonte for m, fonte in em_cache.items()
+            if m in meses and recortes_pendentes(consulta, *m, fonte)
+        }
+    else:
+        print("Verificando meses publicados no FTP...")
+        with etapa('listar_pendentes') as medida:
+            remotos = listar_pendentes(meses, consulta)
+            medida.linhas_saida = len(remotos)
+    pendentes = [m for m in meses if m in remotos]
+    no_cache = sum(
+        cache_arquivos.arquivo_valido(cache_arquivos.caminho_arquivo(ano, mes, cache_dir), remotos[(ano, mes)])
+        for ano, mes in pendentes
+    )
+    no_store = min(len(manifesto) for _, manifesto in stores.values())
+    print(f"Meses no store: {no_store} | a processar: {len(pendentes)} "
+          f"(em cache: {no_cache}, a baixar: {len(pendentes) - no_cache})")
+
+    # Todos os recortes saem da mesma leitura do arquivo nacional
+    leitura['recortes'] = recortes
+
+    paralelo = workers > 1 and len(pendentes) > 1
+    if paralelo:
+        print(f"Download paralelo: {workers} workers")
+        obtidos = download_meses_paralelo(pendentes, workers=workers, remotos=remotos,
+                                          cache_dir=cache_dir, **leitura)
+    else:
+        obtidos = download_meses_serial(pendentes, remotos, cache_dir=cache_dir, **leitura)
 
-    if not all_data:
-        print("\nNenhum dado obtido!")
-        return None
+    total_registros = 0
+    falhas = []
+
+    # Cada mês é gravado assim que termina (no paralelo, na ordem de conclusão:
+    # partições e manifesto ordenado saem iguais aos do modo serial)
+    with etapa('download_paralelo', workers=workers) if paralelo else contextlib.nullcontext():
+        for (ano, mes), dfs, fonte in obtidos:
+            # Falha no download: manter a partição anterior (se houver);
+            # o download parcial é retomado na próxima execução
+            if fonte is None:
+                falhas.append(f'{ano}-{str(mes).zfill(2)}')
+                continue
+
+            # Tamanho/data remotos identificam republicações nas próximas execuções
+            fonte = {**remotos[(ano, mes)], **fonte}
+
+            # Só os stores em que o mês está ausente ou desatualizado são regravados
+            for recorte in recortes_pendentes(consulta, ano, mes, fonte):
+                base, manifesto = stores[recorte]
+                df = dfs[recorte]
+                df_processed = None
+                if df is not None:
+                    with etapa('process_microdata', linhas_entrada=len(df)) as medida:
+                        df_processed = process_microdata(df, ano, mes)
+                        medida.linhas_saida = len(df_processed)
+                with etapa('gravar_particao', linhas_entrada=0 if df_processed is None else len(df_processed)):
+                    gravar_particao(df_processed, ano, mes, manifesto, fonte=fonte, base=base)
+                if df_processed is not None:
+                    total_registros += len(df_processed)
+
+    print(f"\nRegistros novos/atualizados: {total_registros:,}")
+    if falhas:
+        print(f"Meses com falha (retomados na próxima execução): {', '.join(sorted(falhas))}")
+
+    consolidados = {}
+    for recorte, (base, manifesto) in stores.items():
+        uf, secao = recorte
+        if not any(e['linhas'] > 0 for e in manifesto.values()):
+            print(f"\nNenhum dado obtido ({uf}/{secao})!")
+            continue
+
+        # O Parquet de microdados é uma visão sobre as partições
+        print("\n" + "=" * 70)
+        print(f"CONSOLIDANDO DADOS ({uf}/{secao})...")
+        print("=" * 70)
+
+        with etapa('consolidar', recorte=f'{uf}/{secao}') as medida:
+            df_final = adicionar_nomes(ler_microdados(base))
+            medida.linhas_saida = len(df_final)
+        print(f"\nMicrodados: {base}")
+        print(f"Total de registros: {len(df_final):,}")
+
+        imprimir_estatisticas(df_final)
+        consolidados[recorte] = df_final
 
-    # Consolidar
-    print("\n" + "=" * 70)
-    print("CONSOLIDANDO DADOS...")
-    print("=" * 70)
+    print(f"\nFim: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
-    df_final = pd.concat(all_data, ignore_index=True)
+    return consolidados
 
-    # Salvar microdados completos
-    micro_parquet = os.path.join(RAW_DIR, 'caged_agro_pr_microdados.parquet')
-    df_final.to_parquet(micro_parquet, index=False)
-    print(f"\nMicrodados salvos: {micro_parquet}")
-    print(f"Total de registros: {len(df_final):,}")
 
-    # Estatísticas
+def imprimir_estatisticas(df_final):
+    """Resumo dos microdados consolidados de um recorte."""
     print("\n" + "=" * 70)
     print("ESTATÍSTICAS DOS DADOS")
     print("=" * 70)
@@ -231,7 +693,7 @@ def download_all():
     print(f"Cadeias Produtivas: {df_final['cadeia_produtiva'].nunique()}")
 
     print("\nPor Cadeia Produtiva:")
-    cadeia_stats = df_final.groupby('cadeia_produtiva').agg({
+    cadeia_stats = df_final.groupby('cadeia_produtiva', observed=True).agg({
         'is_admissao': 'sum',
         'is_demissao': 'sum'
     }).reset_index()
@@ -242,19 +704,19 @@ def download_all():
         print(f"  {row['cadeia_produtiva']:25} | Adm: {row['is_admissao']:>7,} | Dem: {row['is_demissao']:>7,} | Saldo: {row['saldo']:>+6,}")
 
     print("\nPor Sexo:")
-    sexo_stats = df_final.groupby('sexo_nome').size()
+    sexo_stats = df_final.groupby('sexo_nome', observed=True).size()
     for sexo, count in sexo_stats.items():
         pct = count / len(df_final) * 100
         print(f"  {sexo}: {count:,} ({pct:.1f}%)")
 
     print("\nPor Faixa Etária:")
-    idade_stats = df_final.groupby('faixa_etaria').size().sort_index()
+    idade_stats = df_final.groupby('faixa_etaria', observed=True).size().sort_index()
     for faixa, count in idade_stats.items():
         pct = count / len(df_final) * 100
         print(f"  {faixa}: {count:,} ({pct:.1f}%)")
 
     print("\nPor Escolaridade:")
-    esc_stats = df_final.groupby('escolaridade_nome').size().sort_values(ascending=False)
+    esc_stats = df_final.groupby('escolaridade_nome', observed=True).size().sort_values(ascending=False)
     for esc, count in esc_stats.head(5).items():
         pct = count / len(df_final) * 100
         print(f"  {esc}: {count:,} ({pct:.1f}%)")
@@ -265,10 +727,42 @@ def download_all():
     print(f"  Média: R$ {df_final['salario'].mean():,.2f}")
     print(f"  Máximo: R$ {df_final['salario'].max():,.2f}")
 
-    print(f"\nFim: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
-    return df_final
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Download CAGED granular por UF e seção CNAE (padrão: agropecuária PR)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help=f'downloads simultâneos (1 = serial; sugerido: {MAX_WORKERS})')
+    parser.add_argument('--forcar', action='store_true',
+                        help='reprocessar todos os meses, ignorando o manifesto (os .7z em cache são reaproveitados)')
+    parser.add_argument('--extrair-tmp', action='store_true',
+                        help='extrair o CAGEDMOV em diretório temporário em vez de streaming')
+    parser.add_argument('--engine', choices=ENGINES, default='c',
+                        help='parser CSV do CAGEDMOV (c = pandas, pyarrow = multithread)')
+    parser.add_argument('--offline', action='store_true',
+                        help='não acessar o FTP: processar apenas os .7z em cache (com --forcar, reprocessa todos)')
+    parser.add_argument('--cache-dir', default=ARQUIVOS_DIR,
+                        help='diretório do cache de arquivos .7z (padrão: data/raw/arquivos_7z)')
+    parser.add_argument('--ufs', nargs='+', default=[RECORTE_PADRAO[0]], metavar='UF',
+                        help='UFs (siglas) extraídas de cada arquivo nacional (padrão: %(default)s)')
+    parser.add_argument('--secoes', nargs='+', default=[RECORTE_PADRAO[1]], metavar='SECAO',
+                        help='seções CNAE (letras) extraídas para cada UF (padrão: %(default)s)')
+    parser.add_argument('--relatorio', default=None,
+                        help='arquivo JSON do relatório de etapas (padrão: data/processed/execucoes/download.json)')
+    parser.add_argument('--perfilar', metavar='ETAPA', default=None,
+                        help='perfilar a primeira ocorrência de uma etapa (ex.: ler_csv, process_microdata)')
+    parser.add_argument('--perfilador', choices=PERFILADORES, default='cprofile',
+                        help='perfilador da etapa (py-spy requer pip install py-spy)')
+    args = parser.parse_args()
 
+    try:
+        recortes = [validar_recorte(uf, secao) for uf in args.ufs for secao in args.secoes]
+    except ValueError as e:
+        parser.error(str(e))
 
-if __name__ == '__main__':
-    download_all()
+    instrumentacao.iniciar('download', perfilar=args.perfilar, perfilador=args.perfilador)
+    try:
+        download_all(workers=args.workers, forcar=args.forcar, offline=args.offline,
+                     cache_dir=args.cache_dir, recortes=recortes,
+                     streaming=not args.extrair_tmp, engine=args.engine)
+    finally:
+        instrumentacao.finalizar(args.relatorio)
@@ -0,0 +1,306 @@
+"""
+Estado agregado persistido por período
+Cada mês do store de microdados é resumido uma vez (ver agregacao.calcular_estado)
+e gravado em agregados/periodo=AAAA-MM/<tabela>.parquet; um mês só é
+recalculado quando sua partição de origem, o mapeamento CNAE -> cadeia
+ou a versão do estado mudam. Quando só o mapeamento muda, o mês é
+reclassificado a partir do estado anterior (ver agregacao.reclassificar_estado),
+usando o mapeamento gravado em _mapeamento.json. O estado combinado de todos
+os meses também é persistido (agregados/_combinado); a cada execução só os
+meses alterados são substituídos nele, tabela a tabela (ver
+agregacao.substituir_tabela)
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import pandas as pd
+import pyarrow as pa
+
+from cnae_cadeias import CNAE_CADEIA
+from agregacao import combinar_tabelas, substituir_tabela, tabelas_estado, estado_vazio
+from instrumentacao import etapa
+
+# Diretórios
+SCRIPT_DIR = os.path.dirname(__file__)
+ESTADO_DIR = os.path.join(SCRIPT_DIR, '..', 'data', 'processed', 'agregados')
+
+MANIFESTO = '_estado.json'
+MAPEAMENTO = '_mapeamento.json'
+COMBINADO = '_combinado'
+PERIODOS_COMBINADO = '_periodos.json'
+
+# Incrementar quando o conteúdo das tabelas do estado mudar
+VERSAO_ESTADO = 3
+
+
+def _hash(obj):
+    """Hash curto e estável de um objeto JSON."""
+    texto = json.dumps(obj, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(texto.encode('utf-8')).hexdigest()[:16]
+
+
+def hash_mapeamento():
+    """Hash do mapeamento CNAE -> cadeia (muda a cadeia de todos os meses)."""
+    return _hash(CNAE_CADEIA)
+
+
+def assinatura(entrada_micro, mapeamento=None):
+    """
+    Assinatura de um mês: origem da partição + versão do estado + mapeamento.
+    mapeamento: hash do mapeamento (None = CNAE_CADEIA atual).
+    """
+    return _hash({
+        'microdados': entrada_micro,
+        'versao': VERSAO_ESTADO,
+        'mapeamento': mapeamento or hash_mapeamento(),
+    })
+
+
+def caminho_periodo(periodo, base=ESTADO_DIR):
+    """Diretório do estado de um mês."""
+    return os.path.join(base, f'periodo={periodo}')
+
+
+def carregar_manifesto(base=ESTADO_DIR):
+    """Assinaturas dos meses persistidos ({'AAAA-MM': assinatura})."""
+    path = os.path.join(base, MANIFESTO)
+    if not os.path.exists(path):
+        return {}
+
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def salvar_manifesto(manifesto, base=ESTADO_DIR):
+    """Grava o manifesto do estado de forma atômica."""
+    path = os.path.join(base, MANIFESTO)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(dict(sorted(manifesto.items())), f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def carregar_mapeamento(base=ESTADO_DIR):
+    """Mapeamento CNAE -> cadeia com que o estado persistido foi calculado (None se ausente)."""
+    path = os.path.join(base, MAPEAMENTO)
+    if not os.path.exists(path):
+        return None
+
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)['cnae_cadeia']
+
+
+def salvar_mapeamento(base=ESTADO_DIR):
+    """Registra o mapeamento atual como o do estado persistido."""
+    path = os.path.join(base, MAPEAMENTO)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'hash': hash_mapeamento(), 'cnae_cadeia': CNAE_CADEIA}, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def liberar_memoria_arrow():
+    """
+    Devolve ao sistema a memória livre do pool do Arrow: sem isso, os buffers
+    de cada leitura ou gravação de Parquet continuam no RSS do processo.
+    """
+    pa.default_memory_pool().release_unused()
+
+
+def _gravar_tabelas(estado, destino, extras=None):
+    """Substitui o diretório `destino` por um com as tabelas do estado (e arquivos JSON `extras`)."""
+    tmp_dir = destino + '.tmp'
+    if os.path.isdir(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+
+    for nome, tabela in estado.items():
+        tabela.to_parquet(os.path.join(tmp_dir, f'{nome}.parquet'), index=False)
+    for arquivo, conteudo in (extras or {}).items():
+        with open(os.path.join(tmp_dir, arquivo), 'w', encoding='utf-8') as f:
+            json.dump(conteudo, f, ensure_ascii=False, indent=2)
+
+    if os.path.isdir(destino):
+        shutil.rmtree(destino)
+    os.replace(tmp_dir, destino)
+    liberar_memoria_arrow()
+
+
+def _ler_tabelas(origem):
+    """Tabelas do estado gravadas em `origem` ({tabela: DataFrame})."""
+    return {
+        nome: pd.read_parquet(os.path.join(origem, f'{nome}.parquet'))
+        for nome in tabelas_estado()
+    }
+
+
+def gravar_periodo(estado, periodo, base=ESTADO_DIR):
+    """Substitui o estado persistido de um mês."""
+    _gravar_tabelas(estado, caminho_periodo(periodo, base))
+
+
+def ler_periodo(periodo, base=ESTADO_DIR):
+    """Estado persistido de um mês ({tabela: DataFrame})."""
+    return _ler_tabelas(caminho_periodo(periodo, base))
+
+
+def caminho_tabela(periodo, nome, base=ESTADO_DIR):
+    """Arquivo de uma tabela do estado de um mês."""
+    return os.path.join(caminho_periodo(periodo, base), f'{nome}.parquet')
+
+
+def ler_tabela(periodo, nome, base=ESTADO_DIR):
+    """Uma tabela do estado persistido de um mês."""
+    tabela = pd.read_parquet(caminho_tabela(periodo, nome, base))
+    liberar_memoria_arrow()
+    return tabela
+
+
+def combinar_periodos(periodos, base=ESTADO_DIR, combinado=None, remover=()):
+    """
+    Estado combinado dos meses persistidos, montado uma tabela por vez (só uma
+    tabela de cada mês fica em memória durante o concat).
+    combinado: estado combinado anterior em disco (diretório), do qual saem
+    os meses em `remover` e todos os de `periodos`
+    """
+    estado = {}
+    for nome, dims in tabelas_estado().items():
+        tabelas = [ler_tabela(p, nome, base) for p in periodos]
+        if combinado is None:
+            estado[nome] = combinar_tabelas(tabelas, dims)
+        else:
+            anterior = pd.read_parquet(os.path.join(combinado, f'{nome}.parquet'))
+            liberar_memoria_arrow()
+            estado[nome] = substituir_tabela(anterior, tabelas, set(remover) | set(periodos), dims)
+    return estado
+
+
+def caminho_combinado(base=ESTADO_DIR):
+    """Diretório do estado combinado de todos os meses."""
+    return os.path.join(base, COMBINADO)
+
+
+def periodos_combinado(base=ESTADO_DIR):
+    """Assinaturas dos meses contidos no estado combinado ({} se ausente)."""
+    path = os.path.join(caminho_combinado(base), PERIODOS_COMBINADO)
+    if not os.path.exists(path):
+        return {}
+
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def gravar_combinado(estado, periodos, base=ESTADO_DIR):
+    """Substitui o estado combinado; periodos: {'AAAA-MM': assinatura} dos meses contidos."""
+    _gravar_tabelas(estado, caminho_combinado(base), {PERIODOS_COMBINADO: dict(sorted(periodos.items()))})
+
+
+def ler_combinado(base=ESTADO_DIR):
+    """Estado combinado persistido ({tabela: DataFrame})."""
+    return _ler_tabelas(caminho_combinado(base))
+
+
+def remover_periodo(periodo, base=ESTADO_DIR):
+    """Remove o estado de um mês que saiu do store."""
+    destino = caminho_periodo(periodo, base)
+    if os.path.isdir(destino):
+        shutil.rmtree(destino)
+
+
+def periodos_pendentes(manifesto_micro, manifesto_estado, base=ESTADO_DIR):
+    """Meses com registros cujo estado falta ou está desatualizado."""
+    pendentes = []
+    for periodo, entrada in sorted(manifesto_micro.items()):
+        if entrada.get('linhas', 0) == 0:
+            continue
+        if (manifesto_estado.get(periodo) != assinatura(entrada)
+                or not os.path.isdir(caminho_periodo(periodo, base))):
+            pendentes.append(periodo)
+    return pendentes
+
+
+def so_mapeamento_mudou(periodo, entrada_micro, manifesto_estado, mapeamento_anterior, base=ESTADO_DIR):
+    """O estado do mês está em dia, exceto pelo mapeamento CNAE -> cadeia."""
+    return (mapeamento_anterior is not None
+            and manifesto_estado.get(periodo) == assinatura(entrada_micro, _hash(mapeamento_anterior))
+            and os.path.isdir(caminho_periodo(periodo, base)))
+
+
+def atualizar_combinado(manifesto, alterados, base=ESTADO_DIR):
+    """
+    Estado combinado dos meses do manifesto do estado, a partir do combinado
+    persistido: meses removidos ou alterados saem, os novos entram (lidos de
+    agregados/periodo=...). Sem alterações, é só a leitura do combinado.
+    manifesto: assinaturas atuais dos meses ({'AAAA-MM': assinatura})
+    alterados: meses recalculados nesta execução
+    """
+    if not manifesto:
+        # Nenhum mês com registros: não há o que combinar
+        return estado_vazio()
+
+    cobertos = periodos_combinado(base)
+    mantidos = {p for p, a in cobertos.items() if manifesto.get(p) == a and p not in alterados}
+    novos = sorted(set(manifesto) - mantidos)
+    if not novos and mantidos == set(cobertos):
+        return ler_combinado(base)
+
+    if mantidos:
+        combinado = combinar_periodos(novos, base, caminho_combinado(base), remover=set(cobertos) - mantidos)
+    else:
+        combinado = combinar_periodos(novos, base)
+    gravar_combinado(combinado, manifesto, base)
+    print(f"  Estado combinado: {len(mantidos)} meses mantidos, {len(novos)} substituídos ou incluídos, "
+          f"{len(set(cobertos) - mantidos - set(novos))} removidos")
+    return combinado
+
+
+def atualizar_estado(manifesto_micro, calcular, base=ESTADO_DIR, forcar=False, reclassificar=None):
+    """
+    Atualiza o estado persistido e retorna o estado combinado de todos os meses.
+    manifesto_micro: manifesto do store de microdados ({'AAAA-MM': {...}})
+    calcular: função que recebe uma lista de meses e retorna o estado deles
+    (agregacao.calcular_estado sobre os microdados, ou o backend SQL)
+    forcar: recalcula todos os meses
+    reclassificar: função (meses, estado, mapeamento_anterior) -> estado, usada
+    nos meses em que só o mapeamento CNAE -> cadeia mudou (None = recalcular)
+    """
+    os.makedirs(base, exist_ok=True)
+    manifesto = {} if forcar else carregar_manifesto(base)
+    anterior = None if reclassificar is None else carregar_mapeamento(base)
+
+    # Meses que saíram do store (ou ficaram sem registros)
+    com_dados = {p for p, e in manifesto_micro.items() if e.get('linhas', 0) > 0}
+    for periodo in sorted(set(manifesto) - com_dados):
+        print(f"  Estado: removendo {periodo}")
+        remover_periodo(periodo, base)
+        del manifesto[periodo]
+
+    pendentes = periodos_pendentes(manifesto_micro, manifesto, base)
+    reclassificados = {
+        p for p in pendentes if so_mapeamento_mudou(p, manifesto_micro[p], manifesto, anterior, base)
+    }
+    print(f"  Estado: {len(com_dados) - len(pendentes)} meses reaproveitados, "
+          f"{len(pendentes)} a processar"
+          + (f" ({len(reclassificados)} só com reclassificação de cadeia)" if reclassificados else ""))
+
+    # Um mês por vez: memória proporcional a um mês de microdados
+    for periodo in pendentes:
+        reclassificado = periodo in reclassificados
+        with etapa('estado_mes', periodo=periodo, reclassificado=reclassificado) as medida:
+            if reclassificado:
+                estado = reclassificar([periodo], ler_periodo(periodo, base), anterior)
+            else:
+                estado = calcular([periodo])
+            gravar_periodo(estado, periodo, base)
+            medida.linhas_entrada = int(estado['cubo']['registros'].sum())
+            medida.linhas_saida = len(estado['cubo'])
+        manifesto[periodo] = assinatura(manifesto_micro[periodo])
+        salvar_manifesto(manifesto, base)
+        print(f"    {periodo}: {int(estado['cubo']['registros'].sum()):,} registros")
+
+    salvar_mapeamento(base)
+
+    with etapa('combinar_estados', linhas_entrada=len(com_dados)):
+        return atualizar_combinado(manifesto, set(pendentes), base)
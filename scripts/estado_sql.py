@@ -0,0 +1,176 @@
+"""
+Estado agregado calculado em SQL (DuckDB) direto sobre o store Parquet
+Mesmas tabelas de agregacao.calcular_estado, sem carregar os microdados no
+pandas: só as colunas usadas são lidas, os meses pedidos são filtrados pelas
+partições ano=/mes= e a execução usa todos os núcleos, com spill em disco
+quando passa do limite de memória.
+Requer duckdb (opcional): pip install duckdb
+"""
+
+import os
+import math
+import numpy as np
+import pandas as pd
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+from cnae_cadeias import CNAE_CADEIA
+from particoes import STORE_PATH, NOMES
+from agregacao import PLANO, ESBOCOS, SKETCH_GAMMA, canonizar, tabelas_estado
+
+# Colunas das dimensões que não vêm de um código (*_nome são recriadas via NOMES)
+DIMENSOES_DIRETAS = ('municipio_codigo', 'periodo', 'cnae_subclasse', 'faixa_etaria', 'cbo_codigo')
+
+# Bin do DDSketch de cada salário, como agregacao.bin_sketch
+BIN_SALARIO = f"CAST(ceil(ln(greatest(salario, 1.0)) / {math.log(SKETCH_GAMMA)!r}) AS SMALLINT)"
+
+
+def conectar(memoria=None, threads=None):
+    """Conexão DuckDB em memória (memoria ex.: '2GB'; threads None = todos os núcleos)."""
+    if duckdb is None:
+        raise ImportError("duckdb não instalado. Execute: pip install duckdb")
+
+    con = duckdb.connect()
+    if memoria:
+        con.execute(f"SET memory_limit = '{memoria}'")
+    if threads:
+        con.execute(f"SET threads = {int(threads)}")
+    return con
+
+
+def _literal(texto):
+    """Literal SQL de uma string."""
+    return "'" + str(texto).replace("'", "''") + "'"
+
+
+def _registrar_tabelas(con):
+    """Tabelas de tradução: CNAE -> cadeia e código -> nome (sexo, escolaridade...)."""
+    con.register('mapa_cadeia', pd.DataFrame({
+        'cnae': list(CNAE_CADEIA), 'cadeia': list(CNAE_CADEIA.values()),
+    }))
+    for nome, (_, mapa, _) in NOMES.items():
+        con.register(f'mapa_{nome}', pd.DataFrame({
+            'codigo': list(mapa), 'nome': list(mapa.values()),
+        }))
+
+
+def _fonte(base, periodos):
+    """Leitura do store com filtro de meses (empurrado para as partições)."""
+    if os.path.isfile(base):
+        # Formato antigo: Parquet único com ano/mes no conteúdo
+        leitura = f"read_parquet({_literal(base)}, filename = true, file_row_number = true)"
+    else:
+        glob = os.path.join(base, '**', '*.parquet')
+        leitura = f"read_parquet({_literal(glob)}, hive_partitioning = true, filename = true, file_row_number = true)"
+
+    filtro = ''
+    if periodos is not None:
+        meses = [f"(ano = {int(p[:4])} AND mes = {int(p[5:7])})" for p in periodos]
+        filtro = 'WHERE ' + ' OR '.join(meses)
+    return f"SELECT * FROM {leitura} {filtro}"
+
+
+def _microdados(base, periodos, dims):
+    """
+    SELECT com as colunas usadas pelo estado, no formato de agregacao._preparar:
+    cadeia remapeada, *_nome a partir dos códigos e posição da linha no mês.
+    """
+    colunas = [f"f.{d}" for d in DIMENSOES_DIRETAS]
+    joins = []
+    for nome in sorted(d for d in dims if d in NOMES):
+        coluna, _, padrao = NOMES[nome]
+        colunas.append(f"coalesce(m_{nome}.nome, {_literal(padrao)}) AS {nome}")
+        joins.append(f"LEFT JOIN mapa_{nome} m_{nome} ON m_{nome}.codigo = f.{coluna}")
+
+    # Mapeamento atual da cadeia; sem mapeamento, mantém a cadeia gravada
+    colunas.append("coalesce(m_cadeia.cadeia, f.cadeia_produtiva) AS cadeia_produtiva")
+    joins.append("LEFT JOIN mapa_cadeia m_cadeia "
+                 "ON m_cadeia.cnae = lpad(CAST(f.cnae_subclasse AS VARCHAR), 7, '0')")
+
+    colunas += [
+        "f.is_admissao", "f.is_demissao", "f.salario",
+        "CAST(f.idade_anos AS DOUBLE) AS idade",
+        # Posição no arquivo do mês: desempate por "primeira ocorrência"
+        "row_number() OVER (PARTITION BY f.periodo ORDER BY f.filename, f.file_row_number) - 1 AS posicao",
+    ]
+    return (f"SELECT {', '.join(colunas)} FROM ({_fonte(base, periodos)}) f "
+            + ' '.join(joins))
+
+
+def _sem_nulos(dims):
+    """Grupos com dimensão nula ficam de fora, como no groupby do pandas."""
+    return ' AND '.join(f"{d} IS NOT NULL" for d in dims)
+
+
+def sql_tabela(nome, dims):
+    """Consulta de uma tabela do estado sobre a view `microdados`."""
+    grupo = ', '.join(dims)
+
+    if nome in ESBOCOS:
+        chaves = ESBOCOS[nome]
+        return (f"SELECT {', '.join(chaves)}, {BIN_SALARIO} AS bin, count(*) AS n FROM microdados "
+                f"WHERE salario IS NOT NULL AND {_sem_nulos(chaves)} GROUP BY ALL")
+
+    if nome.startswith('salarios_'):
+        return (f"SELECT {grupo}, count(*) AS n FROM microdados "
+                f"WHERE {_sem_nulos(dims)} GROUP BY ALL")
+
+    # Somas em ponto flutuante com compensação (Kahan), como o groupby do pandas
+    return (f"SELECT {grupo}, "
+            "count(*) AS registros, "
+            "CAST(sum(is_admissao) AS BIGINT) AS admissoes, "
+            "CAST(sum(is_demissao) AS BIGINT) AS demissoes, "
+            "coalesce(fsum(salario), 0.0) AS salario_soma, "
+            "count(salario) AS salario_n, "
+            "coalesce(fsum(salario * salario), 0.0) AS salario_somaq, "
+            "coalesce(fsum(idade), 0.0) AS idade_soma, "
+            "count(idade) AS idade_n, "
+            "min(posicao) AS primeira "
+            f"FROM microdados WHERE {_sem_nulos(dims)} GROUP BY {grupo}")
+
+
+def calcular_estado_sql(base=STORE_PATH, periodos=None, plano=PLANO, con=None):
+    """
+    Estado agregado dos meses `periodos` (None = todos) calculado pelo DuckDB,
+    em forma canônica (igual ao de agregacao.calcular_estado).
+    """
+    con = con or conectar()
+    tabelas = tabelas_estado(plano)
+    dims = {d for cols in tabelas.values() for d in cols}
+
+    _registrar_tabelas(con)
+    con.execute(f"CREATE OR REPLACE TEMP VIEW microdados AS {_microdados(base, periodos, dims)}")
+
+    return {
+        nome: canonizar(con.execute(sql_tabela(nome, cols)).df(), cols)
+        for nome, cols in tabelas.items()
+    }
+
+
+def comparar_estados(esperado, obtido, rtol=1e-9):
+    """
+    Diferenças entre dois estados: dimensões e contagens exatas, somas em
+    ponto flutuante com tolerância relativa `rtol`. Retorna lista de mensagens.
+    """
+    diferencas = []
+    for nome, a in esperado.items():
+        b = obtido.get(nome)
+        if b is None:
+            diferencas.append(f"{nome}: tabela ausente")
+            continue
+        if list(a.columns) != list(b.columns) or len(a) != len(b):
+            diferencas.append(f"{nome}: {len(a)} x {len(b)} linhas, colunas {list(a.columns)} x {list(b.columns)}")
+            continue
+
+        for col in a.columns:
+            x, y = a[col], b[col]
+            if pd.api.types.is_float_dtype(x.dtype):
+                iguais = np.isclose(x.to_numpy(), y.to_numpy(dtype=np.float64), rtol=rtol, atol=0, equal_nan=True)
+            else:
+                iguais = (x.astype(object) == y.astype(object)).to_numpy()
+            if not iguais.all():
+                diferencas.append(f"{nome}.{col}: {int((~iguais).sum())} valores diferentes")
+    return diferencas
@@ -0,0 +1,336 @@
+"""
+Instrumentação das etapas do pipeline
+Cada etapa (download, extração, leitura, agregação, generate_*, gravação) é
+medida por um context manager: tempo de relógio, tempo de CPU, pico de memória
+(RSS) e linhas de entrada/saída. Ao final da execução é gravado um relatório
+JSON e, no GitHub Actions, uma tabela em $GITHUB_STEP_SUMMARY.
+Uma única etapa pode ser perfilada com cProfile ou py-spy (opcional).
+
+Uso:
+    execucao = iniciar('prepare', perfilar='generate_by_cnae')
+    with etapa('load_estado') as e:
+        ...
+        e.linhas_saida = len(df)
+    finalizar()
+
+Sem execução iniciada, etapa() não mede nada (funções usadas fora dos scripts).
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import signal
+import cProfile
+import pstats
+import platform
+import threading
+import subprocess
+from io import StringIO
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:
+    # Windows: sem pico de RSS
+    resource = None
+
+# Diretórios
+SCRIPT_DIR = os.path.dirname(__file__)
+RELATORIOS_DIR = os.path.join(SCRIPT_DIR, '..', 'data', 'processed', 'execucoes')
+
+PERFILADORES = ('cprofile', 'py-spy')
+
+# Funções listadas no resumo do cProfile
+LINHAS_PERFIL = 25
+
+_execucao = None
+
+
+def pico_rss_mb():
+    """
+    Pico de memória residente do processo até agora (MB). No Linux vem do
+    VmHWM de /proc/self/status: ru_maxrss de um worker criado por fork
+    herdaria o pico do processo principal.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            return next(int(linha.split()[1]) for linha in f if linha.startswith('VmHWM:')) / 1024
+    except (OSError, StopIteration):
+        pass
+
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB; macOS em bytes
+    return pico / (1024 * 1024) if sys.platform == 'darwin' else pico / 1024
+
+
+def tamanho(obj):
+    """Linhas de um resultado (DataFrame, lista ou dict de tabelas); None se não se aplica."""
+    if hasattr(obj, 'shape') or isinstance(obj, list):
+        return len(obj)
+    if isinstance(obj, dict) and obj and all(hasattr(v, 'shape') for v in obj.values()):
+        return sum(len(v) for v in obj.values())
+    return None
+
+
+class Etapa:
+    """Medição de uma etapa; linhas e campos extras são preenchidos pelo chamador."""
+
+    def __init__(self, nome, caminho, linhas_entrada=None, **campos):
+        self.nome = nome
+        self.caminho = caminho
+        self.linhas_entrada = linhas_entrada
+        self.linhas_saida = None
+        self.campos = campos
+
+    def registrar(self, **campos):
+        """Campos extras do relatório (ex.: arquivo, bytes, periodo)."""
+        self.campos.update(campos)
+
+
+class Execucao:
+    """Etapas medidas de uma execução de script."""
+
+    def __init__(self, nome, perfilar=None, perfilador='cprofile', relatorios_dir=RELATORIOS_DIR):
+        if perfilador not in PERFILADORES:
+            raise ValueError(f"perfilador inválido: {perfilador} (opções: {', '.join(PERFILADORES)})")
+        if perfilar and perfilador == 'py-spy' and shutil.which('py-spy') is None:
+            raise ImportError("py-spy não instalado. Execute: pip install py-spy")
+        self.nome = nome
+        self.perfilar = perfilar
+        self.perfilador = perfilador
+        self.relatorios_dir = relatorios_dir
+        self.inicio = datetime.now()
+        self.relogio = time.perf_counter()
+        self.cpu = time.process_time()
+        self.pid = os.getpid()
+        self.etapas = []
+        self.perfis = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._perfilando = False
+
+    def _pilha(self):
+        """Etapas abertas na thread atual (etapas de workers ficam na raiz)."""
+        if not hasattr(self._local, 'pilha'):
+            self._local.pilha = []
+        return self._local.pilha
+
+    @contextmanager
+    def etapa(self, nome, linhas_entrada=None, **campos):
+        pilha = self._pilha()
+        caminho = '/'.join([e.nome for e in pilha] + [nome])
+        medida = Etapa(nome, caminho, linhas_entrada, **campos)
+
+        perfil = self._iniciar_perfil(nome)
+        pilha.append(medida)
+        pico_antes = pico_rss_mb()
+        relogio, cpu = time.perf_counter(), time.process_time()
+        erro = None
+        try:
+            yield medida
+        except BaseException as e:
+            erro = type(e).__name__
+            raise
+        finally:
+            registro = {
+                'etapa': medida.caminho,
+                'inicio_s': round(relogio - self.relogio, 4),
+                'segundos': round(time.perf_counter() - relogio, 4),
+                # CPU do processo: em etapas paralelas inclui as outras threads
+                'cpu_segundos': round(time.process_time() - cpu, 4),
+                'rss_pico_mb': _arredondar(pico_rss_mb()),
+                'linhas_entrada': medida.linhas_entrada,
+                'linhas_saida': medida.linhas_saida,
+            }
+            if pico_antes is not None:
+                # > 0: a etapa elevou o pico de memória do processo
+                registro['rss_pico_delta_mb'] = _arredondar(pico_rss_mb() - pico_antes)
+            if threading.current_thread() is not threading.main_thread():
+                registro['thread'] = threading.current_thread().name
+            if os.getpid() != self.pid:
+                # Worker de um pool de processos (ver tarefas.py)
+                registro['processo'] = os.getpid()
+            if erro:
+                registro['erro'] = erro
+            registro.update(medida.campos)
+
+            pilha.pop()
+            self._finalizar_perfil(perfil, nome)
+            with self._lock:
+                self.etapas.append(registro)
+
+    def incorporar(self, etapas, perfis=()):
+        """Inclui etapas e perfis medidos em outro processo (workers herdados via fork)."""
+        with self._lock:
+            self.etapas.extend(etapas)
+            self.perfis.extend(perfis)
+
+    def _iniciar_perfil(self, nome):
+        """Começa a perfilar se esta é a etapa pedida (só a primeira ocorrência)."""
+        with self._lock:
+            if nome != self.perfilar or self._perfilando or self.perfis:
+                return None
+            self._perfilando = True
+
+        os.makedirs(self.relatorios_dir, exist_ok=True)
+        if self.perfilador == 'py-spy':
+            destino = os.path.join(self.relatorios_dir, f'{self.nome}-{nome}.svg')
+            processo = subprocess.Popen(
+                ['py-spy', 'record', '--pid', str(os.getpid()), '--output', destino],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            return destino, processo
+
+        # cProfile: só a thread que executa a etapa
+        perfil = cProfile.Profile()
+        perfil.enable()
+        return os.path.join(self.relatorios_dir, f'{self.nome}-{nome}.prof'), perfil
+
+    def _finalizar_perfil(self, perfil, nome):
+        if perfil is None:
+            return
+        destino, coletor = perfil
+
+        if isinstance(coletor, cProfile.Profile):
+            coletor.disable()
+            coletor.dump_stats(destino)
+            texto = StringIO()
+            pstats.Stats(coletor, stream=texto).sort_stats('cumulative').print_stats(LINHAS_PERFIL)
+            print(f"\nPerfil de {nome} ({destino}):\n{texto.getvalue()}")
+        else:
+            # py-spy grava o flamegraph ao receber SIGINT
+            coletor.send_signal(signal.SIGINT)
+            coletor.wait()
+            print(f"\nPerfil de {nome} (py-spy): {destino}")
+
+        self.perfis.append({'etapa': nome, 'perfilador': self.perfilador, 'arquivo': destino})
+        self._perfilando = False
+
+    def relatorio(self):
+        """Relatório estruturado da execução."""
+        return {
+            'execucao': self.nome,
+            'inicio': self.inicio.isoformat(timespec='seconds'),
+            'segundos': round(time.perf_counter() - self.relogio, 4),
+            'cpu_segundos': round(time.process_time() - self.cpu, 4),
+            'rss_pico_mb': _arredondar(pico_rss_mb()),
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+            'etapas': sorted(self.etapas, key=_ordem),
+            'resumo': self.resumo(),
+            'perfis': self.perfis,
+        }
+
+    def resumo(self):
+        """Etapas agregadas por caminho (soma dos tempos e linhas, pico máximo)."""
+        # Na ordem da primeira ocorrência de cada etapa (a mãe antes das filhas)
+        resumo = {}
+        for registro in sorted(self.etapas, key=_ordem):
+            item = resumo.setdefault(registro['etapa'], {
+                'vezes': 0, 'segundos': 0.0, 'cpu_segundos': 0.0,
+                'rss_pico_mb': None, 'linhas_entrada': None, 'linhas_saida': None,
+            })
+            item['vezes'] += 1
+            item['segundos'] = round(item['segundos'] + registro['segundos'], 4)
+            item['cpu_segundos'] = round(item['cpu_segundos'] + registro['cpu_segundos'], 4)
+            if registro['rss_pico_mb'] is not None:
+                item['rss_pico_mb'] = max(item['rss_pico_mb'] or 0, registro['rss_pico_mb'])
+            for campo in ('linhas_entrada', 'linhas_saida'):
+                if registro[campo] is not None:
+                    item[campo] = (item[campo] or 0) + registro[campo]
+
+        return resumo
+
+    def tabela_markdown(self):
+        """Resumo em Markdown (GitHub Step Summary)."""
+        total = time.perf_counter() - self.relogio
+        linhas = [
+            f"### Etapas: {self.nome} ({total:,.1f} s, pico {_formatar(pico_rss_mb(), '.0f')} MB)",
+            '',
+            '| Etapa | Vezes | Tempo (s) | CPU (s) | % | Pico RSS (MB) | Linhas entrada | Linhas saída |',
+            '|---|---:|---:|---:|---:|---:|---:|---:|',
+        ]
+        for caminho, item in self.resumo().items():
+            nivel = caminho.count('/')
+            nome = '&nbsp;&nbsp;' * 2 * nivel + caminho.split('/')[-1]
+            linhas.append(
+                f"| {nome} | {item['vezes']} | {item['segundos']:,.2f} | {item['cpu_segundos']:,.2f} "
+                f"| {100 * item['segundos'] / total if total else 0:.1f} "
+                f"| {_formatar(item['rss_pico_mb'], '.0f')} "
+                f"| {_formatar(item['linhas_entrada'], ',')} | {_formatar(item['linhas_saida'], ',')} |"
+            )
+        return '\n'.join(linhas) + '\n'
+
+    def gravar(self, path=None):
+        """Grava o relatório JSON (e o Step Summary no GitHub Actions). Retorna o caminho."""
+        path = path or os.path.join(self.relatorios_dir, f'{self.nome}.json')
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.relatorio(), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+        resumo_github = os.environ.get('GITHUB_STEP_SUMMARY')
+        if resumo_github:
+            with open(resumo_github, 'a', encoding='utf-8') as f:
+                f.write(self.tabela_markdown() + '\n')
+        return path
+
+
+def _ordem(registro):
+    """Ordem de início; no empate, a etapa mãe antes das filhas."""
+    return registro['inicio_s'], registro['etapa'].count('/')
+
+
+def _arredondar(valor, casas=1):
+    return None if valor is None else round(valor, casas)
+
+
+def _formatar(valor, formato):
+    return '' if valor is None else format(valor, formato)
+
+
+def iniciar(nome, perfilar=None, perfilador='cprofile', relatorios_dir=RELATORIOS_DIR):
+    """Inicia a execução medida do processo (substitui a anterior)."""
+    global _execucao
+    _execucao = Execucao(nome, perfilar, perfilador, relatorios_dir)
+    return _execucao
+
+
+def execucao_atual():
+    """Execução em andamento (None fora de um script instrumentado)."""
+    return _execucao
+
+
+@contextmanager
+def etapa(nome, linhas_entrada=None, **campos):
+    """Mede uma etapa da execução atual; sem execução iniciada, só repassa."""
+    if _execucao is None:
+        yield Etapa(nome, nome, linhas_entrada, **campos)
+        return
+    with _execucao.etapa(nome, linhas_entrada, **campos) as medida:
+        yield medida
+
+
+def medir(funcao, *args, **kwargs):
+    """Executa funcao como etapa com o nome dela, registrando as linhas do resultado."""
+    with etapa(funcao.__name__) as medida:
+        resultado = funcao(*args, **kwargs)
+        medida.linhas_saida = tamanho(resultado)
+    return resultado
+
+
+def finalizar(path=None):
+    """Grava o relatório da execução atual e a encerra. Retorna o caminho gravado."""
+    global _execucao
+    if _execucao is None:
+        return None
+    path = _execucao.gravar(path)
+    print(f"\nRelatório de execução: {path}")
+    _execucao = None
+    return path
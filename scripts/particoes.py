@@ -0,0 +1,259 @@
+"""
+Armazenamento particionado dos microdados CAGED
+Um arquivo Parquet por mês em ano=AAAA/mes=MM, mais um manifesto
+com contagem de registros e identificação do arquivo de origem
+"""
+
+import os
+import glob
+import json
+import shutil
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from cnae_cadeias import (
+    mapear_categorico,
+    DIVISAO_CNAE, GRAU_INSTRUCAO, RACA_COR, SEXO, TIPO_MOVIMENTACAO, PORTE_EMPRESA
+)
+
+# Diretórios
+SCRIPT_DIR = os.path.dirname(__file__)
+RAW_DIR = os.path.join(SCRIPT_DIR, '..', 'data', 'raw')
+
+# O "arquivo" de microdados é um diretório particionado (dataset Parquet)
+STORE_PATH = os.path.join(RAW_DIR, 'caged_agro_pr_microdados.parquet')
+
+# Arquivos com prefixo "_" são ignorados pelos leitores de dataset
+MANIFESTO = '_manifesto.json'
+
+# Schema compacto de armazenamento
+# Strings repetidas viram categorias (dicionário no Parquet)
+CATEGORICAS = [
+    'periodo', 'municipio_codigo',
+    'cnae_subclasse', 'cnae_grupo', 'cnae_divisao', 'cadeia_produtiva',
+    'faixa_etaria', 'cbo_codigo',
+]
+
+TIPOS_COMPACTOS = {
+    'saldomovimentação': 'int8',
+    'is_admissao': 'int8',
+    'is_demissao': 'int8',
+    'tipo_mov_codigo': 'Int8',
+    'sexo_codigo': 'Int8',
+    'idade_anos': 'Int16',
+    'escolaridade_codigo': 'Int8',
+    'raca_cor_codigo': 'Int8',
+    'porte_empresa_codigo': 'Int8',
+    'salario': 'float64',
+    'horas_contratuais': 'float32',
+    'is_aprendiz': 'Int8',
+    'is_intermitente': 'int8',
+    'is_parcial': 'int8',
+}
+
+# Colunas *_nome não são gravadas: são recriadas a partir dos códigos na leitura
+NOMES = {
+    'cnae_divisao_nome': ('cnae_divisao', DIVISAO_CNAE, None),
+    'tipo_mov_nome': ('tipo_mov_codigo', TIPO_MOVIMENTACAO, 'Não identificado'),
+    'sexo_nome': ('sexo_codigo', SEXO, 'Não informado'),
+    'escolaridade_nome': ('escolaridade_codigo', GRAU_INSTRUCAO, 'Não informado'),
+    'raca_cor_nome': ('raca_cor_codigo', RACA_COR, 'Não informado'),
+    'porte_empresa_nome': ('porte_empresa_codigo', PORTE_EMPRESA, 'Não informado'),
+}
+
+# Arquivos de partição
+COMPRESSAO = 'zstd'
+LINHAS_POR_GRUPO = 128_000
+
+# Leitura em lotes: memória de trabalho por byte de lote em memória
+# (cópias do preparo + groupbys, medida em ~7-9x) e tamanho mínimo de lote
+FATOR_MEMORIA = 8
+LINHAS_MINIMAS_LOTE = 10_000
+
+# ano/mes vêm do caminho da partição, não do conteúdo do arquivo
+PARTICIONAMENTO = ds.partitioning(
+    pa.schema([('ano', pa.int16()), ('mes', pa.int8())]),
+    flavor='hive',
+)
+
+
+def chave_periodo(ano, mes):
+    """Chave do mês no manifesto (AAAA-MM)."""
+    return f"{ano}-{str(mes).zfill(2)}"
+
+
+def caminho_particao(ano, mes, base=STORE_PATH):
+    """Diretório da partição de um mês."""
+    return os.path.join(base, f'ano={ano}', f'mes={str(mes).zfill(2)}')
+
+
+def preparar_store(base=STORE_PATH):
+    """Cria o diretório do store, removendo o Parquet único legado se existir."""
+    if os.path.isfile(base):
+        print(f"Removendo arquivo legado (não particionado): {base}")
+        os.remove(base)
+    os.makedirs(base, exist_ok=True)
+
+
+def carregar_manifesto(base=STORE_PATH):
+    """Carrega o manifesto de meses armazenados ({'AAAA-MM': {...}})."""
+    path = os.path.join(base, MANIFESTO)
+    if not os.path.exists(path):
+        return {}
+
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def salvar_manifesto(manifesto, base=STORE_PATH):
+    """Grava o manifesto de forma atômica."""
+    path = os.path.join(base, MANIFESTO)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(dict(sorted(manifesto.items())), f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def mes_atualizado(manifesto, ano, mes, fonte, base=STORE_PATH):
+    """
+    Verifica se o mês já está no store com a mesma origem.
+    A origem é comparada por tamanho e data de modificação do arquivo no FTP.
+    """
+    entrada = manifesto.get(chave_periodo(ano, mes))
+    if entrada is None or fonte is None:
+        return False
+
+    origem = entrada.get('fonte', {})
+    if origem.get('tamanho') != fonte.get('tamanho') or origem.get('mdtm') != fonte.get('mdtm'):
+        return False
+
+    # Meses sem registros agro não têm arquivo
+    if entrada.get('linhas', 0) == 0:
+        return True
+    return os.path.isdir(caminho_particao(ano, mes, base))
+
+
+def compactar_microdados(df):
+    """Converte microdados para o schema de armazenamento (sem colunas *_nome)."""
+    df = df.drop(columns=[c for c in NOMES if c in df.columns])
+
+    tipos = {c: t for c, t in TIPOS_COMPACTOS.items() if c in df.columns}
+    tipos.update({c: 'category' for c in CATEGORICAS if c in df.columns})
+    df = df.astype(tipos)
+
+    # Categorias em ordem alfabética: groupby e ordenação iguais aos de strings
+    for col in CATEGORICAS:
+        if col in df.columns:
+            categorias = sorted(df[col].cat.categories)
+            df[col] = df[col].cat.reorder_categories(categorias, ordered=(col == 'periodo'))
+
+    return df
+
+
+def adicionar_nomes(df):
+    """Recria as colunas *_nome (categóricas) a partir dos códigos."""
+    for nome, (coluna, mapa, padrao) in NOMES.items():
+        if coluna in df.columns and nome not in df.columns:
+            df[nome] = mapear_categorico(df[coluna], mapa, padrao)
+    return df
+
+
+def gravar_particao(df, ano, mes, manifesto, fonte=None, base=STORE_PATH):
+    """Substitui a partição de um mês e registra no manifesto."""
+    destino = caminho_particao(ano, mes, base)
+    if os.path.isdir(destino):
+        shutil.rmtree(destino)
+
+    linhas = 0 if df is None else len(df)
+    if linhas > 0:
+        os.makedirs(destino, exist_ok=True)
+        tmp_path = os.path.join(destino, '.part-0.parquet.tmp')
+        compactar_microdados(df.drop(columns=['ano', 'mes'])).to_parquet(
+            tmp_path,
+            index=False,
+            compression=COMPRESSAO,
+            row_group_size=LINHAS_POR_GRUPO,
+        )
+        os.replace(tmp_path, os.path.join(destino, 'part-0.parquet'))
+
+    manifesto[chave_periodo(ano, mes)] = {
+        'linhas': linhas,
+        'fonte': fonte or {},
+    }
+    salvar_manifesto(manifesto, base)
+
+
+def ler_microdados(base=STORE_PATH, columns=None, periodos=None):
+    """
+    Lê o store particionado como um único DataFrame (ordem cronológica),
+    no schema compacto. Use adicionar_nomes para obter as colunas *_nome.
+    periodos: lista de meses (AAAA-MM) a ler; None lê todos.
+    """
+    if os.path.isfile(base):
+        # Formato antigo: Parquet único com strings
+        df = compactar_microdados(pd.read_parquet(base, columns=columns))
+        if periodos is not None:
+            df = df.loc[df['periodo'].astype(str).isin(periodos)].reset_index(drop=True)
+        return df
+
+    # Só as partições pedidas são abertas (filtro sobre ano/mes do caminho)
+    filtros = None
+    if periodos is not None:
+        filtros = [[('ano', '=', int(p[:4])), ('mes', '=', int(p[5:7]))] for p in periodos]
+    df = pd.read_parquet(base, columns=columns, partitioning=PARTICIONAMENTO, filters=filtros)
+
+    # Manter ano/mes como primeiras colunas, como no arquivo único
+    inicio = [c for c in ('ano', 'mes') if c in df.columns]
+    df = df[inicio + [c for c in df.columns if c not in inicio]]
+
+    # Unificar dicionários das partições (ordem alfabética, periodo ordenado)
+    return compactar_microdados(df)
+
+
+def arquivos_microdados(base=STORE_PATH, periodos=None):
+    """Arquivos Parquet do store em ordem cronológica (só os meses pedidos)."""
+    if os.path.isfile(base):
+        return [base]
+
+    if periodos is None:
+        return sorted(glob.glob(os.path.join(base, 'ano=*', 'mes=*', '*.parquet')))
+    return [
+        path
+        for periodo in sorted(periodos)
+        for path in sorted(glob.glob(os.path.join(caminho_particao(periodo[:4], periodo[5:7], base), '*.parquet')))
+    ]
+
+
+def ler_lotes(base=STORE_PATH, periodos=None, linhas=LINHAS_POR_GRUPO, columns=None):
+    """
+    Lê o store em lotes de até `linhas` registros (ordem cronológica), no
+    schema compacto: a memória fica limitada ao lote, não ao store inteiro.
+    """
+    for path in arquivos_microdados(base, periodos):
+        arquivo = pq.ParquetFile(path)
+        for lote in arquivo.iter_batches(batch_size=linhas, columns=columns):
+            df = lote.to_pandas()
+            if periodos is not None and os.path.isfile(base):
+                # Formato antigo: meses misturados no mesmo arquivo
+                df = df.loc[df['periodo'].astype(str).isin(periodos)].reset_index(drop=True)
+            yield compactar_microdados(df)
+
+
+def linhas_por_lote(orcamento_mb, base=STORE_PATH, amostra=LINHAS_MINIMAS_LOTE):
+    """
+    Tamanho de lote que cabe no orçamento de memória, estimado pelo consumo
+    por linha de uma amostra do primeiro arquivo (vezes FATOR_MEMORIA).
+    """
+    arquivos = arquivos_microdados(base)
+    if not arquivos:
+        return LINHAS_POR_GRUPO
+
+    lote = next(pq.ParquetFile(arquivos[0]).iter_batches(batch_size=amostra), None)
+    if lote is None or lote.num_rows == 0:
+        return LINHAS_POR_GRUPO
+
+    df = compactar_microdados(lote.to_pandas())
+    bytes_por_linha = df.memory_usage(deep=True).sum() / len(df) * FATOR_MEMORIA
+    return max(LINHAS_MINIMAS_LOTE, int(orcamento_mb * 1024 * 1024 / bytes_por_linha))
@@ -5,29 +5,64 @@ Gera múltiplas agregações permitindo filtros e drill-down
 
 import os
 import json
+import argparse
+import tempfile
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
-import numpy as np
 from datetime import datetime
 
+from recortes import (RECORTE_PADRAO, validar_recorte, nome_recorte, store_path, subdiretorio,
+                      geo_recorte, titulo_recorte, subtitulo_recorte)
+
 # Diretórios
 SCRIPT_DIR = os.path.dirname(__file__)
 RAW_DIR = os.path.join(SCRIPT_DIR, '..', 'data', 'raw')
 DASHBOARD_DIR = os.path.join(SCRIPT_DIR, '..', 'dashboard', 'public', 'data')
 ASSETS_DIR = os.path.join(SCRIPT_DIR, '..', 'dashboard', 'public', 'assets')
+ESTADO_DIR = os.path.join(SCRIPT_DIR, '..', 'data', 'processed', 'agregados')
 
+# Níveis regionais pré-agregados: nível -> propriedade do mun_<UF>.json
+# (None = estado inteiro; municípios sem a propriedade vão para 'Não informado')
+NIVEIS_REGIONAIS = {
+    'meso': 'MesoIdr',
+    'regIdr': 'RegIdr',
+    'estado': None,
+}
 
-def load_municipio_names():
-    """Carrega mapeamento de código para nome de município."""
-    geo_path = os.path.join(ASSETS_DIR, 'mun_PR.json')
+# Recorte (UF, seção CNAE) processado; ver definir_recorte
+RECORTE = RECORTE_PADRAO
+
+
+def definir_recorte(uf, secao):
+    """
+    Seleciona o recorte processado: store de microdados, GeoJSON dos
+    municípios e diretórios padrão do estado agregado e das saídas.
+    """
+    global RECORTE
+    RECORTE = validar_recorte(uf, secao)
+    return RECORTE
+
+
+def load_municipios_geo():
+    """Carrega as propriedades dos municípios do GeoJSON da UF (mun_<UF>.json)."""
+    geo_path = os.path.join(ASSETS_DIR, geo_recorte(RECORTE))
     if not os.path.exists(geo_path):
-        return {}
+        return []
 
     with open(geo_path, 'r', encoding='utf-8') as f:
         geo = json.load(f)
 
+    return [feat['properties'] for feat in geo['features']]
+
+
+def load_municipio_names(municipios=None):
+    """Carrega mapeamento de código para nome de município."""
+    if municipios is None:
+        municipios = load_municipios_geo()
+
     code_to_name = {}
-    for feat in geo['features']:
-        props = feat['properties']
+    for props in municipios:
         code_full = str(props['CodIbge'])
         code_6 = code_full[:6]
         code_to_name[code_6] = props['Municipio']
@@ -35,6 +70,23 @@ def load_municipio_names():
     return code_to_name
 
 
+def load_municipio_regioes(municipios=None):
+    """
+    Mapeamentos de código do município (6 dígitos) para cada nível regional:
+    {'meso': {...}, 'regIdr': {...}, 'estado': {...}}.
+    """
+    if municipios is None:
+        municipios = load_municipios_geo()
+
+    regioes = {nivel: {} for nivel in NIVEIS_REGIONAIS}
+    for props in municipios:
+        code_6 = str(props['CodIbge'])[:6]
+        for nivel, propriedade in NIVEIS_REGIONAIS.items():
+            regioes[nivel][code_6] = props.get(propriedade) if propriedade else RECORTE[0]
+
+    return regioes
+
+
 def load_cnae_descricoes():
     """Carrega descrições de CNAE."""
     cnae_path = os.path.join(SCRIPT_DIR, 'cnae_descricoes.json')
@@ -45,84 +97,171 @@ def load_cnae_descricoes():
         return json.load(f)
 
 # Importar mapeamentos
-from cnae_cadeias import CADEIAS_CORES, CADEIAS_DESCRICAO, CNAE_CADEIA, get_cadeia
+from cnae_cadeias import CADEIAS_CORES, CADEIAS_DESCRICAO, derivar_cadeia
+from particoes import (
+    ler_microdados, ler_lotes, linhas_por_lote, adicionar_nomes,
+    carregar_manifesto as carregar_manifesto_micro
+)
+from agregacao import (
+    PlanoAgregacao, CUBO, SKETCH_ALFA, SKETCH_GAMMA, HISTOGRAMA_GAMMA, salario_medio, consolidar_por_mapa,
+    calcular_estado, fundir_estados, fundir_tabelas, tabelas_estado, reclassificar_estado, bytes_estado
+)
+import estado_agregado
+import estado_sql
+from saida_json import EscritorSaidas, colunar, esparso, serializar_saida
+import instrumentacao
+from instrumentacao import etapa, medir, PERFILADORES
+from shards import (
+    SHARDS_DIR, NIVEIS_SHARD, MANIFESTO as MANIFESTO_SAIDAS,
+    particionar, serializar_shards, gravar_shards, ler_manifesto, carregar_manifesto, escrever_manifesto
+)
+from tarefas import GrafoTarefas, Compartilhado
+
+# Layouts dos cubos granulares
+FORMATOS_CUBO = ('colunar', 'linhas')
+
+# Motores de agregação: pandas (microdados em memória) ou SQL via DuckDB
+BACKENDS = ('pandas', 'duckdb')
+
+# Modo em lotes (memoria_mb): estados parciais acumulados antes de cada fusão
+# (passando de metade do orçamento, são fundidos e gravados em disco)
+LOTES_POR_FUSAO = 8
+
+
+def microdata_path():
+    """Store particionado dos microdados do recorte atual."""
+    return store_path(RECORTE, RAW_DIR)
+
+
+def load_microdata(periodos=None):
+    """
+    Carrega microdados (store particionado por mês) e remapeia cadeia_produtiva.
+    Dimensões ficam categóricas: os groupbys operam sobre os códigos.
+    periodos: lista de meses (AAAA-MM) a carregar; None carrega todos.
+    """
+    return preparar_microdados(ler_microdados(microdata_path(), periodos=periodos))
 
 
-def load_microdata():
-    """Carrega microdados e remapeia cadeia_produtiva."""
-    path = os.path.join(RAW_DIR, 'caged_agro_pr_microdados.parquet')
-    df = pd.read_parquet(path)
+def preparar_microdados(df):
+    """Remapeia cadeia_produtiva e recria as colunas *_nome (microdados ou um lote)."""
+    # Remapear cadeia_produtiva com base no mapeamento atual
+    # (mantém a cadeia original onde não há mapeamento novo)
+    df['cadeia_produtiva'] = derivar_cadeia(
+        df['cnae_subclasse'], fallback=df['cadeia_produtiva']
+    ).astype('category')
 
-    # Guardar cadeia original para fallback
-    cadeia_original = df['cadeia_produtiva'].copy()
+    # Nomes (sexo, escolaridade, porte...) via lookup dos códigos
+    return adicionar_nomes(df)
 
-    # Remapear cadeia_produtiva com base no mapeamento atual
-    df['cnae_str'] = df['cnae_subclasse'].astype(str).str.zfill(7)
-    df['cadeia_produtiva'] = df['cnae_str'].map(CNAE_CADEIA)
-
-    # Usar cadeia original onde não há mapeamento novo
-    df['cadeia_produtiva'] = df['cadeia_produtiva'].fillna(cadeia_original)
-
-    # Limpar coluna temporária
-    df.drop(columns=['cnae_str'], inplace=True)
-
-    return df
-
-
-def safe_json(obj):
-    """Converte numpy types para Python nativos e remove NaN."""
-    if isinstance(obj, dict):
-        return {k: safe_json(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [safe_json(v) for v in obj]
-    elif isinstance(obj, (np.integer, np.int64, np.int32)):
-        return int(obj)
-    elif isinstance(obj, (np.floating, np.float64, np.float32)):
-        if np.isnan(obj) or np.isinf(obj):
-            return None
-        return float(obj)
-    elif isinstance(obj, np.bool_):
-        return bool(obj)
-    elif isinstance(obj, np.ndarray):
-        return [safe_json(v) for v in obj.tolist()]
-    elif isinstance(obj, float):
-        if np.isnan(obj) or np.isinf(obj):
-            return None
-        return obj
-    return obj
-
-
-def generate_metadata(df):
+
+def _fechar_grupo(parciais, derramados, grupo, tmp):
+    """
+    Grava em `tmp` o estado de um grupo de meses já fechado: estados parciais
+    em memória e lotes derramados em disco, fundidos uma tabela por vez.
+    """
+    if not derramados:
+        estado_agregado.gravar_periodo(fundir_estados(parciais), grupo, tmp)
+        return
+
+    os.makedirs(estado_agregado.caminho_periodo(grupo, tmp))
+    for nome, dims in tabelas_estado().items():
+        tabelas = [estado_agregado.ler_tabela(d, nome, tmp) for d in derramados] + [p[nome] for p in parciais]
+        fundir_tabelas(tabelas, dims).to_parquet(estado_agregado.caminho_tabela(grupo, nome, tmp), index=False)
+        estado_agregado.liberar_memoria_arrow()
+    for derramado in derramados:
+        estado_agregado.remover_periodo(derramado, tmp)
+
+
+def calcular_em_lotes(periodos=None, memoria_mb=None):
+    """
+    Estado agregado lendo o store em lotes que cabem em `memoria_mb`:
+    cada lote é resumido e fundido ao estado dos meses em aberto, sem nunca
+    ter os microdados inteiros em memória. As contagens continuam exatas
+    (mesmo estado do cálculo de uma vez): quando os estados parciais passam
+    de metade do orçamento, são fundidos e derramados num diretório
+    temporário. No store particionado os lotes vêm em ordem cronológica: um
+    mês se fecha quando chega um lote posterior e vai para o disco; o estado
+    final é montado dos meses fechados, uma tabela por vez.
+    """
+    linhas = linhas_por_lote(memoria_mb, microdata_path())
+    cronologico = os.path.isdir(microdata_path())
+    grupos, derramados, parciais, abertos, vistos = [], [], [], set(), {}
+
+    with tempfile.TemporaryDirectory(prefix='estado_lotes_') as tmp:
+        for lote in ler_lotes(microdata_path(), periodos, linhas):
+            with etapa('lote', linhas_entrada=len(lote)):
+                lote = preparar_microdados(lote)
+                estado = calcular_estado(lote, deslocamento=vistos)
+            meses = lote['periodo'].astype(str).value_counts()
+            for periodo, n in meses.items():
+                vistos[periodo] = vistos.get(periodo, 0) + int(n)
+
+            if cronologico and abertos and len(meses) and meses.index.min() > max(abertos):
+                grupos.append(f'grupo{len(grupos)}')
+                _fechar_grupo(parciais, derramados, grupos[-1], tmp)
+                derramados, parciais, abertos = [], [], set()
+            parciais.append(estado)
+            abertos.update(meses.index)
+
+            # Fusão limitada: poucos estados parciais; passando de metade do orçamento, vão para o disco
+            if len(parciais) >= LOTES_POR_FUSAO:
+                parciais = [fundir_estados(parciais)]
+            if memoria_mb and sum(map(bytes_estado, parciais)) > memoria_mb * 2**20 / 2:
+                derramados.append(f'lote{len(grupos)}_{len(derramados)}')
+                estado_agregado.gravar_periodo(fundir_estados(parciais), derramados[-1], tmp)
+                parciais = []
+
+        if not grupos and not derramados and not parciais:
+            # Nenhum registro: estado vazio com o schema completo
+            return calcular_estado(load_microdata(periodos))
+        if not grupos and not derramados:
+            return fundir_estados(parciais) if len(parciais) > 1 else parciais[0]
+        if parciais or derramados:
+            grupos.append(f'grupo{len(grupos)}')
+            _fechar_grupo(parciais, derramados, grupos[-1], tmp)
+        return estado_agregado.combinar_periodos(grupos, tmp)
+
+
+def generate_metadata(plano):
     """Gera metadados."""
+    cubo = plano.base('cubo')
+    periodos = plano.rollup('cubo', ['periodo'])['periodo']
     return {
-        'titulo': 'Emprego Agrícola - Paraná',
-        'subtitulo': 'Movimentações de emprego formal na agropecuária paranaense',
+        'titulo': titulo_recorte(RECORTE),
+        'subtitulo': subtitulo_recorte(RECORTE),
+        'uf': RECORTE[0],
+        'secao': RECORTE[1],
+        'geo': geo_recorte(RECORTE),
         'fonte': 'CAGED/MTE - Microdados do Novo CAGED',
         'atualizacao': datetime.now().strftime('%Y-%m-%d'),
-        'periodo_inicial': df['periodo'].min(),
-        'periodo_final': df['periodo'].max(),
-        'total_registros': len(df),
-        'total_municipios': df['municipio_codigo'].nunique(),
-        'total_cadeias': df['cadeia_produtiva'].nunique(),
-        'total_subclasses': df['cnae_subclasse'].nunique(),
+        'periodo_inicial': periodos.min(),
+        'periodo_final': periodos.max(),
+        'total_registros': int(cubo['registros'].sum()),
+        'total_municipios': cubo['municipio_codigo'].nunique(),
+        'total_cadeias': cubo['cadeia_produtiva'].nunique(),
+        'total_subclasses': plano.base('cnae')['cnae_subclasse'].nunique(),
     }
 
 
-def generate_kpis(df):
+def generate_kpis(plano):
     """Gera KPIs gerais."""
-    ultimo_periodo = df['periodo'].max()
-    df_ultimo = df[df['periodo'] == ultimo_periodo]
+    ts = plano.rollup('cubo', ['periodo'])
+    ultimo = ts.loc[ts['periodo'] == ts['periodo'].max()].iloc[0]
+    ultimo_periodo = ultimo['periodo']
 
-    admissoes_total = df['is_admissao'].sum()
-    demissoes_total = df['is_demissao'].sum()
+    admissoes_total = ts['admissoes'].sum()
+    demissoes_total = ts['demissoes'].sum()
     saldo_total = admissoes_total - demissoes_total
 
-    admissoes_ultimo = df_ultimo['is_admissao'].sum()
-    demissoes_ultimo = df_ultimo['is_demissao'].sum()
+    admissoes_ultimo = ultimo['admissoes']
+    demissoes_ultimo = ultimo['demissoes']
     saldo_ultimo = admissoes_ultimo - demissoes_ultimo
 
-    salario_medio = df['salario'].mean()
-    salario_mediana = df['salario'].median()
+    salario_medio = ts['salario_soma'].sum() / ts['salario_n'].sum()
+    salario_mediana = plano.salario([], 'median')
+
+    sexo = plano.rollup('sexo', ['sexo_nome'])
+    masculino = sexo.loc[sexo['sexo_nome'] == 'Masculino', 'registros'].sum()
 
     return {
         'periodo_referencia': ultimo_periodo,
@@ -141,20 +280,19 @@ def generate_kpis(df):
             'mediana': round(salario_mediana, 2),
         },
         'perfil': {
-            'pct_masculino': round(df[df['sexo_nome'] == 'Masculino'].shape[0] / len(df) * 100, 1),
-            'idade_media': round(df['idade_anos'].mean(), 1),
+            'pct_masculino': round(masculino / sexo['registros'].sum() * 100, 1),
+            'idade_media': round(ts['idade_soma'].sum() / ts['idade_n'].sum(), 1),
         }
     }
 
 
-def generate_timeseries(df):
+def generate_timeseries(plano):
     """Série temporal mensal."""
-    ts = df.groupby('periodo').agg({
-        'is_admissao': 'sum',
-        'is_demissao': 'sum',
-        'salario': ['mean', 'median'],
-    }).reset_index()
+    ts = plano.rollup('cubo', ['periodo'])
+    ts = ts.assign(salario_medio=salario_medio(ts))
+    ts = plano.com_salario(ts, ['periodo'], 'median')
 
+    ts = ts[['periodo', 'admissoes', 'demissoes', 'salario_medio', 'salario_median']]
     ts.columns = ['periodo', 'admissoes', 'demissoes', 'salario_medio', 'salario_mediana']
     ts['saldo'] = ts['admissoes'] - ts['demissoes']
     ts['saldo_acumulado'] = ts['saldo'].cumsum()
@@ -162,101 +300,119 @@ def generate_timeseries(df):
     return ts.to_dict(orient='records')
 
 
-def generate_by_cadeia(df):
+def generate_by_cadeia(plano):
     """Agregação por cadeia produtiva."""
-    agg = df.groupby('cadeia_produtiva').agg({
-        'is_admissao': 'sum',
-        'is_demissao': 'sum',
-        'salario': ['mean', 'median', 'std'],
-        'cnae_subclasse': 'nunique',
-        'municipio_codigo': 'nunique',
-    }).reset_index()
-
+    dims = ['cadeia_produtiva']
+    agg = plano.rollup('cubo', dims)
+    agg = agg.assign(salario_medio=salario_medio(agg))
+    agg = plano.com_salario(agg, dims, 'median', 'std')
+
+    # Contagens de subclasses e municípios distintos a partir dos agregados
+    cnae = plano.rollup('cnae', ['cadeia_produtiva', 'cnae_subclasse'])
+    mun = plano.rollup('cubo', ['cadeia_produtiva', 'municipio_codigo'])
+    n_subclasses = cnae.groupby('cadeia_produtiva', observed=True).size().rename('n_subclasses')
+    n_municipios = mun.groupby('cadeia_produtiva', observed=True).size().rename('n_municipios')
+    agg = agg.join(n_subclasses, on='cadeia_produtiva').join(n_municipios, on='cadeia_produtiva')
+
+    agg = agg[['cadeia_produtiva', 'admissoes', 'demissoes', 'salario_medio',
+               'salario_median', 'salario_std', 'n_subclasses', 'n_municipios']]
     agg.columns = ['cadeia', 'admissoes', 'demissoes', 'salario_medio',
                    'salario_mediana', 'salario_std', 'n_subclasses', 'n_municipios']
     agg['saldo'] = agg['admissoes'] - agg['demissoes']
     agg['pct_admissoes'] = (agg['admissoes'] / agg['admissoes'].sum() * 100).round(1)
+    agg['cadeia'] = agg['cadeia'].astype(str)
     agg['cor'] = agg['cadeia'].map(CADEIAS_CORES).fillna('#808080')
     agg['descricao'] = agg['cadeia'].map(CADEIAS_DESCRICAO).fillna('')
 
     return agg.sort_values('admissoes', ascending=False).to_dict(orient='records')
 
 
-def generate_timeseries_cadeia(df):
+def generate_timeseries_cadeia(plano):
     """Série temporal por cadeia."""
-    ts = df.groupby(['periodo', 'cadeia_produtiva']).agg({
-        'is_admissao': 'sum',
-        'is_demissao': 'sum',
-    }).reset_index()
+    ts = plano.rollup('cubo', ['periodo', 'cadeia_produtiva'])
 
+    ts = ts[['periodo', 'cadeia_produtiva', 'admissoes', 'demissoes']]
     ts.columns = ['periodo', 'cadeia', 'admissoes', 'demissoes']
     ts['saldo'] = ts['admissoes'] - ts['demissoes']
 
     return ts.to_dict(orient='records')
 
 
-def generate_by_cnae(df, cnae_desc):
+def generate_by_cnae(plano, cnae_desc):
     """Agregação por CNAE subclasse (máxima granularidade)."""
-    agg = df.groupby(['cnae_subclasse', 'cadeia_produtiva']).agg({
-        'is_admissao': 'sum',
-        'is_demissao': 'sum',
-        'salario': ['mean', 'median'],
-        'municipio_codigo': 'nunique',
-    }).reset_index()
+    dims = ['cnae_subclasse', 'cadeia_produtiva']
+    agg = plano.rollup('cnae', dims)
+    agg = agg.assign(salario_medio=salario_medio(agg))
+    agg = plano.com_salario(agg, dims, 'median')
 
+    mun = plano.rollup('cnae', dims + ['municipio_codigo'])
+    n_municipios = mun.groupby(dims, observed=True).size().rename('n_municipios')
+    agg = agg.join(n_municipios, on=dims)
+
+    agg = agg[['cnae_subclasse', 'cadeia_produtiva', 'admissoes', 'demissoes',
+               'salario_medio', 'salario_median', 'n_municipios']]
     agg.columns = ['cnae', 'cadeia', 'admissoes', 'demissoes',
                    'salario_medio', 'salario_mediana', 'n_municipios']
     agg['saldo'] = agg['admissoes'] - agg['demissoes']
+    agg['cnae'] = agg['cnae'].astype(str)
     agg['descricao'] = agg['cnae'].map(cnae_desc).fillna('Não especificado')
 
     return agg.sort_values('admissoes', ascending=False).to_dict(orient='records')
 
 
-def generate_by_municipio(df, mun_names):
-    """Agregação por município."""
-    agg = df.groupby('municipio_codigo').agg({
-        'is_admissao': 'sum',
-        'is_demissao': 'sum',
-        'salario': 'mean',
-        'cadeia_produtiva': lambda x: x.value_counts().index[0],  # cadeia dominante
-    }).reset_index()
+def agregar_municipios(plano, mun_names):
+    """Agregado por município (compartilhado por by_municipio e top_municipios)."""
+    return plano.memorizar(('municipios', tuple(sorted(mun_names.items()))), _agregar_municipios, plano, mun_names)
 
+
+def _agregar_municipios(plano, mun_names):
+    agg = plano.rollup('cubo', ['municipio_codigo'])
+    agg = agg.assign(salario_medio=salario_medio(agg))
+
+    dominante = plano.dominante('cubo', 'municipio_codigo', 'cadeia_produtiva').rename('cadeia_dominante')
+    agg = agg.join(dominante, on='municipio_codigo')
+
+    agg = agg[['municipio_codigo', 'admissoes', 'demissoes', 'salario_medio', 'cadeia_dominante']]
     agg.columns = ['codigo', 'admissoes', 'demissoes', 'salario_medio', 'cadeia_dominante']
     agg['saldo'] = agg['admissoes'] - agg['demissoes']
+    agg['codigo'] = agg['codigo'].astype(str)
     agg['nome'] = agg['codigo'].map(mun_names).fillna(agg['codigo'])
+    return agg
 
+
+def generate_by_municipio(plano, mun_names):
+    """Agregação por município."""
+    agg = agregar_municipios(plano, mun_names)
     return agg.sort_values('admissoes', ascending=False).to_dict(orient='records')
 
 
-def generate_by_sexo(df):
-    """Agregação por sexo."""
-    agg = df.groupby('sexo_nome').agg({
-        'is_admissao': 'sum',
-        'is_demissao': 'sum',
-        'salario': ['mean', 'median'],
-    }).reset_index()
+def _por_dimensao(plano, familia, coluna, nome):
+    """Agregação por uma dimensão demográfica (sexo, faixa, escolaridade, porte)."""
+    agg = plano.rollup(familia, [coluna])
+    agg = agg.assign(salario_medio=salario_medio(agg))
+    agg = plano.com_salario(agg, [coluna], 'median')
 
-    agg.columns = ['sexo', 'admissoes', 'demissoes', 'salario_medio', 'salario_mediana']
+    agg = agg[[coluna, 'admissoes', 'demissoes', 'salario_medio', 'salario_median']]
+    agg.columns = [nome, 'admissoes', 'demissoes', 'salario_medio', 'salario_mediana']
     agg['saldo'] = agg['admissoes'] - agg['demissoes']
     agg['pct'] = (agg['admissoes'] / agg['admissoes'].sum() * 100).round(1)
+    agg[nome] = agg[nome].astype(str)
+
+    return agg
+
 
+def generate_by_sexo(plano):
+    """Agregação por sexo."""
+    agg = _por_dimensao(plano, 'sexo', 'sexo_nome', 'sexo')
     return agg.to_dict(orient='records')
 
 
-def generate_by_faixa_etaria(df):
+def generate_by_faixa_etaria(plano):
     """Agregação por faixa etária."""
     ordem = ['Menor de 18', '18 a 24 anos', '25 a 29 anos', '30 a 39 anos',
              '40 a 49 anos', '50 a 64 anos', '65 anos ou mais', 'Não informado']
 
-    agg = df.groupby('faixa_etaria').agg({
-        'is_admissao': 'sum',
-        'is_demissao': 'sum',
-        'salario': ['mean', 'median'],
-    }).reset_index()
-
-    agg.columns = ['faixa', 'admissoes', 'demissoes', 'salario_medio', 'salario_mediana']
-    agg['saldo'] = agg['admissoes'] - agg['demissoes']
-    agg['pct'] = (agg['admissoes'] / agg['admissoes'].sum() * 100).round(1)
+    agg = _por_dimensao(plano, 'faixa', 'faixa_etaria', 'faixa')
 
     # Ordenar
     agg['ordem'] = agg['faixa'].apply(lambda x: ordem.index(x) if x in ordem else 99)
@@ -265,45 +421,24 @@ def generate_by_faixa_etaria(df):
     return agg.to_dict(orient='records')
 
 
-def generate_by_escolaridade(df):
+def generate_by_escolaridade(plano):
     """Agregação por escolaridade."""
-    agg = df.groupby('escolaridade_nome').agg({
-        'is_admissao': 'sum',
-        'is_demissao': 'sum',
-        'salario': ['mean', 'median'],
-    }).reset_index()
-
-    agg.columns = ['escolaridade', 'admissoes', 'demissoes', 'salario_medio', 'salario_mediana']
-    agg['saldo'] = agg['admissoes'] - agg['demissoes']
-    agg['pct'] = (agg['admissoes'] / agg['admissoes'].sum() * 100).round(1)
-
+    agg = _por_dimensao(plano, 'escolaridade', 'escolaridade_nome', 'escolaridade')
     return agg.sort_values('admissoes', ascending=False).to_dict(orient='records')
 
 
-def generate_by_porte(df):
+def generate_by_porte(plano):
     """Agregação por porte da empresa."""
-    agg = df.groupby('porte_empresa_nome').agg({
-        'is_admissao': 'sum',
-        'is_demissao': 'sum',
-        'salario': ['mean', 'median'],
-    }).reset_index()
-
-    agg.columns = ['porte', 'admissoes', 'demissoes', 'salario_medio', 'salario_mediana']
-    agg['saldo'] = agg['admissoes'] - agg['demissoes']
-    agg['pct'] = (agg['admissoes'] / agg['admissoes'].sum() * 100).round(1)
-
+    agg = _por_dimensao(plano, 'porte', 'porte_empresa_nome', 'porte')
     return agg.to_dict(orient='records')
 
 
-def generate_seasonality(df):
+def generate_seasonality(plano):
     """Sazonalidade mensal."""
-    df_copy = df.copy()
-    df_copy['mes_num'] = df_copy['mes'].astype(int)
+    ts = plano.rollup('cubo', ['periodo'])
+    mes_num = ts['periodo'].astype(str).str[5:7].astype(int).rename('mes')
 
-    sazonal = df_copy.groupby('mes_num').agg({
-        'is_admissao': 'sum',
-        'is_demissao': 'sum',
-    }).reset_index()
+    sazonal = ts.groupby(mes_num)[['admissoes', 'demissoes']].sum().reset_index()
 
     sazonal.columns = ['mes', 'admissoes', 'demissoes']
     sazonal['saldo'] = sazonal['admissoes'] - sazonal['demissoes']
@@ -319,117 +454,90 @@ def generate_seasonality(df):
     return sazonal.to_dict(orient='records')
 
 
-def generate_yearly(df):
+def generate_yearly(plano):
     """Resumo anual."""
-    anual = df.groupby('ano').agg({
-        'is_admissao': 'sum',
-        'is_demissao': 'sum',
-        'salario': 'mean',
-    }).reset_index()
+    ts = plano.rollup('cubo', ['periodo'])
+    ano = ts['periodo'].astype(str).str[:4].astype(int).rename('ano')
 
-    anual.columns = ['ano', 'admissoes', 'demissoes', 'salario_medio']
+    anual = ts.groupby(ano)[['admissoes', 'demissoes', 'salario_soma', 'salario_n']].sum().reset_index()
+    anual['salario_medio'] = salario_medio(anual)
+
+    anual = anual[['ano', 'admissoes', 'demissoes', 'salario_medio']]
     anual['saldo'] = anual['admissoes'] - anual['demissoes']
 
     return anual.to_dict(orient='records')
 
 
-def generate_cross_cadeia_sexo(df):
+def generate_cross_cadeia_sexo(plano):
     """Cruzamento cadeia x sexo."""
-    cross = df.groupby(['cadeia_produtiva', 'sexo_nome']).agg({
-        'is_admissao': 'sum',
-        'is_demissao': 'sum',
-        'salario': 'mean',
-    }).reset_index()
+    cross = plano.rollup('sexo', ['cadeia_produtiva', 'sexo_nome'])
+    cross = cross.assign(salario_medio=salario_medio(cross))
 
+    cross = cross[['cadeia_produtiva', 'sexo_nome', 'admissoes', 'demissoes', 'salario_medio']]
     cross.columns = ['cadeia', 'sexo', 'admissoes', 'demissoes', 'salario_medio']
     cross['saldo'] = cross['admissoes'] - cross['demissoes']
 
     return cross.to_dict(orient='records')
 
 
-def generate_cross_cadeia_idade(df):
+def generate_cross_cadeia_idade(plano):
     """Cruzamento cadeia x faixa etária."""
-    cross = df.groupby(['cadeia_produtiva', 'faixa_etaria']).agg({
-        'is_admissao': 'sum',
-        'is_demissao': 'sum',
-    }).reset_index()
+    cross = plano.rollup('faixa', ['cadeia_produtiva', 'faixa_etaria'])
 
+    cross = cross[['cadeia_produtiva', 'faixa_etaria', 'admissoes', 'demissoes']]
     cross.columns = ['cadeia', 'faixa', 'admissoes', 'demissoes']
     cross['saldo'] = cross['admissoes'] - cross['demissoes']
 
     return cross.to_dict(orient='records')
 
 
-def generate_cross_cadeia_escolaridade(df):
+def generate_cross_cadeia_escolaridade(plano):
     """Cruzamento cadeia x escolaridade."""
-    cross = df.groupby(['cadeia_produtiva', 'escolaridade_nome']).agg({
-        'is_admissao': 'sum',
-        'is_demissao': 'sum',
-        'salario': 'mean',
-    }).reset_index()
+    cross = plano.rollup('escolaridade', ['cadeia_produtiva', 'escolaridade_nome'])
+    cross = cross.assign(salario_medio=salario_medio(cross))
 
+    cross = cross[['cadeia_produtiva', 'escolaridade_nome', 'admissoes', 'demissoes', 'salario_medio']]
     cross.columns = ['cadeia', 'escolaridade', 'admissoes', 'demissoes', 'salario_medio']
     cross['saldo'] = cross['admissoes'] - cross['demissoes']
 
     return cross.to_dict(orient='records')
 
 
-def generate_salary_distribution(df):
+def generate_salary_distribution(plano):
     """Distribuição salarial por cadeia."""
-    result = []
-
-    for cadeia in df['cadeia_produtiva'].unique():
-        df_cadeia = df[df['cadeia_produtiva'] == cadeia]['salario'].dropna()
+    dist = plano.distribuicao(['cadeia_produtiva']).set_index('cadeia_produtiva')
 
-        if len(df_cadeia) > 0:
-            result.append({
-                'cadeia': cadeia,
-                'min': float(df_cadeia.min()),
-                'p10': float(df_cadeia.quantile(0.10)),
-                'p25': float(df_cadeia.quantile(0.25)),
-                'p50': float(df_cadeia.median()),
-                'p75': float(df_cadeia.quantile(0.75)),
-                'p90': float(df_cadeia.quantile(0.90)),
-                'max': float(df_cadeia.max()),
-                'mean': float(df_cadeia.mean()),
-                'std': float(df_cadeia.std()),
-            })
+    # Cadeias com salário, na ordem em que aparecem nos microdados
+    ordem = [c for c in plano.ordem('cubo', 'cadeia_produtiva') if c in dist.index]
+    dist = dist.loc[ordem].rename_axis('cadeia').reset_index()
+    dist['cadeia'] = dist['cadeia'].astype(str)
 
-    return result
+    return dist.to_dict(orient='records')
 
 
-def generate_top_municipios(df, mun_names, n=20):
-    """Top municípios por movimentação."""
-    agg = df.groupby('municipio_codigo').agg({
-        'is_admissao': 'sum',
-        'is_demissao': 'sum',
-        'salario': 'mean',
-        'cadeia_produtiva': lambda x: x.value_counts().index[0],
-    }).reset_index()
+def generate_salary_histogram(plano):
+    """
+    Histograma salarial por cadeia (bins logarítmicos de razão HISTOGRAMA_GAMMA;
+    o bin k cobre salários em (gamma^(k-1), gamma^k]).
+    """
+    hist = plano.histograma(['cadeia_produtiva'])
+    hist.columns = ['cadeia', 'bin', 'n']
+    hist['cadeia'] = hist['cadeia'].astype(str)
+    return hist.to_dict(orient='records')
 
-    agg.columns = ['codigo', 'admissoes', 'demissoes', 'salario_medio', 'cadeia_dominante']
-    agg['saldo'] = agg['admissoes'] - agg['demissoes']
-    agg['nome'] = agg['codigo'].map(mun_names).fillna(agg['codigo'])
 
+def generate_top_municipios(plano, mun_names, n=20):
+    """Top municípios por movimentação."""
+    agg = agregar_municipios(plano, mun_names)
     return agg.nlargest(n, 'admissoes').to_dict(orient='records')
 
 
-def generate_granular_cube(df):
-    """
-    Gera cubo granular para filtros regionais interativos.
-    Cada registro representa um (município × período × cadeia).
-    Permite filtrar por região e reagregar qualquer dimensão no frontend.
-    """
-    print("  Gerando cubo granular...")
-
-    # Agregar por município × período × cadeia
-    cube = df.groupby(['municipio_codigo', 'periodo', 'cadeia_produtiva']).agg({
-        'is_admissao': 'sum',
-        'is_demissao': 'sum',
-        'salario': 'mean',
-    }).reset_index()
+def _cubo_celulas(base, chave, nome):
+    """Formata um agregado (chave × período × cadeia) no schema do cubo granular."""
+    cube = base.assign(salario_medio=salario_medio(base))
 
-    cube.columns = ['mun', 'periodo', 'cadeia', 'admissoes', 'demissoes', 'salario_medio']
+    cube = cube[[chave, 'periodo', 'cadeia_produtiva', 'admissoes', 'demissoes', 'salario_medio']]
+    cube.columns = [nome, 'periodo', 'cadeia', 'admissoes', 'demissoes', 'salario_medio']
     cube['saldo'] = cube['admissoes'] - cube['demissoes']
 
     # Converter para int onde possível (reduz tamanho do JSON)
@@ -437,16 +545,104 @@ def generate_granular_cube(df):
     cube['demissoes'] = cube['demissoes'].astype(int)
     cube['saldo'] = cube['saldo'].astype(int)
     cube['salario_medio'] = cube['salario_medio'].round(2)
+    return com_medidas_salario(cube, base)
+
+
+def generate_granular_cube(plano):
+    """
+    Gera cubo granular para filtros regionais interativos.
+    Cada registro representa um (município × período × cadeia).
+    Permite filtrar por região e reagregar qualquer dimensão no frontend.
+    """
+    print("  Gerando cubo granular...")
+
+    # Agregado base município × período × cadeia
+    cube = _cubo_celulas(plano.base('cubo'), 'municipio_codigo', 'mun')
 
     print(f"    Registros no cubo: {len(cube):,}")
     print(f"    Municípios: {cube['mun'].nunique()}")
     print(f"    Períodos: {cube['periodo'].nunique()}")
     print(f"    Cadeias: {cube['cadeia'].nunique()}")
 
-    return cube.to_dict(orient='records')
+    return cube
 
 
-def generate_granular_dimensions(df):
+def generate_granular_regions(plano, regioes):
+    """
+    Cubos pré-agregados por mesorregião, regional IDR e estado, no mesmo
+    schema do cubo municipal (coluna 'regiao' no lugar de 'mun'): um filtro
+    regional vira a leitura de poucas linhas em vez de varrer o cubo.
+    """
+    print("  Gerando cubos regionais...")
+
+    cubos = {}
+    for nivel, mapa in regioes.items():
+        base = consolidar_por_mapa(plano.base('cubo'), 'municipio_codigo', mapa, 'regiao',
+                                   ['periodo', 'cadeia_produtiva'])
+        cubos[nivel] = _cubo_celulas(base, 'regiao', 'regiao')
+        print(f"    {nivel}: {cubos[nivel]['regiao'].nunique()} regiões, {len(cubos[nivel]):,} registros")
+
+    return cubos
+
+
+def com_medidas_salario(cube, base):
+    """
+    Anexa as medidas salariais somáveis (soma, contagem, soma dos quadrados)
+    para que qualquer reagregação obtenha média e desvio exatos.
+    """
+    cube = cube.copy()
+    cube['salario_soma'] = base['salario_soma'].round(2).to_numpy()
+    cube['salario_n'] = base['salario_n'].astype(int).to_numpy()
+    cube['salario_somaq'] = base['salario_somaq'].round(2).to_numpy()
+    return cube
+
+
+def _cubo_dimensao(plano, familia, coluna, nome, com_salario=False):
+    """Cubo município × período × cadeia × dimensão a partir do agregado base."""
+    cube = plano.base(familia)
+    colunas = CUBO + [coluna, 'admissoes', 'demissoes']
+    nomes = ['mun', 'periodo', 'cadeia', nome, 'admissoes', 'demissoes']
+    if com_salario:
+        cube = cube.assign(salario_medio=salario_medio(cube).round(2))
+        colunas.append('salario_medio')
+        nomes.append('salario_medio')
+
+    cube = cube[colunas]
+    cube.columns = nomes
+    cube['admissoes'] = cube['admissoes'].astype(int)
+    cube['demissoes'] = cube['demissoes'].astype(int)
+    if com_salario:
+        cube = com_medidas_salario(cube, plano.base(familia))
+    return cube
+
+
+def generate_granular_sketch(plano):
+    """
+    Esboço de quantis do salário por (município × período × cadeia): contagem
+    por bin logarítmico. Somando as contagens de qualquer conjunto de células
+    obtém-se mediana e percentis aproximados (erro relativo <= SKETCH_ALFA).
+    """
+    sk = plano.sketch()
+    sk = sk[['municipio_codigo', 'periodo', 'cadeia_produtiva', 'bin', 'n']]
+    sk.columns = ['mun', 'periodo', 'cadeia', 'bin', 'n']
+    print(f"    Esboço salarial: {len(sk):,} registros")
+    return sk
+
+
+def generate_granular_histogram(plano):
+    """
+    Histograma salarial por (município × período × cadeia): somando os bins
+    de qualquer conjunto de células o frontend desenha a distribuição do
+    recorte filtrado e estima percentis.
+    """
+    hist = plano.histograma()
+    hist = hist[['municipio_codigo', 'periodo', 'cadeia_produtiva', 'bin', 'n']]
+    hist.columns = ['mun', 'periodo', 'cadeia', 'bin', 'n']
+    print(f"    Histograma salarial: {len(hist):,} registros")
+    return hist
+
+
+def generate_granular_dimensions(plano):
     """
     Gera dados granulares por dimensão demográfica (município × período × cadeia × dimensão).
     Inclui cadeia para permitir filtros cruzados entre cadeia e dimensões demográficas.
@@ -456,112 +652,166 @@ def generate_granular_dimensions(df):
     dimensions = {}
 
     # Por Sexo (inclui cadeia para cross-filtering)
-    sexo_cube = df.groupby(['municipio_codigo', 'periodo', 'cadeia_produtiva', 'sexo_nome']).agg({
-        'is_admissao': 'sum',
-        'is_demissao': 'sum',
-    }).reset_index()
-    sexo_cube.columns = ['mun', 'periodo', 'cadeia', 'sexo', 'admissoes', 'demissoes']
-    sexo_cube['admissoes'] = sexo_cube['admissoes'].astype(int)
-    sexo_cube['demissoes'] = sexo_cube['demissoes'].astype(int)
-    dimensions['bySexo'] = sexo_cube.to_dict(orient='records')
+    sexo_cube = _cubo_dimensao(plano, 'sexo', 'sexo_nome', 'sexo')
+    dimensions['bySexo'] = sexo_cube
     print(f"    Sexo: {len(sexo_cube):,} registros")
 
     # Por Faixa Etária (inclui cadeia)
-    faixa_cube = df.groupby(['municipio_codigo', 'periodo', 'cadeia_produtiva', 'faixa_etaria']).agg({
-        'is_admissao': 'sum',
-        'is_demissao': 'sum',
-    }).reset_index()
-    faixa_cube.columns = ['mun', 'periodo', 'cadeia', 'faixa', 'admissoes', 'demissoes']
-    faixa_cube['admissoes'] = faixa_cube['admissoes'].astype(int)
-    faixa_cube['demissoes'] = faixa_cube['demissoes'].astype(int)
-    dimensions['byFaixa'] = faixa_cube.to_dict(orient='records')
+    faixa_cube = _cubo_dimensao(plano, 'faixa', 'faixa_etaria', 'faixa')
+    dimensions['byFaixa'] = faixa_cube
     print(f"    Faixa Etária: {len(faixa_cube):,} registros")
 
     # Por Escolaridade (inclui cadeia)
-    esc_cube = df.groupby(['municipio_codigo', 'periodo', 'cadeia_produtiva', 'escolaridade_nome']).agg({
-        'is_admissao': 'sum',
-        'is_demissao': 'sum',
-        'salario': 'mean',
-    }).reset_index()
-    esc_cube.columns = ['mun', 'periodo', 'cadeia', 'escolaridade', 'admissoes', 'demissoes', 'salario_medio']
-    esc_cube['admissoes'] = esc_cube['admissoes'].astype(int)
-    esc_cube['demissoes'] = esc_cube['demissoes'].astype(int)
-    esc_cube['salario_medio'] = esc_cube['salario_medio'].round(2)
-    dimensions['byEscolaridade'] = esc_cube.to_dict(orient='records')
+    esc_cube = _cubo_dimensao(plano, 'escolaridade', 'escolaridade_nome', 'escolaridade', com_salario=True)
+    dimensions['byEscolaridade'] = esc_cube
     print(f"    Escolaridade: {len(esc_cube):,} registros")
 
     # Por Porte Empresa (inclui cadeia)
-    porte_cube = df.groupby(['municipio_codigo', 'periodo', 'cadeia_produtiva', 'porte_empresa_nome']).agg({
-        'is_admissao': 'sum',
-        'is_demissao': 'sum',
-    }).reset_index()
-    porte_cube.columns = ['mun', 'periodo', 'cadeia', 'porte', 'admissoes', 'demissoes']
-    porte_cube['admissoes'] = porte_cube['admissoes'].astype(int)
-    porte_cube['demissoes'] = porte_cube['demissoes'].astype(int)
-    dimensions['byPorte'] = porte_cube.to_dict(orient='records')
+    porte_cube = _cubo_dimensao(plano, 'porte', 'porte_empresa_nome', 'porte')
+    dimensions['byPorte'] = porte_cube
     print(f"    Porte: {len(porte_cube):,} registros")
 
     return dimensions
 
 
-def main():
-    """Processa e gera todos os JSONs."""
+def calcular_periodos(periodos=None, backend='pandas', memoria_mb=None):
+    """
+    Estado agregado dos meses `periodos` (None = todos) pelo backend escolhido.
+    memoria_mb: orçamento de memória (pandas lê em lotes; DuckDB usa como limite).
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"backend inválido: {backend} (opções: {', '.join(BACKENDS)})")
+    if backend == 'duckdb':
+        con = estado_sql.conectar(memoria=f'{memoria_mb}MB' if memoria_mb else None)
+        return medir(estado_sql.calcular_estado_sql, microdata_path(), periodos, con=con)
+    if memoria_mb:
+        return medir(calcular_em_lotes, periodos, memoria_mb)
+
+    df = medir(load_microdata, periodos)
+    with etapa('calcular_estado', linhas_entrada=len(df)):
+        return calcular_estado(df)
+
+
+def reclassificar_periodos(periodos, estado, mapeamento_anterior):
+    """
+    Estado dos meses `periodos` com o mapeamento CNAE -> cadeia atual, a partir
+    do estado calculado com `mapeamento_anterior`: só as cadeias que ganharam
+    ou perderam subclasses voltam a ser agregadas.
+    """
+    df = ler_microdados(microdata_path(), periodos=periodos)
+    cadeia_anterior = derivar_cadeia(
+        df['cnae_subclasse'], fallback=df['cadeia_produtiva'], mapeamento=mapeamento_anterior
+    )
+    return reclassificar_estado(estado, preparar_microdados(df), cadeia_anterior)
+
+
+def load_estado(incremental=True, estado_dir=None, backend='pandas', memoria_mb=None):
+    """
+    Estado agregado de todos os meses (ver agregacao.calcular_estado).
+    incremental: reaproveita o estado persistido e processa só os meses novos
+    ou alterados; False recalcula tudo a partir dos microdados completos.
+    """
+    calcular = partial(calcular_periodos, backend=backend, memoria_mb=memoria_mb)
+    manifesto_micro = carregar_manifesto_micro(microdata_path())
+    if not incremental or not manifesto_micro:
+        # Store legado (sem manifesto) ou recálculo completo
+        estado = calcular()
+        print(f"Registros: {int(estado['cubo']['registros'].sum()):,}")
+        return estado
+
+    print(f"Registros: {sum(e.get('linhas', 0) for e in manifesto_micro.values()):,}")
+    return estado_agregado.atualizar_estado(
+        manifesto_micro, calcular, base=estado_dir or subdiretorio(ESTADO_DIR, RECORTE),
+        reclassificar=reclassificar_periodos,
+    )
+
+
+def main(formato_cubo='colunar', arrow=False, incremental=True, saida=None, estado_dir=None,
+         backend='pandas', memoria_mb=None, recorte=None, workers=1, legivel=False):
+    """
+    Processa e gera todos os JSONs.
+    formato_cubo: 'colunar' (dimensões como índices em dicionários) ou
+    'linhas' (lista de objetos); arrow=True grava também os cubos em Arrow IPC.
+    incremental: só os meses novos ou alterados voltam aos microdados.
+    backend: 'pandas' ou 'duckdb' (SQL sobre o store Parquet).
+    memoria_mb: orçamento de memória da agregação (None = microdados inteiros em memória).
+    recorte: (UF, seção CNAE) a processar (None = recorte atual, padrão PR/A);
+    fora do padrão, estado e saídas ficam em subdiretórios do recorte.
+    workers: processos que geram e serializam as saídas (ver gerar_saidas).
+    legivel: JSONs das saídas indentados (depuração); por padrão, compactos.
+    """
+    if formato_cubo not in FORMATOS_CUBO:
+        raise ValueError(f"formato_cubo inválido: {formato_cubo} (opções: {', '.join(FORMATOS_CUBO)})")
+    if recorte is not None:
+        definir_recorte(*recorte)
 
     print("=" * 70)
-    print("PROCESSAMENTO DE DADOS GRANULARES")
+    print("PROCESSAMENTO DE DADOS GRANULARES" + (f" - {RECORTE[0]}/{RECORTE[1]}" if RECORTE != RECORTE_PADRAO else ""))
     print("=" * 70)
 
-    os.makedirs(DASHBOARD_DIR, exist_ok=True)
-
-    print("\nCarregando microdados...")
-    df = load_microdata()
-    print(f"Registros: {len(df):,}")
-
-    print("\nCarregando nomes de municípios...")
-    mun_names = load_municipio_names()
-    print(f"Mapeamento de {len(mun_names)} municípios carregado")
-
-    print("\nCarregando descrições de CNAE...")
-    cnae_desc = load_cnae_descricoes()
-    print(f"Mapeamento de {len(cnae_desc)} CNAEs carregado")
-
-    print("\nGerando agregações...")
-
-    outputs = {
-        'metadata.json': generate_metadata(df),
-        'kpis.json': generate_kpis(df),
-        'timeseries.json': generate_timeseries(df),
-        'by_cadeia.json': generate_by_cadeia(df),
-        'timeseries_cadeia.json': generate_timeseries_cadeia(df),
-        'by_cnae.json': generate_by_cnae(df, cnae_desc),
-        'by_municipio.json': generate_by_municipio(df, mun_names),
-        'by_sexo.json': generate_by_sexo(df),
-        'by_faixa_etaria.json': generate_by_faixa_etaria(df),
-        'by_escolaridade.json': generate_by_escolaridade(df),
-        'by_porte.json': generate_by_porte(df),
-        'seasonality.json': generate_seasonality(df),
-        'yearly.json': generate_yearly(df),
-        'cross_cadeia_sexo.json': generate_cross_cadeia_sexo(df),
-        'cross_cadeia_idade.json': generate_cross_cadeia_idade(df),
-        'cross_cadeia_escolaridade.json': generate_cross_cadeia_escolaridade(df),
-        'salary_distribution.json': generate_salary_distribution(df),
-        'top_municipios.json': generate_top_municipios(df, mun_names),
-    }
+    print("\nCarregando estado agregado" + (" (incremental)..." if incremental else " (completo)..."))
+    with etapa('load_estado', backend=backend, incremental=incremental) as medida:
+        estado = load_estado(incremental, estado_dir, backend, memoria_mb)
+        # Entrada: registros dos microdados; saída: células do cubo
+        medida.linhas_entrada = int(estado['cubo']['registros'].sum())
+        medida.linhas_saida = len(estado['cubo'])
+
+    # Agregados base calculados uma vez; as saídas são reagrupamentos deles
+    plano = PlanoAgregacao(estado)
+    return gerar_saidas(plano, saida or subdiretorio(DASHBOARD_DIR, RECORTE), formato_cubo, arrow, workers, legivel)
 
-    # Gerar cubo granular para filtros regionais
-    print("\nGerando dados granulares para filtros regionais...")
-    granular_cube = generate_granular_cube(df)
-    granular_dimensions = generate_granular_dimensions(df)
 
-    # Salvar arquivos
-    for filename, data in outputs.items():
-        filepath = os.path.join(DASHBOARD_DIR, filename)
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(safe_json(data), f, ensure_ascii=False, indent=2)
-        print(f"  {filename}")
+def _processar_recorte(recorte, opcoes, instrumentar):
+    """Worker de processar_recortes: um recorte por processo, com relatório próprio."""
+    if instrumentar:
+        instrumentacao.iniciar(f'prepare_{nome_recorte(recorte)}', **instrumentar)
+    try:
+        main(recorte=recorte, **opcoes)
+    finally:
+        instrumentacao.finalizar()
+    return recorte
 
-    # Criar agregado
-    aggregated = {
+
+def processar_recortes(recortes, processos=1, **opcoes):
+    """
+    Gera as saídas de vários recortes (UF, seção), cada um na sua árvore.
+    Com processos > 1, os recortes rodam em paralelo em processos separados
+    (cada um com o próprio relatório de etapas); `opcoes` são as de main.
+    """
+    recortes = [validar_recorte(uf, secao) for uf, secao in recortes]
+    if len(recortes) == 1:
+        main(recorte=recortes[0], **opcoes)
+        return recortes
+    if processos <= 1:
+        for recorte in recortes:
+            with etapa('recorte', recorte=nome_recorte(recorte)):
+                main(recorte=recorte, **opcoes)
+        return recortes
+
+    execucao = instrumentacao.execucao_atual()
+    instrumentar = execucao and {'perfilar': execucao.perfilar, 'perfilador': execucao.perfilador,
+                                 'relatorios_dir': execucao.relatorios_dir}
+    with etapa('recortes_paralelo', processos=processos):
+        with ProcessPoolExecutor(max_workers=min(processos, len(recortes))) as executor:
+            futuros = [executor.submit(_processar_recorte, r, opcoes, instrumentar) for r in recortes]
+            return [futuro.result() for futuro in futuros]
+
+
+def formatar_cubo(cube, formato_cubo):
+    """Cubo no layout escolhido: colunar (dimensões dicionarizadas) ou lista de objetos."""
+    return colunar(cube) if formato_cubo == 'colunar' else cube
+
+
+def formatar_histograma(histograma, formato_cubo):
+    """Histograma por célula: esparso (bins só onde há registros) no layout colunar."""
+    if formato_cubo == 'colunar':
+        return esparso(histograma, chaves=['mun', 'periodo', 'cadeia'])
+    return histograma
+
+
+def montar_agregado(outputs):
+    """aggregated_full.json: todas as saídas do dashboard em um único documento."""
+    return {
         'metadata': outputs['metadata.json'],
         'kpis': outputs['kpis.json'],
         'timeseries': outputs['timeseries.json'],
@@ -579,34 +829,221 @@ def main():
         'crossCadeiaIdade': outputs['cross_cadeia_idade.json'],
         'crossCadeiaEscolaridade': outputs['cross_cadeia_escolaridade.json'],
         'salaryDistribution': outputs['salary_distribution.json'],
+        'salaryHistogram': {
+            'gamma': HISTOGRAMA_GAMMA,
+            'registros': outputs['salary_histogram.json'],
+        },
         'topMunicipios': outputs['top_municipios.json'],
     }
 
-    agg_path = os.path.join(DASHBOARD_DIR, 'aggregated_full.json')
-    with open(agg_path, 'w', encoding='utf-8') as f:
-        json.dump(safe_json(aggregated), f, ensure_ascii=False)
-    print(f"  aggregated_full.json")
-
-    # Salvar cubo granular (para filtros regionais)
-    cube_path = os.path.join(DASHBOARD_DIR, 'granular_cube.json')
-    with open(cube_path, 'w', encoding='utf-8') as f:
-        json.dump(safe_json(granular_cube), f, ensure_ascii=False)
-    cube_size_mb = os.path.getsize(cube_path) / (1024 * 1024)
-    print(f"  granular_cube.json ({cube_size_mb:.2f} MB)")
-
-    # Salvar dimensões granulares
-    dims_path = os.path.join(DASHBOARD_DIR, 'granular_dimensions.json')
-    with open(dims_path, 'w', encoding='utf-8') as f:
-        json.dump(safe_json(granular_dimensions), f, ensure_ascii=False)
-    dims_size_mb = os.path.getsize(dims_path) / (1024 * 1024)
-    print(f"  granular_dimensions.json ({dims_size_mb:.2f} MB)")
+
+# Serialização das saídas (tarefas do grafo de gerar_saidas): bytes e hash do conteúdo
+
+def serializar_agregado(**outputs):
+    """aggregated_full.json a partir das saídas {arquivo: resultado}."""
+    return serializar_saida(montar_agregado(outputs))
+
+
+def serializar_cubo(cube, formato_cubo):
+    """granular_cube.json."""
+    return serializar_saida(formatar_cubo(cube, formato_cubo))
+
+
+def serializar_cubos(cubos, formato_cubo):
+    """Vários cubos em um documento (dimensões, regiões)."""
+    return serializar_saida({nome: formatar_cubo(cube, formato_cubo) for nome, cube in cubos.items()})
+
+
+def serializar_sketch(sketch, formato_cubo):
+    """Esboço salarial (medianas e percentis de qualquer recorte)."""
+    return serializar_saida({
+        'alfa': SKETCH_ALFA,
+        'gamma': SKETCH_GAMMA,
+        'registros': formatar_cubo(sketch, formato_cubo),
+    })
+
+
+def serializar_histograma(histograma, formato_cubo):
+    """Histograma salarial por célula."""
+    return serializar_saida({
+        'gamma': HISTOGRAMA_GAMMA,
+        'registros': formatar_histograma(histograma, formato_cubo),
+    })
+
+
+def gerar_granular(plano, filename, regioes):
+    """
+    Cubo granular `filename` (ver SAIDAS_GRANULARES), memorizado no plano: o
+    JSON e os shards gerados no mesmo processo partem de uma só geração.
+    """
+    funcao, _, *nomes = SAIDAS_GRANULARES[filename]
+    entradas = {'regioes': regioes}
+    chave = ('granular', filename, *(json.dumps(entradas[nome], sort_keys=True) for nome in nomes))
+    return plano.memorizar(chave, funcao, plano, *(entradas[nome] for nome in nomes))
+
+
+def serializar_granular(plano, filename, regioes, formato_cubo):
+    """
+    JSON de um cubo granular, gerado e serializado na mesma tarefa (só os
+    bytes saem do worker). Retorna (bytes, hash do conteúdo, registros).
+    """
+    tabela = gerar_granular(plano, filename, regioes)
+    serializar = SAIDAS_GRANULARES[filename][1]
+    return (*serializar(tabela, formato_cubo), len(tabela))
+
+
+def serializar_shards_nivel(plano, regioes, nivel, formato_cubo):
+    """Shards de um nível (cadeia, meso, regIdr): cubo, dimensões e esboços de cada chave."""
+    tabelas = {
+        'cubo': gerar_granular(plano, 'granular_cube.json', regioes),
+        'sketch': gerar_granular(plano, 'granular_salario_sketch.json', regioes),
+        'histograma': gerar_granular(plano, 'granular_salario_histograma.json', regioes),
+        **gerar_granular(plano, 'granular_dimensions.json', regioes),
+    }
+    por_chave = particionar(tabelas, regioes, niveis=(nivel,))[nivel]
+    return serializar_shards(por_chave, nivel, partial(formatar_cubo, formato_cubo=formato_cubo),
+                             formatos={'histograma': partial(formatar_histograma, formato_cubo=formato_cubo)})
+
+
+# Saídas do dashboard: arquivo -> (generate_*, entradas além do plano)
+SAIDAS = {
+    'metadata.json': (generate_metadata,),
+    'kpis.json': (generate_kpis,),
+    'timeseries.json': (generate_timeseries,),
+    'by_cadeia.json': (generate_by_cadeia,),
+    'timeseries_cadeia.json': (generate_timeseries_cadeia,),
+    'by_cnae.json': (generate_by_cnae, 'cnae_desc'),
+    'by_municipio.json': (generate_by_municipio, 'mun_names'),
+    'by_sexo.json': (generate_by_sexo,),
+    'by_faixa_etaria.json': (generate_by_faixa_etaria,),
+    'by_escolaridade.json': (generate_by_escolaridade,),
+    'by_porte.json': (generate_by_porte,),
+    'seasonality.json': (generate_seasonality,),
+    'yearly.json': (generate_yearly,),
+    'cross_cadeia_sexo.json': (generate_cross_cadeia_sexo,),
+    'cross_cadeia_idade.json': (generate_cross_cadeia_idade,),
+    'cross_cadeia_escolaridade.json': (generate_cross_cadeia_escolaridade,),
+    'salary_distribution.json': (generate_salary_distribution,),
+    'salary_histogram.json': (generate_salary_histogram,),
+    'top_municipios.json': (generate_top_municipios, 'mun_names'),
+}
+
+# Cubos granulares: arquivo -> (generate_*, serialização, entradas além do plano)
+SAIDAS_GRANULARES = {
+    'granular_cube.json': (generate_granular_cube, serializar_cubo),
+    'granular_dimensions.json': (generate_granular_dimensions, serializar_cubos),
+    'granular_regioes.json': (generate_granular_regions, serializar_cubos, 'regioes'),
+    'granular_salario_sketch.json': (generate_granular_sketch, serializar_sketch),
+    'granular_salario_histograma.json': (generate_granular_histogram, serializar_histograma),
+}
+
+
+def gerar_saidas(plano, saida, formato_cubo='colunar', arrow=False, workers=1, legivel=False):
+    """
+    Gera e grava em `saida` todas as saídas do dashboard a partir do plano.
+    Geração e serialização formam um grafo de tarefas independentes
+    (ver tarefas.py); com workers > 1 rodam em um pool de processos que
+    herda o plano sem copiá-lo. Os cubos granulares são serializados na
+    tarefa que os gera: do worker só voltam registros pequenos e bytes.
+    A gravação fica no processo principal, na mesma ordem: as saídas são
+    idênticas às do modo serial.
+    legivel=True indenta os JSONs de cada saída (compactos por padrão).
+    """
+    os.makedirs(saida, exist_ok=True)
+
+    with etapa('carregar_nomes'):
+        print("\nCarregando nomes de municípios...")
+        municipios = load_municipios_geo()
+        mun_names = load_municipio_names(municipios)
+        regioes = load_municipio_regioes(municipios)
+        print(f"Mapeamento de {len(mun_names)} municípios carregado")
+
+        print("\nCarregando descrições de CNAE...")
+        cnae_desc = load_cnae_descricoes()
+        print(f"Mapeamento de {len(cnae_desc)} CNAEs carregado")
+
+    print("\nGerando agregações" + (f" ({workers} processos)..." if workers > 1 else "..."))
+    grafo = GrafoTarefas()
+    compartilhado = Compartilhado('plano')
+
+    entradas = {'cnae_desc': cnae_desc, 'mun_names': mun_names, 'regioes': regioes}
+    gerados = {
+        filename: grafo.adicionar(filename, funcao, compartilhado, *(entradas[nome] for nome in nomes))
+        for filename, (funcao, *nomes) in SAIDAS.items()
+    }
+
+    # JSON de cada saída, na ordem de gravação
+    for filename, resultado in gerados.items():
+        grafo.adicionar(f'json:{filename}', serializar_saida, resultado, indent=2 if legivel else None)
+    grafo.adicionar('json:aggregated_full.json', serializar_agregado, **gerados)
+
+    # Cubos granulares para filtros regionais: gerados e serializados na
+    # mesma tarefa, sem trafegar as tabelas entre processos
+    for filename in SAIDAS_GRANULARES:
+        grafo.adicionar(f'json:{filename}', serializar_granular, compartilhado, filename, regioes, formato_cubo)
+
+    # Shards por cadeia e por região: cubo, dimensões e esboço de cada recorte
+    for nivel in NIVEIS_SHARD:
+        grafo.adicionar(f'shards:{nivel}', serializar_shards_nivel, compartilhado, regioes, nivel, formato_cubo)
+
+    resultados = grafo.executar(workers, plano=plano)
+    outputs = {filename: resultados[filename] for filename in gerados}
+    registros_cubo = resultados['json:granular_cube.json'][2]
+
+    # Mapeamento CNAE -> cadeia das saídas atuais (hash no manifest.json)
+    mapeamento = estado_agregado.hash_mapeamento()
+    mapeamento_saidas = ler_manifesto(saida).get('mapeamento')
+    if mapeamento_saidas and mapeamento_saidas != mapeamento:
+        print(f"\nMapeamento CNAE -> cadeia alterado desde a última geração "
+              f"({mapeamento_saidas} -> {mapeamento}): cadeias reclassificadas")
+
+    # Salvar arquivos: só os que mudaram são regravados (hash no manifest.json)
+    escritor = EscritorSaidas(saida, carregar_manifesto(saida))
+
+    def salvar(filename, dados, conteudo, detalhe=None):
+        with etapa('gravar_json', arquivo=filename) as medida:
+            info = escritor.escrever(filename, dados, conteudo)
+            medida.registrar(bytes=info['bytes'], gravado=filename in escritor.gravados)
+        size_mb = info['bytes'] / (1024 * 1024)
+        estado = '' if filename in escritor.gravados else ' [inalterado]'
+        print(f"  {filename}" + (f" ({size_mb:.2f} MB, {detalhe})" if detalhe else "") + estado)
+        return size_mb
+
+    for nome, resultado in resultados.items():
+        if nome.startswith('json:'):
+            filename = nome[len('json:'):]
+            detalhe = formato_cubo if filename.startswith('granular_') else None
+            salvar(filename, *resultado[:2], detalhe=detalhe)
+    cube_size_mb = escritor.arquivos['granular_cube.json']['bytes'] / (1024 * 1024)
+
+    with etapa('gravar_shards') as medida:
+        shards = gravar_shards(escritor, {nivel: resultados[f'shards:{nivel}'] for nivel in NIVEIS_SHARD})
+        medida.registrar(arquivos=sum(len(por_chave) for por_chave in shards.values()))
+    for nivel, por_chave in shards.items():
+        total_mb = sum(e['bytes'] for e in por_chave.values()) / (1024 * 1024)
+        print(f"  {SHARDS_DIR}/{nivel}/: {len(por_chave)} shards ({total_mb:.2f} MB)")
+
+    # Cópia binária opcional (Arrow IPC, dimensões como dicionário)
+    if arrow:
+        granular_dimensions = gerar_granular(plano, 'granular_dimensions.json', regioes)
+        for filename, cube in [('granular_cube.arrow', gerar_granular(plano, 'granular_cube.json', regioes))] + [
+            (f'granular_dimensions_{nome}.arrow', cube) for nome, cube in granular_dimensions.items()
+        ]:
+            with etapa('gravar_arrow', arquivo=filename):
+                info = escritor.arrow(filename, cube)
+            print(f"  {filename} ({info['bytes'] / (1024 * 1024):.2f} MB)")
+
+    escrever_manifesto(escritor, shards, formato=formato_cubo, gamma=SKETCH_GAMMA,
+                       gamma_histograma=HISTOGRAMA_GAMMA, mapeamento=mapeamento)
+    print(f"  {MANIFESTO_SAIDAS}")
+    print(f"  Gravados: {len(escritor.gravados)} | inalterados: {len(escritor.inalterados)}")
 
     print("\n" + "=" * 70)
     print("RESUMO")
     print("=" * 70)
-    print(f"\nArquivos gerados: {len(outputs) + 3}")  # +3: aggregated_full, granular_cube, granular_dimensions
-    print(f"Diretório: {DASHBOARD_DIR}")
-    print(f"Cubo granular: {len(granular_cube):,} registros ({cube_size_mb:.2f} MB)")
+    print(f"\nArquivos gerados: {len(escritor.arquivos)} (regravados: {len(escritor.gravados)})")
+    print(f"Diretório: {saida}")
+    print(f"Cubo granular: {registros_cubo:,} registros ({cube_size_mb:.2f} MB)")
 
     kpis = outputs['kpis.json']
     print(f"\nKPIs:")
@@ -619,5 +1056,126 @@ def main():
     return outputs
 
 
+def arquivos_divergentes(raiz, outra):
+    """Arquivos de `raiz` ausentes em `outra` ou com conteúdo diferente (caminhos relativos)."""
+    divergentes = []
+    for dirpath, _, filenames in os.walk(raiz):
+        for filename in filenames:
+            arquivo = os.path.relpath(os.path.join(dirpath, filename), raiz)
+            outro = os.path.join(outra, arquivo)
+            with open(os.path.join(raiz, arquivo), 'rb') as f:
+                dados = f.read()
+            if not os.path.exists(outro) or open(outro, 'rb').read() != dados:
+                divergentes.append(arquivo)
+    return divergentes
+
+
+def verificar_incremental(formato_cubo='colunar', arrow=False, backend='pandas'):
+    """
+    Confere que o caminho incremental gera as mesmas saídas que o completo:
+    monta o estado em duas etapas (todos os meses menos o último, depois
+    todos) e compara byte a byte com as saídas do estado calculado de uma vez.
+    Retorna a lista de arquivos divergentes.
+    """
+    manifesto_micro = carregar_manifesto_micro(microdata_path())
+    periodos = sorted(p for p, e in manifesto_micro.items() if e.get('linhas', 0) > 0)
+    if len(periodos) < 2:
+        raise ValueError("verificação incremental requer ao menos dois meses no store")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        estado_dir = os.path.join(tmp, 'estado')
+        anteriores = {p: e for p, e in manifesto_micro.items() if p != periodos[-1]}
+        calcular = partial(calcular_periodos, backend=backend)
+        estado_agregado.atualizar_estado(anteriores, calcular, base=estado_dir)
+
+        saidas = {
+            'incremental': estado_agregado.atualizar_estado(manifesto_micro, calcular, base=estado_dir),
+            'completo': calcular_periodos(backend=backend),
+        }
+        for nome, estado in saidas.items():
+            gerar_saidas(PlanoAgregacao(estado), os.path.join(tmp, nome), formato_cubo, arrow)
+
+        divergentes = arquivos_divergentes(os.path.join(tmp, 'completo'), os.path.join(tmp, 'incremental'))
+
+    print("\n" + "=" * 70)
+    if divergentes:
+        print(f"INCREMENTAL DIVERGE DO COMPLETO: {', '.join(sorted(divergentes))}")
+    else:
+        print(f"Incremental e completo idênticos ({periodos[0]} a {periodos[-1]})")
+    return divergentes
+
+
+def verificar_backend():
+    """
+    Confere que os backends pandas e DuckDB produzem o mesmo estado agregado
+    (contagens exatas, somas com tolerância de arredondamento).
+    Retorna a lista de diferenças.
+    """
+    esperado = calcular_periodos(backend='pandas')
+    diferencas = estado_sql.comparar_estados(esperado, calcular_periodos(backend='duckdb'))
+
+    print("\n" + "=" * 70)
+    if diferencas:
+        print("BACKENDS DIVERGEM:")
+        for diferenca in diferencas:
+            print(f"  {diferenca}")
+    else:
+        print(f"Backends pandas e duckdb idênticos ({len(esperado)} tabelas do estado)")
+    return diferencas
+
+
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description='Gera os JSONs do dashboard a partir dos microdados')
+    parser.add_argument('--formato-cubo', choices=FORMATOS_CUBO, default='colunar',
+                        help='layout de granular_cube/granular_dimensions (colunar = dimensões dicionarizadas)')
+    parser.add_argument('--arrow', action='store_true',
+                        help='gravar também os cubos granulares em Arrow IPC (.arrow)')
+    parser.add_argument('--completo', action='store_true',
+                        help='recalcular todos os meses a partir dos microdados (ignora o estado persistido)')
+    parser.add_argument('--verificar-incremental', action='store_true',
+                        help='conferir que as saídas incrementais e completas são idênticas (não grava o dashboard)')
+    parser.add_argument('--backend', choices=BACKENDS, default='pandas',
+                        help='motor das agregações (duckdb = SQL sobre o Parquet, requer pip install duckdb)')
+    parser.add_argument('--memoria-mb', type=int, default=None,
+                        help='orçamento de memória em MB: lê o Parquet em lotes (pandas) ou limita o DuckDB')
+    parser.add_argument('--verificar-backend', action='store_true',
+                        help='conferir que os backends pandas e duckdb geram o mesmo estado (não grava o dashboard)')
+    parser.add_argument('--ufs', nargs='+', default=[RECORTE_PADRAO[0]], metavar='UF',
+                        help='UFs processadas (padrão: %(default)s); fora do PR/A, saídas em dashboard/public/data/<seção>_<uf>')
+    parser.add_argument('--secoes', nargs='+', default=[RECORTE_PADRAO[1]], metavar='SECAO',
+                        help='seções CNAE (letras) processadas para cada UF (padrão: %(default)s)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='processos que geram e serializam as saídas em paralelo (1 = serial)')
+    parser.add_argument('--processos', type=int, default=1,
+                        help='recortes (UF/seção) processados em paralelo, um por processo')
+    parser.add_argument('--json-legivel', action='store_true',
+                        help='gravar os JSONs das saídas indentados, para depuração (padrão: compactos)')
+    parser.add_argument('--relatorio', default=None,
+                        help='arquivo JSON do relatório de etapas (padrão: data/processed/execucoes/prepare.json)')
+    parser.add_argument('--perfilar', metavar='ETAPA', default=None,
+                        help='perfilar a primeira ocorrência de uma etapa (ex.: calcular_estado, generate_by_cnae)')
+    parser.add_argument('--perfilador', choices=PERFILADORES, default='cprofile',
+                        help='perfilador da etapa (py-spy requer pip install py-spy)')
+    args = parser.parse_args()
+
+    try:
+        recortes = [validar_recorte(uf, secao) for uf in args.ufs for secao in args.secoes]
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.verificar_backend or args.verificar_incremental:
+        if len(recortes) > 1:
+            parser.error('as verificações processam um único recorte (uma UF e uma seção)')
+        definir_recorte(*recortes[0])
+    if args.verificar_backend:
+        raise SystemExit(1 if verificar_backend() else 0)
+    if args.verificar_incremental:
+        raise SystemExit(1 if verificar_incremental(args.formato_cubo, args.arrow, args.backend) else 0)
+
+    instrumentacao.iniciar('prepare', perfilar=args.perfilar, perfilador=args.perfilador)
+    try:
+        processar_recortes(recortes, args.processos, formato_cubo=args.formato_cubo, arrow=args.arrow,
+                           incremental=not args.completo, backend=args.backend, memoria_mb=args.memoria_mb,
+                           workers=args.workers, legivel=args.json_legivel)
+    finally:
+        instrumentacao.finalizar(args.relatorio)
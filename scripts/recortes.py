@@ -0,0 +1,143 @@
+"""
+Recortes dos microdados CAGED por UF e seção CNAE
+O CAGEDMOV é nacional: um recorte (UF, seção) seleciona as linhas de um
+estado em uma seção da CNAE 2.0 e tem seu próprio store particionado, estado
+agregado e árvore de saídas do dashboard. O recorte padrão (PR, seção A)
+mantém os caminhos originais.
+"""
+
+import os
+
+from particoes import RAW_DIR
+
+# Código IBGE das UFs (coluna 'uf' do CAGEDMOV)
+UFS = {
+    'RO': 11, 'AC': 12, 'AM': 13, 'RR': 14, 'PA': 15, 'AP': 16, 'TO': 17,
+    'MA': 21, 'PI': 22, 'CE': 23, 'RN': 24, 'PB': 25, 'PE': 26, 'AL': 27, 'SE': 28, 'BA': 29,
+    'MG': 31, 'ES': 32, 'RJ': 33, 'SP': 35,
+    'PR': 41, 'SC': 42, 'RS': 43,
+    'MS': 50, 'MT': 51, 'GO': 52, 'DF': 53,
+}
+
+# Seções da CNAE 2.0: letra -> (nome nos caminhos, primeira e última divisão)
+SECOES = {
+    'A': ('agro', 1, 3),
+    'B': ('extrativas', 5, 9),
+    'C': ('transformacao', 10, 33),
+    'D': ('energia', 35, 35),
+    'E': ('saneamento', 36, 39),
+    'F': ('construcao', 41, 43),
+    'G': ('comercio', 45, 47),
+    'H': ('transporte', 49, 53),
+    'I': ('alojamento', 55, 56),
+    'J': ('informacao', 58, 63),
+    'K': ('financeiro', 64, 66),
+    'L': ('imobiliario', 68, 68),
+    'M': ('profissionais', 69, 75),
+    'N': ('administrativos', 77, 82),
+    'O': ('administracao_publica', 84, 84),
+    'P': ('educacao', 85, 85),
+    'Q': ('saude', 86, 88),
+    'R': ('artes', 90, 93),
+    'S': ('outros_servicos', 94, 96),
+    'T': ('domesticos', 97, 97),
+    'U': ('organismos_internacionais', 99, 99),
+}
+
+# Nome e gentílico (masculino) de cada UF, para títulos das saídas
+NOMES_UF = {
+    'RO': ('Rondônia', 'rondoniense'), 'AC': ('Acre', 'acriano'), 'AM': ('Amazonas', 'amazonense'),
+    'RR': ('Roraima', 'roraimense'), 'PA': ('Pará', 'paraense'), 'AP': ('Amapá', 'amapaense'),
+    'TO': ('Tocantins', 'tocantinense'), 'MA': ('Maranhão', 'maranhense'), 'PI': ('Piauí', 'piauiense'),
+    'CE': ('Ceará', 'cearense'), 'RN': ('Rio Grande do Norte', 'potiguar'), 'PB': ('Paraíba', 'paraibano'),
+    'PE': ('Pernambuco', 'pernambucano'), 'AL': ('Alagoas', 'alagoano'), 'SE': ('Sergipe', 'sergipano'),
+    'BA': ('Bahia', 'baiano'), 'MG': ('Minas Gerais', 'mineiro'), 'ES': ('Espírito Santo', 'capixaba'),
+    'RJ': ('Rio de Janeiro', 'fluminense'), 'SP': ('São Paulo', 'paulista'), 'PR': ('Paraná', 'paranaense'),
+    'SC': ('Santa Catarina', 'catarinense'), 'RS': ('Rio Grande do Sul', 'gaúcho'),
+    'MS': ('Mato Grosso do Sul', 'sul-mato-grossense'), 'MT': ('Mato Grosso', 'mato-grossense'),
+    'GO': ('Goiás', 'goiano'), 'DF': ('Distrito Federal', 'brasiliense'),
+}
+
+# Descrição de cada seção: complemento do título, setor no subtítulo e se o
+# setor é feminino (concordância do gentílico)
+DESCRICOES_SECAO = {
+    'A': ('Agrícola', 'na agropecuária', True),
+    'B': ('na Indústria Extrativa', 'na indústria extrativa', True),
+    'C': ('na Indústria de Transformação', 'na indústria de transformação', True),
+    'D': ('em Eletricidade e Gás', 'no setor de eletricidade e gás', False),
+    'E': ('em Água, Esgoto e Resíduos', 'no setor de água, esgoto e resíduos', False),
+    'F': ('na Construção', 'na construção', True),
+    'G': ('no Comércio', 'no comércio', False),
+    'H': ('em Transporte e Armazenagem', 'no setor de transporte e armazenagem', False),
+    'I': ('em Alojamento e Alimentação', 'no setor de alojamento e alimentação', False),
+    'J': ('em Informação e Comunicação', 'no setor de informação e comunicação', False),
+    'K': ('no Setor Financeiro', 'no setor financeiro', False),
+    'L': ('no Setor Imobiliário', 'no setor imobiliário', False),
+    'M': ('em Atividades Profissionais', 'no setor de atividades profissionais, científicas e técnicas', False),
+    'N': ('em Atividades Administrativas', 'no setor de atividades administrativas', False),
+    'O': ('na Administração Pública', 'na administração pública', True),
+    'P': ('na Educação', 'na educação', True),
+    'Q': ('em Saúde e Serviços Sociais', 'no setor de saúde e serviços sociais', False),
+    'R': ('em Artes, Cultura e Esporte', 'no setor de artes, cultura, esporte e recreação', False),
+    'S': ('em Outros Serviços', 'no setor de outros serviços', False),
+    'T': ('em Serviços Domésticos', 'no setor de serviços domésticos', False),
+    'U': ('em Organismos Internacionais', 'no setor de organismos internacionais', False),
+}
+
+# Divisão CNAE (2 dígitos) -> seção
+SECAO_DIVISAO = {
+    str(divisao).zfill(2): secao
+    for secao, (_, inicio, fim) in SECOES.items()
+    for divisao in range(inicio, fim + 1)
+}
+
+RECORTE_PADRAO = ('PR', 'A')
+
+
+def validar_recorte(uf, secao):
+    """Normaliza (UF, seção) para (sigla, letra) em maiúsculas; ValueError se desconhecidos."""
+    uf, secao = uf.upper(), secao.upper()
+    if uf not in UFS:
+        raise ValueError(f"UF inválida: {uf} (opções: {', '.join(UFS)})")
+    if secao not in SECOES:
+        raise ValueError(f"seção CNAE inválida: {secao} (opções: {', '.join(SECOES)})")
+    return uf, secao
+
+
+def nome_recorte(recorte):
+    """Identificador do recorte nos caminhos (ex.: 'agro_pr')."""
+    uf, secao = recorte
+    return f'{SECOES[secao][0]}_{uf.lower()}'
+
+
+def store_path(recorte, raw_dir=RAW_DIR):
+    """Store particionado dos microdados de um recorte."""
+    return os.path.join(raw_dir, f'caged_{nome_recorte(recorte)}_microdados.parquet')
+
+
+def geo_recorte(recorte):
+    """GeoJSON dos municípios da UF do recorte (em dashboard/public/assets)."""
+    return f'mun_{recorte[0]}.json'
+
+
+def subdiretorio(base, recorte):
+    """Diretório do recorte sob `base` (o recorte padrão usa a própria base)."""
+    if recorte == RECORTE_PADRAO:
+        return base
+    return os.path.join(base, nome_recorte(recorte))
+
+
+def titulo_recorte(recorte):
+    """Título do dashboard de um recorte (ex.: 'Emprego Agrícola - Paraná')."""
+    uf, secao = recorte
+    return f'Emprego {DESCRICOES_SECAO[secao][0]} - {NOMES_UF[uf][0]}'
+
+
+def subtitulo_recorte(recorte):
+    """Subtítulo do dashboard de um recorte, com o gentílico concordando com o setor."""
+    uf, secao = recorte
+    _, setor, feminino = DESCRICOES_SECAO[secao]
+    gentilico = NOMES_UF[uf][1]
+    if feminino and gentilico.endswith('o'):
+        gentilico = gentilico[:-1] + 'a'
+    return f'Movimentações de emprego formal {setor} {gentilico}'
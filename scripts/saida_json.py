@@ -0,0 +1,270 @@
+"""
+Serialização JSON das saídas do dashboard
+DataFrames são convertidos coluna a coluna direto para texto JSON
+(NaN/inf viram null), sem passar por listas de dicionários
+"""
+
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+# Saídas consumidas pelo frontend: sem espaços
+SEPARADORES = (',', ':')
+
+# Campos que mudam a cada execução sem mudar os dados: fora do hash de conteúdo
+VOLATEIS = ('atualizacao',)
+
+
+def nativo(obj):
+    """Converte tipos numpy/pandas para Python nativos e NaN/inf para None."""
+    if isinstance(obj, pd.DataFrame):
+        return nativo(obj.to_dict(orient='records'))
+    if isinstance(obj, pd.Series):
+        return nativo(obj.tolist())
+    if isinstance(obj, dict):
+        return {k: nativo(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [nativo(v) for v in obj]
+    if isinstance(obj, np.ndarray):
+        return [nativo(v) for v in obj.tolist()]
+    if isinstance(obj, (bool, np.bool_)):
+        return bool(obj)
+    if isinstance(obj, np.integer):
+        return int(obj)
+    if isinstance(obj, (float, np.floating)):
+        if not np.isfinite(obj):
+            return None
+        return float(obj)
+    if obj is pd.NA or obj is pd.NaT:
+        return None
+    return obj
+
+
+def _texto(valor):
+    """Texto JSON de um valor escalar (strings sem escapar acentos)."""
+    return json.dumps(nativo(valor), ensure_ascii=False)
+
+
+def valores_json(serie):
+    """Texto JSON de cada elemento da série (array de objetos str)."""
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        # Cada categoria é codificada uma vez; NaN (código -1) vira null
+        textos = np.array([_texto(c) for c in serie.cat.categories] + ['null'], dtype=object)
+        return textos[serie.cat.codes.to_numpy()]
+
+    if pd.api.types.is_bool_dtype(serie.dtype):
+        nulo = serie.isna().to_numpy()
+        valores = serie.fillna(False).to_numpy(dtype=bool)
+        return np.where(nulo, 'null', np.where(valores, 'true', 'false')).astype(object)
+
+    if pd.api.types.is_integer_dtype(serie.dtype):
+        nulo = serie.isna().to_numpy()
+        valores = serie.fillna(0).to_numpy(dtype=np.int64).astype(str)
+        return np.where(nulo, 'null', valores).astype(object)
+
+    if pd.api.types.is_float_dtype(serie.dtype):
+        # float64 -> str usa a menor representação exata, igual ao json.dumps
+        valores = serie.to_numpy(dtype=np.float64, na_value=np.nan)
+        textos = valores.astype(str)
+        return np.where(np.isfinite(valores), textos, 'null').astype(object)
+
+    # Strings e objetos: codificar cada valor distinto uma vez
+    codigos, unicos = pd.factorize(serie, use_na_sentinel=True)
+    textos = np.array([_texto(v) for v in unicos] + ['null'], dtype=object)
+    return textos[codigos]
+
+
+def registros_json(df):
+    """Texto JSON de um DataFrame como lista de objetos (orient='records')."""
+    if len(df) == 0:
+        return '[]'
+
+    linhas = None
+    for i, col in enumerate(df.columns):
+        prefixo = ('{' if i == 0 else ',') + json.dumps(str(col), ensure_ascii=False) + ':'
+        parte = prefixo + valores_json(df[col])
+        linhas = parte if linhas is None else linhas + parte
+
+    return '[' + ','.join((linhas + '}').tolist()) + ']'
+
+
+def colunar(df):
+    """
+    Layout colunar de um DataFrame: colunas de texto/categoria viram índices
+    (0, 1, ...) em `dicionarios`; colunas numéricas seguem como arrays.
+    Formato: {'formato': 'colunar', 'linhas': n, 'dicionarios': {...}, 'colunas': {...}}
+    """
+    dicionarios = {}
+    colunas = {}
+    for col in df.columns:
+        serie = df[col]
+        if pd.api.types.is_numeric_dtype(serie.dtype) and not isinstance(serie.dtype, pd.CategoricalDtype):
+            colunas[col] = serie.reset_index(drop=True)
+            continue
+
+        cat = serie.astype('category').cat.remove_unused_categories()
+        codigos = cat.cat.codes.to_numpy()
+        dicionarios[col] = [nativo(c) for c in cat.cat.categories]
+        colunas[col] = pd.Series(codigos).astype('Int32').mask(codigos < 0)
+
+    return {
+        'formato': 'colunar',
+        'linhas': len(df),
+        'dicionarios': dicionarios,
+        'colunas': colunas,
+    }
+
+
+def esparso(df, chaves, bin='bin', valor='n'):
+    """
+    Layout esparso (CSR) de histogramas por célula: as células distintas de
+    `chaves` em layout colunar e, para a célula i, os bins e contagens em
+    bins[inicio[i]:inicio[i+1]] e n[inicio[i]:inicio[i+1]].
+    Formato: {'formato': 'esparso', 'celulas': {...}, 'inicio': [...], 'bins': [...], 'n': [...]}
+    """
+    df = df.sort_values(list(chaves) + [bin], kind='stable').reset_index(drop=True)
+    nova = df[list(chaves)].ne(df[list(chaves)].shift()).any(axis=1).to_numpy()
+    inicio = np.flatnonzero(nova)
+
+    return {
+        'formato': 'esparso',
+        'celulas': colunar(df.loc[inicio, list(chaves)].reset_index(drop=True)),
+        'inicio': pd.Series(np.r_[inicio, len(df)]),
+        'bins': df[bin].reset_index(drop=True),
+        'n': df[valor].reset_index(drop=True),
+    }
+
+
+def para_json(obj, indent=None):
+    """
+    Texto JSON de uma saída (dict/list com DataFrames e escalares).
+    Compacto por padrão; com indent usa json.dumps sobre tipos nativos.
+    """
+    if indent is not None:
+        return json.dumps(nativo(obj), ensure_ascii=False, indent=indent)
+
+    if isinstance(obj, pd.DataFrame):
+        return registros_json(obj)
+    if isinstance(obj, pd.Series):
+        return '[' + ','.join(valores_json(obj).tolist()) + ']'
+    if isinstance(obj, dict):
+        itens = (json.dumps(str(k), ensure_ascii=False) + ':' + para_json(v) for k, v in obj.items())
+        return '{' + ','.join(itens) + '}'
+    if isinstance(obj, (list, tuple)):
+        return '[' + ','.join(para_json(v) for v in obj) + ']'
+    return json.dumps(nativo(obj), ensure_ascii=False, separators=SEPARADORES)
+
+
+def serializar_json(obj, indent=None):
+    """Bytes UTF-8 do JSON de uma saída (ver para_json)."""
+    return para_json(obj, indent=indent).encode('utf-8')
+
+
+def serializar_saida(obj, indent=None):
+    """
+    Bytes do JSON de uma saída e hash do conteúdo sem campos voláteis
+    (None se não há campos voláteis), como gravados por EscritorSaidas.json.
+    """
+    estavel = sem_volateis(obj)
+    conteudo = None if estavel is None else sha256(serializar_json(estavel, indent=indent))
+    return serializar_json(obj, indent=indent), conteudo
+
+
+def serializar_arrow(df):
+    """Bytes de um DataFrame em Arrow IPC (colunas categóricas como dicionário)."""
+    tabela = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_file(sink, tabela.schema) as writer:
+        writer.write_table(tabela)
+    return sink.getvalue().to_pybytes()
+
+
+def sem_volateis(obj):
+    """
+    Cópia de uma saída sem os campos voláteis (ex.: data de atualização),
+    ou None se ela não tem nenhum.
+    """
+    encontrou = False
+
+    def limpar(valor):
+        nonlocal encontrou
+        if isinstance(valor, dict):
+            if any(k in VOLATEIS for k in valor):
+                encontrou = True
+            return {k: limpar(v) for k, v in valor.items() if k not in VOLATEIS}
+        if isinstance(valor, list):
+            return [limpar(v) for v in valor]
+        return valor
+
+    limpo = limpar(obj)
+    return limpo if encontrou else None
+
+
+def sha256(dados):
+    """Hash hexadecimal de bytes."""
+    return hashlib.sha256(dados).hexdigest()
+
+
+def sha256_arquivo(path):
+    """Hash hexadecimal de um arquivo (None se não existe)."""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return sha256(f.read())
+
+
+def gravar_atomico(path, dados):
+    """Grava bytes em `path` via arquivo temporário + rename."""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(dados)
+    os.replace(tmp_path, path)
+
+
+class EscritorSaidas:
+    """
+    Grava saídas em `base_dir` só quando o conteúdo muda. O hash do conteúdo
+    (sem campos voláteis) é comparado com o do manifesto anterior e com o
+    arquivo em disco; se nada mudou o arquivo fica intocado, inclusive a
+    data de atualização, e a execução não gera diff nem novo deploy.
+    """
+
+    def __init__(self, base_dir, anteriores=None):
+        self.base_dir = base_dir
+        self.anteriores = anteriores or {}
+        self.arquivos = {}
+        self.gravados = []
+        self.inalterados = []
+
+    def escrever(self, arquivo, dados, conteudo=None):
+        """Grava bytes em base_dir/arquivo se mudaram. Retorna a entrada do manifesto."""
+        info = {'bytes': len(dados), 'sha256': sha256(dados), 'conteudo': conteudo or sha256(dados)}
+        path = os.path.join(self.base_dir, arquivo)
+        no_disco = sha256_arquivo(path)
+        anterior = self.anteriores.get(arquivo)
+
+        if no_disco is not None and no_disco == info['sha256']:
+            self.inalterados.append(arquivo)
+        elif (no_disco is not None and anterior is not None
+              and anterior.get('conteudo') == info['conteudo'] and anterior.get('sha256') == no_disco):
+            # Só campos voláteis mudaram: manter o arquivo atual
+            info = {'bytes': anterior['bytes'], 'sha256': no_disco, 'conteudo': info['conteudo']}
+            self.inalterados.append(arquivo)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            gravar_atomico(path, dados)
+            self.gravados.append(arquivo)
+
+        self.arquivos[arquivo] = info
+        return info
+
+    def json(self, arquivo, obj, indent=None):
+        """Grava uma saída JSON (compacta por padrão) se o conteúdo mudou."""
+        return self.escrever(arquivo, *serializar_saida(obj, indent=indent))
+
+    def arrow(self, arquivo, df):
+        """Grava um DataFrame em Arrow IPC se o conteúdo mudou."""
+        return self.escrever(arquivo, serializar_arrow(df))
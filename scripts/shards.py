@@ -0,0 +1,136 @@
+"""
+Saídas granulares particionadas (shards) por cadeia e por região
+Cada shard traz o cubo, as dimensões e o esboço salarial restritos a uma
+cadeia, mesorregião ou regional IDR; manifest.json lista chaves, tamanhos
+e hashes para o frontend buscar só o que o filtro usa
+"""
+
+import os
+import re
+import json
+import shutil
+import unicodedata
+
+from saida_json import serializar_saida
+
+
+SHARDS_DIR = 'shards'
+MANIFESTO = 'manifest.json'
+VERSAO_MANIFESTO = 1
+
+# Níveis com shards (regiões derivadas da coluna 'mun' pelo mun_PR.json)
+NIVEIS_SHARD = ('cadeia', 'meso', 'regIdr')
+
+
+def slug(texto):
+    """Nome de arquivo estável para uma chave (sem acentos, minúsculo)."""
+    ascii_ = unicodedata.normalize('NFKD', str(texto)).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'[^a-z0-9]+', '-', ascii_.lower()).strip('-') or 'vazio'
+
+
+def _chaves(tabela, nivel, regioes):
+    """Chave do shard de cada linha de uma tabela granular."""
+    if nivel == 'cadeia':
+        return tabela['cadeia'].astype(str)
+    return tabela['mun'].astype(str).map(regioes[nivel]).fillna('Não informado')
+
+
+def particionar(tabelas, regioes, niveis=NIVEIS_SHARD):
+    """
+    Divide tabelas granulares (DataFrames com colunas 'mun' e 'cadeia')
+    em shards: {nivel: {chave: {nome_tabela: DataFrame}}}.
+    """
+    shards = {}
+    for nivel in niveis:
+        shards[nivel] = {}
+        for nome, tabela in tabelas.items():
+            for chave, parte in tabela.groupby(_chaves(tabela, nivel, regioes), sort=True):
+                shards[nivel].setdefault(chave, {})[nome] = parte.reset_index(drop=True)
+    return shards
+
+
+def serializar_shards(por_chave, nivel, formatar, formatos=None):
+    """
+    JSON dos shards de um nível: {chave: (arquivo, bytes, hash do conteúdo)}.
+    formatos: formatação própria de algumas tabelas ({nome: função}).
+    """
+    formatos = formatos or {}
+    serializados = {}
+    for chave, tabelas in por_chave.items():
+        arquivo = f'{SHARDS_DIR}/{nivel}/{slug(chave)}.json'
+        conteudo = {
+            nome: formatos.get(nome, formatar)(tabela) for nome, tabela in tabelas.items()
+        }
+        serializados[chave] = (arquivo, *serializar_saida(conteudo))
+    return serializados
+
+
+def gravar_shards(escritor, serializados):
+    """
+    Grava shards já serializados ({nivel: saída de serializar_shards}) em
+    <base>/shards/<nivel>/<slug>.json (só os que mudaram), removendo shards
+    antigos que não existem mais. Retorna as entradas do manifesto.
+    """
+    raiz = os.path.join(escritor.base_dir, SHARDS_DIR)
+    entradas = {}
+    gravados = set()
+
+    for nivel, por_chave in serializados.items():
+        entradas[nivel] = {}
+        for chave, (arquivo, dados, conteudo) in por_chave.items():
+            info = escritor.escrever(arquivo, dados, conteudo)
+            entradas[nivel][chave] = {'arquivo': arquivo, **info}
+            gravados.add(os.path.normpath(os.path.join(escritor.base_dir, arquivo)))
+
+    # Limpar shards de chaves que sumiram (ex.: cadeia renomeada)
+    for dirpath, _, filenames in os.walk(raiz):
+        for filename in filenames:
+            path = os.path.normpath(os.path.join(dirpath, filename))
+            if path not in gravados:
+                os.remove(path)
+    if os.path.isdir(raiz):
+        for nivel in os.listdir(raiz):
+            if nivel not in serializados and os.path.isdir(os.path.join(raiz, nivel)):
+                shutil.rmtree(os.path.join(raiz, nivel))
+
+    return entradas
+
+
+def ler_manifesto(base_dir):
+    """Conteúdo do manifest.json atual ({} se não existe)."""
+    path = os.path.join(base_dir, MANIFESTO)
+    if not os.path.exists(path):
+        return {}
+
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def carregar_manifesto(base_dir):
+    """
+    Entradas do manifest.json anterior indexadas pelo caminho do arquivo
+    ({arquivo: {'bytes', 'sha256', 'conteudo'}}), para o EscritorSaidas.
+    """
+    manifesto = ler_manifesto(base_dir)
+    anteriores = dict(manifesto.get('arquivos', {}))
+    for por_chave in manifesto.get('shards', {}).values():
+        for entrada in por_chave.values():
+            anteriores[entrada['arquivo']] = entrada
+    return anteriores
+
+
+def escrever_manifesto(escritor, shards, **extras):
+    """Grava manifest.json com arquivos completos e shards (tamanho e hashes)."""
+    arquivos = {
+        arquivo: info for arquivo, info in escritor.arquivos.items()
+        if not arquivo.startswith(SHARDS_DIR + '/')
+    }
+    manifesto = {
+        'versao': VERSAO_MANIFESTO,
+        **extras,
+        'arquivos': dict(sorted(arquivos.items())),
+        'shards': shards,
+    }
+    dados = json.dumps(manifesto, ensure_ascii=False, indent=2).encode('utf-8')
+    escritor.escrever(MANIFESTO, dados)
+    return manifesto
@@ -0,0 +1,163 @@
+"""
+Grafo de tarefas executado em um pool de processos
+Cada tarefa é uma função cujos argumentos podem ser resultados de outras
+tarefas (Resultado) ou objetos compartilhados (Compartilhado). Os
+compartilhados, como o estado agregado, são herdados pelos workers via fork
+(cópia sob escrita, sem serializar nem copiar por worker); só argumentos
+pequenos e resultados trafegam entre processos. Os resultados saem na ordem
+de inclusão das tarefas, qualquer que seja a ordem de conclusão.
+
+Uso:
+    grafo = GrafoTarefas()
+    kpis = grafo.adicionar('kpis', generate_kpis, Compartilhado('plano'))
+    grafo.adicionar('kpis.json', serializar_saida, kpis, indent=2)
+    resultados = grafo.executar(workers=4, plano=plano)
+"""
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import instrumentacao
+from instrumentacao import etapa, tamanho
+
+# Objetos compartilhados da execução em andamento (herdados pelos workers)
+_compartilhados = {}
+
+
+class Resultado:
+    """Argumento de tarefa: resultado de outra tarefa do grafo."""
+
+    def __init__(self, nome):
+        self.nome = nome
+
+
+class Compartilhado:
+    """Argumento de tarefa: objeto passado a GrafoTarefas.executar, lido no worker."""
+
+    def __init__(self, nome):
+        self.nome = nome
+
+
+class Tarefa:
+    """Função e argumentos de um nó do grafo."""
+
+    def __init__(self, nome, funcao, args, kwargs):
+        self.nome = nome
+        self.funcao = funcao
+        self.args = args
+        self.kwargs = kwargs
+        self.dependencias = [
+            valor.nome for valor in list(args) + list(kwargs.values()) if isinstance(valor, Resultado)
+        ]
+
+
+def fork_disponivel():
+    """Workers herdam a memória do processo (fork) nesta plataforma?"""
+    return 'fork' in multiprocessing.get_all_start_methods()
+
+
+def _compartilhado(valor):
+    return _compartilhados[valor.nome] if isinstance(valor, Compartilhado) else valor
+
+
+def _rodar(nome, funcao, args, kwargs):
+    """Executa uma tarefa como etapa com o nome da função."""
+    args = [_compartilhado(valor) for valor in args]
+    kwargs = {chave: _compartilhado(valor) for chave, valor in kwargs.items()}
+    with etapa(funcao.__name__, tarefa=nome) as medida:
+        resultado = funcao(*args, **kwargs)
+        medida.linhas_saida = tamanho(resultado)
+    return resultado
+
+
+def _rodar_no_worker(nome, funcao, args, kwargs):
+    """
+    Executa uma tarefa no worker e devolve também as etapas e perfis medidos
+    nele (a execução herdada do processo principal é uma cópia).
+    """
+    execucao = instrumentacao.execucao_atual()
+    if execucao is None:
+        return _rodar(nome, funcao, args, kwargs), [], []
+
+    etapas, perfis = len(execucao.etapas), len(execucao.perfis)
+    resultado = _rodar(nome, funcao, args, kwargs)
+    return resultado, execucao.etapas[etapas:], execucao.perfis[perfis:]
+
+
+class GrafoTarefas:
+    """Tarefas com dependências, executadas em série ou em um pool de processos."""
+
+    def __init__(self):
+        self.tarefas = {}
+
+    def adicionar(self, nome, funcao, *args, **kwargs):
+        """
+        Inclui uma tarefa; argumentos Resultado devem ser de tarefas já
+        incluídas (a ordem de inclusão é sempre uma ordem válida de execução).
+        Retorna o Resultado da nova tarefa, para uso como argumento.
+        """
+        if nome in self.tarefas:
+            raise ValueError(f"tarefa duplicada: {nome}")
+        tarefa = Tarefa(nome, funcao, args, kwargs)
+        ausentes = [d for d in tarefa.dependencias if d not in self.tarefas]
+        if ausentes:
+            raise ValueError(f"tarefa {nome} depende de tarefas não incluídas: {', '.join(ausentes)}")
+        self.tarefas[nome] = tarefa
+        return Resultado(nome)
+
+    def executar(self, workers=1, **compartilhados):
+        """
+        Executa todas as tarefas e retorna {nome: resultado} na ordem de inclusão.
+        workers > 1 usa um pool de processos (fork); sem fork na plataforma,
+        executa em série. `compartilhados` são os objetos dos argumentos Compartilhado.
+        """
+        global _compartilhados
+        _compartilhados = compartilhados
+        try:
+            if workers <= 1 or len(self.tarefas) <= 1 or not fork_disponivel():
+                resultados = {}
+                for nome, tarefa in self.tarefas.items():
+                    args, kwargs = self._argumentos(tarefa, resultados)
+                    resultados[nome] = _rodar(nome, tarefa.funcao, args, kwargs)
+                return resultados
+            return self._executar_pool(workers)
+        finally:
+            _compartilhados = {}
+
+    def _argumentos(self, tarefa, resultados):
+        """Argumentos com os Resultado substituídos pelos valores calculados."""
+        def resolver(valor):
+            return resultados[valor.nome] if isinstance(valor, Resultado) else valor
+
+        return [resolver(v) for v in tarefa.args], {k: resolver(v) for k, v in tarefa.kwargs.items()}
+
+    def _executar_pool(self, workers):
+        execucao = instrumentacao.execucao_atual()
+        resultados = {}
+        pendentes = list(self.tarefas)
+        em_execucao = {}
+
+        contexto = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=contexto) as executor:
+            try:
+                while pendentes or em_execucao:
+                    # Submeter, na ordem de inclusão, as tarefas com dependências prontas
+                    for nome in list(pendentes):
+                        tarefa = self.tarefas[nome]
+                        if all(d in resultados for d in tarefa.dependencias):
+                            args, kwargs = self._argumentos(tarefa, resultados)
+                            futuro = executor.submit(_rodar_no_worker, nome, tarefa.funcao, args, kwargs)
+                            em_execucao[futuro] = nome
+                            pendentes.remove(nome)
+
+                    concluidos, _ = wait(em_execucao, return_when=FIRST_COMPLETED)
+                    for futuro in concluidos:
+                        nome = em_execucao.pop(futuro)
+                        resultados[nome], etapas, perfis = futuro.result()
+                        if execucao is not None:
+                            execucao.incorporar(etapas, perfis)
+            except BaseException:
+                executor.shutdown(wait=True, cancel_futures=True)
+                raise
+
+        return {nome: resultados[nome] for nome in self.tarefas}
@@ -0,0 +1,51 @@
+"""
+Configuração dos testes
+Os scripts são módulos soltos em scripts/ que se importam como irmãos: o
+diretório entra no sys.path. Os stores de microdados são montados com
+CAGEDMOV sintéticos (dados_sinteticos), pelo mesmo caminho do download.
+"""
+
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+SCRIPTS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+sys.path.insert(0, SCRIPTS_DIR)
+
+import dados_sinteticos
+from download_caged_granular import ler_csv_filtrado, process_microdata
+from particoes import gravar_particao, preparar_store
+from recortes import RECORTE_PADRAO, store_path
+
+
+def gravar_store(raw_dir, periodos, linhas, copias=1, semente=42):
+    """
+    Store particionado do recorte padrão com um CAGEDMOV sintético por mês
+    (~`linhas` registros PR/agro). copias > 1 repete as linhas do mês: mais
+    microdados com as mesmas células do estado.
+    """
+    store = store_path(RECORTE_PADRAO, raw_dir)
+    preparar_store(store)
+    manifesto = {}
+
+    for i, (ano, mes) in enumerate(periodos):
+        bruto = dados_sinteticos.gerar_cagedmov(linhas * 2, ano, mes, semente=semente + i)
+        csv_path = dados_sinteticos.gravar_cagedmov(bruto, os.path.join(raw_dir, f'CAGEDMOV{ano}{mes:02d}.txt'))
+        df = ler_csv_filtrado(csv_path)
+        os.remove(csv_path)
+        if copias > 1:
+            df = pd.concat([df] * copias, ignore_index=True)
+        gravar_particao(process_microdata(df, ano, mes), ano, mes, manifesto, base=store)
+    return store
+
+
+@pytest.fixture
+def prepare(tmp_path, monkeypatch):
+    """prepare_dashboard_granular lendo o store e gravando o estado em tmp_path."""
+    import prepare_dashboard_granular
+
+    monkeypatch.setattr(prepare_dashboard_granular, 'RAW_DIR', str(tmp_path / 'raw'))
+    monkeypatch.setattr(prepare_dashboard_granular, 'ESTADO_DIR', str(tmp_path / 'agregados'))
+    return prepare_dashboard_granular
@@ -0,0 +1,84 @@
+"""
+Estatísticas salariais do estado agregado: exatas nos recortes com contagens
+de salário (SALARIOS); nos demais, dentro do erro relativo do esboço (SKETCH_ALFA)
+"""
+
+import numpy as np
+import pandas as pd
+
+from agregacao import SKETCH_ALFA, ESBOCOS, calcular_estado, fundir_estados, PlanoAgregacao
+
+
+def microdados(linhas=20_000, semente=7):
+    """Microdados mínimos para calcular_estado, com salários log-normais."""
+    rng = np.random.default_rng(semente)
+    salario = np.round(rng.lognormal(7.6, 0.5, linhas), 2)
+    salario[rng.random(linhas) < 0.2] = 1412.0
+    salario[rng.random(linhas) < 0.02] = np.nan
+    df = pd.DataFrame({
+        'municipio_codigo': rng.choice(['410690', '411520', '412550'], linhas),
+        'periodo': rng.choice(['2024-01', '2024-02'], linhas),
+        'cadeia_produtiva': rng.choice(['Soja', 'Milho', 'Aves'], linhas),
+        'sexo_nome': rng.choice(['Homem', 'Mulher'], linhas),
+        'faixa_etaria': rng.choice(['18-24', '25-39', '40-59'], linhas),
+        'escolaridade_nome': rng.choice(['Médio Completo', 'Superior Completo'], linhas),
+        'porte_empresa_nome': rng.choice(['Micro', 'Grande'], linhas),
+        'cnae_subclasse': rng.choice(['0115600', '0155505', '0111302'], linhas),
+        'cbo_codigo': rng.choice(['622020', '623110', '641015', '782305'], linhas),
+        'is_admissao': rng.random(linhas) < 0.5,
+        'salario': salario,
+        'idade_anos': rng.integers(18, 60, linhas),
+    })
+    df['is_demissao'] = ~df['is_admissao']
+    return df
+
+
+def test_estatisticas_salariais_exatas():
+    df = microdados()
+    plano = PlanoAgregacao(calcular_estado(df))
+
+    for dims in (['cadeia_produtiva'], ['periodo', 'sexo_nome'], ['cnae_subclasse', 'cadeia_produtiva']):
+        esperado = df.groupby(dims)['salario']
+        for estatistica in ('mean', 'std', 'min', 'max', 'median', 0.1, 0.25, 0.75, 0.9):
+            obtido = plano.salario(dims, estatistica).sort_index()
+            exato = (esperado.quantile(estatistica) if isinstance(estatistica, float)
+                     else esperado.agg(estatistica)).sort_index()
+            np.testing.assert_allclose(obtido, exato, rtol=1e-12, err_msg=str((dims, estatistica)))
+
+    assert plano.salario([], 'median') == df['salario'].median()
+
+
+def test_recortes_sem_contagens_pelo_esboco():
+    """Município e CBO: sem contagens exatas, estatísticas do menor esboço."""
+    df = microdados()
+    plano = PlanoAgregacao(calcular_estado(df))
+
+    for dims in (['municipio_codigo'], ['periodo', 'cbo_codigo']):
+        esperado = df.groupby(dims)['salario']
+        for q in (0.25, 0.5, 0.75):
+            estatistica = 'median' if q == 0.5 else q
+            obtido = plano.salario(dims, estatistica).sort_index()
+            exato = esperado.quantile(q).sort_index()
+            assert (abs(obtido - exato) / exato <= SKETCH_ALFA).all(), (dims, q, obtido, exato)
+
+
+def test_esbocos_limitados_pelos_bins():
+    """Tabelas de esboço crescem com células x bins, não com valores distintos."""
+    estado = calcular_estado(microdados(linhas=60_000))
+    for nome, dims in ESBOCOS.items():
+        tabela = estado[nome]
+        celulas = len(tabela.groupby(dims, observed=True))
+        assert len(tabela) <= celulas * tabela['bin'].nunique()
+        assert len(tabela) < 60_000 / 20
+
+
+def test_lotes_fundidos_igual_ao_todo():
+    df = microdados()
+    metade = len(df) // 2
+    inicio, fim = df.iloc[:metade], df.iloc[metade:].reset_index(drop=True)
+    vistos = inicio['periodo'].value_counts().to_dict()
+    fundido = fundir_estados([calcular_estado(inicio), calcular_estado(fim, deslocamento=vistos)])
+    todo = calcular_estado(df)
+
+    for nome in todo:
+        pd.testing.assert_frame_equal(fundido[nome], todo[nome], check_exact=False, rtol=1e-9)
@@ -0,0 +1,128 @@
+"""
+Download dos .7z de um servidor FTP local (pyftpdlib): o store gravado com
+--workers 1 e --workers N é o mesmo, e uma transferência interrompida é
+retomada com REST sem corromper o arquivo
+"""
+
+import os
+import ftplib
+import filecmp
+import threading
+
+import pytest
+
+pytest.importorskip('pyftpdlib')
+py7zr = pytest.importorskip('py7zr')
+
+from pyftpdlib.authorizers import DummyAuthorizer
+from pyftpdlib.handlers import FTPHandler
+from pyftpdlib.servers import FTPServer
+
+import dados_sinteticos
+import download_caged_granular
+from download_caged_granular import caminho_ftp
+from particoes import carregar_manifesto
+from recortes import RECORTE_PADRAO, store_path
+
+PERIODOS = [(2024, 1), (2024, 2), (2024, 3)]
+
+
+@pytest.fixture(scope='module')
+def servidor_ftp(tmp_path_factory):
+    """FTP anônimo com um CAGEDMOV sintético por mês, no caminho do FTP do MTE."""
+    raiz = tmp_path_factory.mktemp('ftp')
+    for ano, mes in PERIODOS:
+        remoto = raiz / caminho_ftp(ano, mes).lstrip('/')
+        remoto.parent.mkdir(parents=True)
+        txt = dados_sinteticos.gravar_cagedmov(
+            dados_sinteticos.gerar_cagedmov(20_000, ano, mes), str(raiz / f'CAGEDMOV{ano}{mes:02d}.txt'))
+        with py7zr.SevenZipFile(remoto, 'w') as arquivo:
+            arquivo.write(txt, os.path.basename(txt))
+        os.remove(txt)
+
+    autorizador = DummyAuthorizer()
+    autorizador.add_anonymous(str(raiz))
+    handler = type('Handler', (FTPHandler,), {'authorizer': autorizador})
+    servidor = FTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=servidor.serve_forever, kwargs={'timeout': 0.1}, daemon=True)
+    thread.start()
+    yield raiz, servidor.address[1]
+    servidor.close_all()
+
+
+class FTPInstavel(ftplib.FTP):
+    """Sessão cuja primeira transferência de cada arquivo cai após o primeiro bloco."""
+
+    interrompidos = set()
+    retomadas = []
+
+    def retrbinary(self, cmd, callback, blocksize=8192, rest=None):
+        if rest:
+            FTPInstavel.retomadas.append((cmd, rest))
+        if cmd in FTPInstavel.interrompidos:
+            return super().retrbinary(cmd, callback, blocksize, rest)
+        FTPInstavel.interrompidos.add(cmd)
+
+        def cair(bloco):
+            callback(bloco)
+            raise EOFError('conexão caiu')
+        return super().retrbinary(cmd, cair, blocksize, rest)
+
+
+@pytest.fixture
+def baixar(servidor_ftp, tmp_path, monkeypatch):
+    """download_all contra o FTP local, em diretórios próprios de cada chamada."""
+    raiz, porta = servidor_ftp
+
+    def baixar(nome, workers=1, classe=ftplib.FTP):
+        def conectar_ftp():
+            ftp = classe()
+            ftp.connect('127.0.0.1', porta)
+            ftp.login()
+            return ftp
+
+        monkeypatch.setattr(download_caged_granular, 'conectar_ftp', conectar_ftp)
+        raw_dir = tmp_path / nome
+        download_caged_granular.download_all(
+            workers=workers, cache_dir=str(raw_dir / 'arquivos'), raw_dir=str(raw_dir))
+        return raw_dir
+
+    return baixar
+
+
+def assert_stores_iguais(a, b):
+    store_a, store_b = store_path(RECORTE_PADRAO, str(a)), store_path(RECORTE_PADRAO, str(b))
+    manifesto = carregar_manifesto(store_a)
+    assert sorted(manifesto) == [f'{ano}-{mes:02d}' for ano, mes in PERIODOS]
+    assert all(entrada['linhas'] > 0 for entrada in manifesto.values())
+    assert manifesto == carregar_manifesto(store_b)
+
+    comparacao = filecmp.dircmp(store_a, store_b)
+    pendentes = [comparacao]
+    while pendentes:
+        atual = pendentes.pop()
+        assert not atual.left_only and not atual.right_only, atual.report()
+        _, diferentes, erros = filecmp.cmpfiles(atual.left, atual.right, atual.common_files, shallow=False)
+        assert not diferentes and not erros, (atual.left, diferentes, erros)
+        pendentes.extend(atual.subdirs.values())
+
+
+def test_paralelo_igual_ao_serial(baixar):
+    assert_stores_iguais(baixar('serial', workers=1), baixar('paralelo', workers=3))
+
+
+def test_transferencia_retomada(baixar, servidor_ftp, monkeypatch):
+    raiz, _ = servidor_ftp
+    monkeypatch.setattr(download_caged_granular, 'BLOCO_FTP', 4096)
+    FTPInstavel.interrompidos, FTPInstavel.retomadas = set(), []
+
+    serial = baixar('serial')
+    retomado = baixar('retomado', workers=2, classe=FTPInstavel)
+
+    # Cada arquivo caiu uma vez e foi retomado (REST) de onde parou
+    assert len(FTPInstavel.retomadas) == len(PERIODOS)
+    assert all(0 < rest <= 4096 for _, rest in FTPInstavel.retomadas)
+    for ano, mes in PERIODOS:
+        baixado = retomado / 'arquivos' / f'CAGEDMOV{ano}{mes:02d}.7z'
+        assert filecmp.cmp(baixado, raiz / caminho_ftp(ano, mes).lstrip('/'), shallow=False)
+    assert_stores_iguais(serial, retomado)
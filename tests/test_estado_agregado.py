@@ -0,0 +1,87 @@
+"""
+Estado agregado persistido: o estado combinado mantido entre execuções
+(só meses alterados substituídos) é idêntico ao calculado de uma vez
+"""
+
+import os
+
+import pandas as pd
+import pytest
+
+import estado_agregado
+from agregacao import calcular_estado, tabelas_estado
+from conftest import gravar_store
+from particoes import carregar_manifesto, gravar_particao
+
+PERIODOS = [(2024, 1), (2024, 2), (2024, 3)]
+
+
+def assert_estados_iguais(obtido, esperado):
+    assert set(obtido) == set(esperado)
+    for nome in esperado:
+        pd.testing.assert_frame_equal(obtido[nome], esperado[nome], check_exact=False, rtol=1e-9, obj=nome)
+
+
+@pytest.fixture
+def store(prepare):
+    gravar_store(prepare.RAW_DIR, PERIODOS, linhas=2_000)
+    return prepare
+
+
+def atualizar(prepare):
+    manifesto = carregar_manifesto(prepare.microdata_path())
+    return estado_agregado.atualizar_estado(manifesto, prepare.calcular_periodos, base=prepare.ESTADO_DIR)
+
+
+def completo(prepare):
+    return calcular_estado(prepare.load_microdata())
+
+
+def test_incremental_igual_ao_completo(store):
+    assert_estados_iguais(atualizar(store), completo(store))
+
+    # Sem alterações: o combinado persistido é lido sem recombinar
+    combinado = os.path.join(store.ESTADO_DIR, estado_agregado.COMBINADO)
+    gravado = os.path.getmtime(combinado)
+    assert_estados_iguais(atualizar(store), completo(store))
+    assert os.path.getmtime(combinado) == gravado
+
+
+def test_mes_incluido_e_removido(store):
+    atualizar(store)
+
+    # Novo mês: entra no combinado sem recalcular os anteriores
+    gravar_store(store.RAW_DIR, PERIODOS + [(2024, 4)], linhas=2_000)
+    assert_estados_iguais(atualizar(store), completo(store))
+
+    # Mês reprocessado (nova fonte) e mês removido do store
+    manifesto = carregar_manifesto(store.microdata_path())
+    manifesto['2024-03']['fonte'] = {'tamanho': 1}
+    gravar_particao(None, 2024, 2, manifesto, base=store.microdata_path())
+    obtido = atualizar(store)
+    assert list(obtido['cubo']['periodo'].cat.categories) == ['2024-01', '2024-03', '2024-04']
+    assert_estados_iguais(obtido, completo(store))
+
+
+
+def esvaziar(prepare):
+    """Todos os meses do store ficam sem registros."""
+    manifesto = carregar_manifesto(prepare.microdata_path())
+    for ano, mes in PERIODOS:
+        gravar_particao(None, ano, mes, manifesto, base=prepare.microdata_path())
+
+
+def test_store_sem_registros(store):
+    colunas = {nome: list(tabela.columns) for nome, tabela in completo(store).items()}
+
+    # Sem combinado gravado e depois com o combinado de uma execução anterior
+    esvaziar(store)
+    for anterior in (False, True):
+        if anterior:
+            gravar_store(store.RAW_DIR, PERIODOS, linhas=2_000)
+            atualizar(store)
+            esvaziar(store)
+        obtido = atualizar(store)
+        assert set(obtido) == set(tabelas_estado())
+        for nome, tabela in obtido.items():
+            assert tabela.empty and list(tabela.columns) == colunas[nome], nome
@@ -0,0 +1,30 @@
+"""
+Backend SQL (DuckDB) do estado agregado: mesmas tabelas de
+agregacao.calcular_estado sobre um store sintético
+"""
+
+import pytest
+
+pytest.importorskip('duckdb')
+
+import estado_sql
+from agregacao import calcular_estado
+from conftest import gravar_store
+
+
+@pytest.fixture
+def store(prepare):
+    gravar_store(prepare.RAW_DIR, [(2024, 1), (2024, 2)], linhas=3_000)
+    return prepare
+
+
+def test_sql_igual_ao_pandas(store):
+    esperado = calcular_estado(store.load_microdata())
+    obtido = estado_sql.calcular_estado_sql(store.microdata_path())
+    assert estado_sql.comparar_estados(esperado, obtido) == []
+
+
+def test_sql_por_periodo(store):
+    esperado = calcular_estado(store.load_microdata(['2024-02']))
+    obtido = estado_sql.calcular_estado_sql(store.microdata_path(), ['2024-02'])
+    assert estado_sql.comparar_estados(esperado, obtido) == []
@@ -0,0 +1,37 @@
+"""
+Modo em lotes (--memoria-mb): com estados parciais derramados em disco, o
+estado e as saídas do dashboard são os mesmos do cálculo de uma vez
+"""
+
+import pandas as pd
+import pytest
+
+import estado_agregado
+from agregacao import PlanoAgregacao
+from conftest import gravar_store
+
+
+@pytest.fixture
+def store(prepare):
+    gravar_store(prepare.RAW_DIR, [(2024, 1), (2024, 2), (2024, 3)], linhas=10_000)
+    return prepare
+
+
+def test_lotes_iguais_ao_completo(store, tmp_path, monkeypatch):
+    gravados = []
+    gravar_periodo = estado_agregado.gravar_periodo
+    monkeypatch.setattr(estado_agregado, 'gravar_periodo',
+                        lambda estado, periodo, base: gravados.append(periodo) or gravar_periodo(estado, periodo, base))
+
+    completo = store.calcular_periodos()
+    lotes = store.calcular_periodos(memoria_mb=1)
+    # O orçamento mínimo força lotes derramados em disco em todos os meses
+    assert sum(p.startswith('lote') for p in gravados) >= 3
+
+    # Contagens idênticas; somas de salário só com a ordem das parcelas trocada
+    for nome in completo:
+        pd.testing.assert_frame_equal(lotes[nome], completo[nome], check_exact=False, rtol=1e-12, obj=nome)
+
+    for nome, estado in (('completo', completo), ('lotes', lotes)):
+        store.gerar_saidas(PlanoAgregacao(estado), str(tmp_path / nome))
+    assert store.arquivos_divergentes(str(tmp_path / 'completo'), str(tmp_path / 'lotes')) == []
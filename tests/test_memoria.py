@@ -0,0 +1,67 @@
+"""
+Orçamento de memória do modo em lotes (--memoria-mb): o pico de RSS
+acompanha o orçamento e o tamanho do estado, não o volume dos microdados
+"""
+
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+from conftest import SCRIPTS_DIR, gravar_store
+
+ORCAMENTO_MB = 24
+
+# Alocador, buffers do pyarrow e cópias do estado na fusão final
+FOLGA_MB = 64
+
+# Pico de RSS de calcular_periodos num processo novo, descontado o RSS após
+# importar os módulos e abrir o store. VmHWM é o pico do próprio processo
+# (ru_maxrss herdaria o pico do pytest através do fork)
+MEDIR = '''
+import sys, json
+import particoes
+import prepare_dashboard_granular as prepare
+from agregacao import bytes_estado
+
+def vmhwm():
+    with open('/proc/self/status') as f:
+        return next(int(linha.split()[1]) for linha in f if linha.startswith('VmHWM:'))
+
+prepare.RAW_DIR = sys.argv[1]
+next(particoes.ler_lotes(prepare.microdata_path(), None, 1000))
+inicial = vmhwm()
+estado = prepare.calcular_periodos(memoria_mb=int(sys.argv[2]) or None)
+pico = vmhwm()
+print(json.dumps({'pico_mb': (pico - inicial) / 1024, 'estado_mb': bytes_estado(estado) / 2**20}))
+'''
+
+pytestmark = pytest.mark.skipif(not sys.platform.startswith('linux'), reason='VmHWM de /proc/self/status só no Linux')
+
+
+def medir(raw_dir, memoria_mb):
+    """Pico de RSS (MB acima do inicial) e tamanho do estado de uma execução."""
+    saida = subprocess.run(
+        [sys.executable, '-c', MEDIR, raw_dir, str(memoria_mb or 0)],
+        capture_output=True, text=True, check=True,
+        env={**os.environ, 'PYTHONPATH': SCRIPTS_DIR},
+    )
+    return json.loads(saida.stdout.strip().splitlines()[-1])
+
+
+@pytest.fixture(scope='module')
+def store_volumoso(tmp_path_factory):
+    """800 mil registros em 2 meses, com poucas células: microdados >> estado."""
+    raw_dir = tmp_path_factory.mktemp('raw')
+    gravar_store(str(raw_dir), [(2024, 1), (2024, 2)], linhas=25_000, copias=16)
+    return str(raw_dir)
+
+
+def test_pico_acompanha_orcamento(store_volumoso):
+    sem_limite = medir(store_volumoso, None)
+    com_limite = medir(store_volumoso, ORCAMENTO_MB)
+
+    assert com_limite['pico_mb'] < 0.6 * sem_limite['pico_mb'], (com_limite, sem_limite)
+    assert com_limite['pico_mb'] <= 2 * ORCAMENTO_MB + 4 * com_limite['estado_mb'] + FOLGA_MB, com_limite